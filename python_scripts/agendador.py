@@ -0,0 +1,158 @@
+import threading
+import time
+from datetime import datetime
+
+from publicacao import assumir_trava
+
+
+class AgendadorPipeline:
+    """
+    Roda o pipeline só quando os dados mudam, no lugar do laço fixo de 15 s.
+    Avisos podem vir do /enviar_dados, da sincronização com a planilha ou
+    da verificação periódica do banco de casos. Uma rajada de avisos vira
+    uma única execução depois de `debounce_s` sem avisos novos (ou, no
+    máximo, `espera_maxima_s` depois do primeiro), e nunca rodam dois
+    pipelines.
+    """
+
+    def __init__(self, motor, debounce_s=2.0, espera_maxima_s=30.0,
+                 intervalo_verificacao_s=5.0, intervalo_planilha_s=60.0):
+        self.motor = motor
+        self.debounce_s = debounce_s
+        self.espera_maxima_s = espera_maxima_s
+        self.intervalo_verificacao_s = intervalo_verificacao_s
+        self.intervalo_planilha_s = intervalo_planilha_s
+
+        self._condicao = threading.Condition()
+        self._motivos = set()
+        self._primeiro_aviso = None
+        self._ultimo_aviso = None
+        self._rodando = False
+        self._parar = threading.Event()
+        self._threads = []
+        self.executor = False
+
+        self.execucoes = 0
+        self.ultimo_inicio = None
+        self.ultimo_fim = None
+        self.ultima_duracao_s = None
+        self.ultimos_motivos = []
+        self.ultimo_erro = None
+
+    def notificar(self, motivo):
+        """Pede uma execução. Avisos próximos são agrupados."""
+        with self._condicao:
+            agora = time.monotonic()
+            if not self._motivos:
+                self._primeiro_aviso = agora
+            self._ultimo_aviso = agora
+            self._motivos.add(motivo)
+            self._condicao.notify_all()
+
+    def iniciar(self):
+        for alvo in (self._laco_execucao, self._laco_verificacao, self._laco_planilha):
+            thread = threading.Thread(target=alvo, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.notificar("inicio")
+
+    def iniciar_se_executor(self, intervalo_s=5.0):
+        """
+        Com vários workers (gunicorn), só um processo roda o agendador e a
+        sincronização da planilha: o que pegar a trava 'executor'. Os
+        outros só seguem o resultados.json (SeguidorResultados) e tentam a
+        trava de novo a cada `intervalo_s`, para assumir se o executor
+        morrer. Casos enviados a eles chegam ao executor pela verificação
+        periódica do banco.
+        """
+        def disputar():
+            while not assumir_trava("executor"):
+                if self._parar.wait(intervalo_s):
+                    return
+            print("[INFO] Este processo passou a rodar o agendador do pipeline.")
+            self.executor = True
+            self.iniciar()
+
+        if assumir_trava("executor"):
+            self.executor = True
+            self.iniciar()
+        else:
+            threading.Thread(target=disputar, daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+        with self._condicao:
+            self._condicao.notify_all()
+
+    def _aguardar_rajada(self):
+        """Bloqueia até haver avisos e a rajada terminar; devolve os motivos."""
+        with self._condicao:
+            while not self._motivos and not self._parar.is_set():
+                self._condicao.wait()
+            while not self._parar.is_set():
+                agora = time.monotonic()
+                prazo = min(self._ultimo_aviso + self.debounce_s,
+                            self._primeiro_aviso + self.espera_maxima_s)
+                if agora >= prazo:
+                    break
+                self._condicao.wait(prazo - agora)
+            motivos = sorted(self._motivos)
+            self._motivos = set()
+            self._rodando = bool(motivos)
+            return motivos
+
+    def _laco_execucao(self):
+        while not self._parar.is_set():
+            motivos = self._aguardar_rajada()
+            if not motivos:
+                continue
+            self.ultimo_inicio = datetime.now()
+            inicio = time.perf_counter()
+            try:
+                resultado = self.motor.executar()["resultado"]
+                self.ultimo_erro = None
+                # Uma linha por execução (a lista de clusters fica no /rodar_dbscan e na API)
+                print(f"[INFO] Pipeline executado: versão {resultado['versao']}, data {resultado['data_ref']}, "
+                      f"{len(resultado['geral']['clusters'])} clusters gerais, "
+                      f"{len(resultado['data']['clusters'])} na data, {resultado['duracao_s']} s"
+                      + (" (reaproveitado)" if resultado["reaproveitado"] else ""))
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                print("Erro ao executar o pipeline:", e)
+            self.ultima_duracao_s = round(time.perf_counter() - inicio, 4)
+            self.ultimo_fim = datetime.now()
+            self.ultimos_motivos = motivos
+            self.execucoes += 1
+            with self._condicao:
+                self._rodando = False
+
+    def _laco_verificacao(self):
+        """Percebe mudanças no banco feitas por fora (importação, outro processo)."""
+        while not self._parar.wait(self.intervalo_verificacao_s):
+            if self.motor.dados_mudaram():
+                self.notificar("banco")
+
+    def _laco_planilha(self):
+        while not self._parar.wait(self.intervalo_planilha_s):
+            try:
+                if self.motor.sincronizar_planilha():
+                    self.notificar("planilha")
+            except Exception as e:
+                print("Erro ao sincronizar a planilha:", e)
+
+    def status(self):
+        with self._condicao:
+            pendentes = sorted(self._motivos)
+            rodando = self._rodando
+        return {
+            "executor": self.executor,
+            "rodando": rodando,
+            "pendentes": pendentes,
+            "execucoes": self.execucoes,
+            "ultimo_inicio": self.ultimo_inicio.isoformat() if self.ultimo_inicio else None,
+            "ultimo_fim": self.ultimo_fim.isoformat() if self.ultimo_fim else None,
+            "ultima_duracao_s": self.ultima_duracao_s,
+            "ultimos_motivos": self.ultimos_motivos,
+            "ultimo_erro": self.ultimo_erro,
+            "versao_dados": self.motor.versao,
+        }
@@ -0,0 +1,175 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from publicacao import gravar_atomico
+
+
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
+# Tabela dos clusters gerais publicada junto com os gráficos: os workers
+# que não rodam o pipeline respondem a API a partir dela
+CLUSTERS_PATH = os.path.join(base_path, "clusters_gerais.npz")
+COLUNAS_CLUSTERS = ["id", "diagnostico", "data", "local_lat", "local_lon", "cluster"]
+
+# Tamanho (em pixels de tela) de cada célula de agregação do mapa
+TAMANHO_CELULA_PX = 64
+ZOOM_MAXIMO = 22
+# Máximo de casos novos listados num evento de atualização
+LIMITE_CASOS_DELTA = 200
+
+
+def ler_bbox(texto):
+    """'oeste,sul,leste,norte' -> tupla de floats (ValueError se inválido)."""
+    partes = [float(v) for v in texto.split(",")]
+    if len(partes) != 4:
+        raise ValueError("bbox deve ser oeste,sul,leste,norte")
+    oeste, sul, leste, norte = partes
+    if oeste > leste or sul > norte:
+        raise ValueError("bbox com oeste > leste ou sul > norte")
+    return oeste, sul, leste, norte
+
+
+def gravar_clusters(df_clusters, caminho=CLUSTERS_PATH):
+    """Colunas usadas pela API num .npz sem objetos Python (texto como unicode do numpy)."""
+    colunas = {
+        "id": df_clusters["id"].to_numpy(dtype=np.int64),
+        "diagnostico": df_clusters["diagnostico"].to_numpy(dtype=str),
+        "data": df_clusters["data"].to_numpy(dtype="datetime64[ns]"),
+        "local_lat": df_clusters["local_lat"].to_numpy(dtype=float),
+        "local_lon": df_clusters["local_lon"].to_numpy(dtype=float),
+        "cluster": df_clusters["cluster"].to_numpy(dtype=np.int64),
+    }
+    return gravar_atomico(caminho, lambda temporario: np.savez(temporario, **colunas))
+
+
+def ler_clusters(caminho=CLUSTERS_PATH):
+    """DataFrame gravado por gravar_clusters (allow_pickle=False: só arrays)."""
+    with np.load(caminho, allow_pickle=False) as arquivo:
+        return pd.DataFrame({coluna: arquivo[coluna] for coluna in COLUNAS_CLUSTERS})
+
+
+def _resumir_clusters(validos):
+    """Centroide, casos, extensão [oeste, sul, leste, norte] e datas de cada cluster."""
+    estat = validos.groupby("cluster").agg(
+        diagnostico=("diagnostico", "first"),
+        casos=("cluster", "size"),
+        lat=("local_lat", "mean"), lon=("local_lon", "mean"),
+        oeste=("local_lon", "min"), sul=("local_lat", "min"),
+        leste=("local_lon", "max"), norte=("local_lat", "max"),
+        inicio=("data", "min"), fim=("data", "max"),
+    )
+    return [
+        {
+            "cluster": int(cluster_id),
+            "diagnostico": linha.diagnostico,
+            "casos": int(linha.casos),
+            "centroide": [round(linha.lat, 6), round(linha.lon, 6)],
+            "extensao": [round(linha.oeste, 6), round(linha.sul, 6),
+                         round(linha.leste, 6), round(linha.norte, 6)],
+            "inicio": linha.inicio.strftime("%Y-%m-%d"),
+            "fim": linha.fim.strftime("%Y-%m-%d"),
+        }
+        for cluster_id, linha in estat.iterrows()
+    ]
+
+
+def resumo_por_doenca(df_clusters):
+    """Para cada doença: casos, ruído e o resumo de cada cluster."""
+    resumo = {}
+    for doenca, grupo in df_clusters.groupby("diagnostico", sort=True):
+        validos = grupo[grupo["cluster"] != -1]
+        resumo[doenca] = {
+            "casos": int(len(grupo)),
+            "ruido": int(len(grupo) - len(validos)),
+            "clusters": _resumir_clusters(validos),
+        }
+    return resumo
+
+
+def _membros_clusters(df_clusters):
+    """Conjunto de ids de casos de cada cluster -> id do cluster."""
+    validos = df_clusters[df_clusters["cluster"] != -1]
+    return {membros: int(cluster_id)
+            for cluster_id, membros in validos.groupby("cluster")["id"].agg(frozenset).items()}
+
+
+def delta_resultados(df_antigo, df_novo, limite_casos=LIMITE_CASOS_DELTA):
+    """
+    O que mudou entre dois resultados de detectar_clusters: casos novos e
+    clusters cujo conjunto de casos não existia antes (os ids de cluster são
+    renumerados a cada execução, então a comparação é pelos membros).
+    """
+    if df_antigo is None:
+        return {"completo": True, "novos_casos": int(len(df_novo)), "casos": [],
+                "clusters_alterados": [], "clusters_removidos": 0}
+
+    novos = df_novo[~df_novo["id"].isin(df_antigo["id"])]
+    antes = _membros_clusters(df_antigo)
+    depois = _membros_clusters(df_novo)
+    alterados = [cluster_id for membros, cluster_id in depois.items() if membros not in antes]
+    removidos = sum(1 for membros in antes if membros not in depois)
+
+    casos = [
+        {"id": int(linha.id), "diagnostico": linha.diagnostico,
+         "data": linha.data.strftime("%Y-%m-%d"),
+         "lat": round(linha.local_lat, 6), "lon": round(linha.local_lon, 6),
+         "cluster": int(linha.cluster)}
+        for linha in novos.head(limite_casos).itertuples(index=False)
+    ]
+    return {
+        "completo": False,
+        "novos_casos": int(len(novos)),
+        "casos": casos,
+        "clusters_alterados": _resumir_clusters(df_novo[df_novo["cluster"].isin(alterados)]),
+        "clusters_removidos": int(removidos),
+    }
+
+
+def agregar_pontos(df_clusters, bbox, zoom, doenca=None, apenas_validos=False):
+    """
+    Casos dentro do bbox juntados numa grade que depende do zoom (células de
+    TAMANHO_CELULA_PX pixels). O número de células é limitado pelo tamanho
+    da tela, não pelo número de casos. A grade começa em (0, 0), não no
+    canto do bbox: arrastar o mapa não muda as células já visíveis.
+    """
+    oeste, sul, leste, norte = bbox
+    df = df_clusters
+    if doenca is not None:
+        df = df[df["diagnostico"] == doenca]
+    if apenas_validos:
+        df = df[df["cluster"] != -1]
+    df = df[(df["local_lon"] >= oeste) & (df["local_lon"] <= leste)
+            & (df["local_lat"] >= sul) & (df["local_lat"] <= norte)]
+    if df.empty:
+        return []
+
+    # Graus por célula no zoom pedido (tiles de 256 px cobrindo 360°)
+    tamanho = TAMANHO_CELULA_PX * 360.0 / (256 * 2 ** zoom)
+    celulas = pd.DataFrame({
+        "diagnostico": df["diagnostico"].to_numpy(),
+        "ruido": (df["cluster"] == -1).to_numpy(),
+        "cx": np.floor(df["local_lon"].to_numpy() / tamanho).astype(np.int64),
+        "cy": np.floor(df["local_lat"].to_numpy() / tamanho).astype(np.int64),
+        "lat": df["local_lat"].to_numpy(),
+        "lon": df["local_lon"].to_numpy(),
+        "cluster": df["cluster"].to_numpy(),
+    })
+    agregado = celulas.groupby(["diagnostico", "ruido", "cx", "cy"], sort=True).agg(
+        casos=("cluster", "size"), lat=("lat", "mean"), lon=("lon", "mean"),
+        clusters=("cluster", "nunique"), cluster=("cluster", "min"),
+    ).reset_index()
+
+    return [
+        {
+            "doenca": linha.diagnostico,
+            "tipo": "ruido" if linha.ruido else "cluster",
+            "lat": round(linha.lat, 6),
+            "lon": round(linha.lon, 6),
+            "casos": int(linha.casos),
+            "clusters": 0 if linha.ruido else int(linha.clusters),
+            # Célula com um único cluster: o id dele (para o popup)
+            "cluster": int(linha.cluster) if not linha.ruido and linha.clusters == 1 else None,
+        }
+        for linha in agregado.itertuples(index=False)
+    ]
@@ -1,32 +1,32 @@
 from coleta_dados_google import adicionar_no_csv
-from flask import Flask, request, render_template, jsonify, send_file, Response
-import pandas as pd
-import subprocess
+from armazenamento_casos import conectar
+from servico_clusters import MotorClusterizacao
+from agendador import AgendadorPipeline
+from ingestao import FilaIngestao, FilaCheia
+from api_clusters import agregar_pontos, ler_bbox, ZOOM_MAXIMO
+from eventos import CanalEventos, SeguidorLog, SeguidorResultados
+from publicacao import arquivo_publicado, ler_resultados, gravar_atomico
+from registro import iniciar_registro, ler_desde, ultima_execucao, LOG_PATH
+from cache_imagens import CacheImagens, largura_permitida
+import metricas
+from flask import Flask, request, render_template, jsonify, send_file, Response, stream_with_context
 import os
-import time
-import threading
+import hashlib
 import datetime
+import time
 import socket
-import qrcode
+import threading
 
 app = Flask(__name__)
-lock = threading.Lock()
 
-BASE = os.path.dirname(__file__)
-CSV_PATH = os.path.join(BASE, "dados_pacientes.csv")
-MAIN_PATH = os.path.join(BASE, "main.py")
+BASE = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
 IMAGENS_PATH = os.path.join(BASE, "imagens")
 MAPA_PATH = os.path.join(BASE, "mapa_clusters.html")
+MAPA_VALIDOS_PATH = os.path.join(BASE, "mapa_clusters_validos.html")
 BOLINHAS_PATH = os.path.join(BASE, "bolinhas.html")
-LOG_FILE = "saida_python.log"
 CAMINHO_QR = os.path.join(IMAGENS_PATH, "QR_GeoEpi.png")
 
 
-if not os.path.exists(CSV_PATH):
-    pd.DataFrame(columns=["idade","genero","peso","altura","local_lat","local_lon","data","diagnostico"]).to_csv(CSV_PATH, index=False)
-
-
-
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -39,32 +39,77 @@ def get_local_ip():
         s.close()
 
 
-ip_local = get_local_ip()
-url = f"http://{ip_local}:5000"
+def gerar_qr_code():
+    """QR Code com o endereço do site na rede local."""
+    import qrcode
+    url = f"http://{get_local_ip()}:5000"
+    gravar_atomico(CAMINHO_QR, qrcode.make(url).save)
+    return url
 
-# Gera o QR Code
-os.makedirs(IMAGENS_PATH, exist_ok=True)
-img = qrcode.make(url)
-img.save(CAMINHO_QR)
 
+# Os objetos do serviço são criados aqui, mas nada roda ao importar o
+# app.py: log, banco, QR Code e threads começam em iniciar_servicos()
 
+# Eventos (SSE) para os painéis: resultados novos e linhas novas do log.
+# Um canal por worker; os dois vêm de arquivos comuns a todos os workers
+# (resultados.json e o log), não de quem rodou o pipeline
+canal = CanalEventos()
 
-def rodar_main_periodicamente():
-    """Executa o main.py a cada 15 seg"""
-    while True:
-        try:
-            result = subprocess.run(["python", MAIN_PATH],
-                                    capture_output=True,
-                                    text=True,
-                                    check=True)
-            print("main.py executado com sucesso:", result.stdout)
-        except subprocess.CalledProcessError as e:
-            print("Erro ao executar main.py:", e.stderr)
-        time.sleep(15)
+# Pipeline do main.py rodando dentro do processo, com resultados em memória
+motor = MotorClusterizacao()
+
+# Roda o pipeline só quando os dados mudam (formulário, planilha ou banco);
+# com vários workers, só em um deles (os outros seguem o resultados.json)
+agendador = AgendadorPipeline(motor)
+
+# Envios do formulário gravados em lote (uma transação para vários casos)
+fila_ingestao = FilaIngestao()
+
+# PNGs servidos da memória; só mudam quando o pipeline publica outra versão
+cache_imagens = CacheImagens()
+# Com ?v=<versão atual> a URL não muda de conteúdo: o navegador guarda sem revalidar
+MAX_AGE_VERSIONADO = 86400
 
-# Inicia a execução periódica do main.py em uma thread separada
-thread = threading.Thread(target=rodar_main_periodicamente, daemon=True)
-thread.start()
+_servicos_iniciados = False
+_trava_servicos = threading.Lock()
+
+
+def iniciar_servicos():
+    """
+    Uma vez por processo: no __main__ ou no primeiro pedido (ex.: cada
+    worker do gunicorn).
+    """
+    global _servicos_iniciados
+    with _trava_servicos:
+        if _servicos_iniciados:
+            return
+        # Tudo o que o pipeline imprime vai para o log rotativo (/saida_python)
+        iniciar_registro()
+        # Cria o banco de casos (e importa o dados_pacientes.csv antigo, se houver)
+        conectar().close()
+        gerar_qr_code()
+        SeguidorLog(canal, LOG_PATH).iniciar()
+        SeguidorResultados(canal).iniciar()
+        fila_ingestao.iniciar()
+        agendador.iniciar_se_executor()
+        _servicos_iniciados = True
+
+
+@app.before_request
+def _marcar_inicio():
+    if not _servicos_iniciados:
+        iniciar_servicos()
+    request.inicio_metricas = time.perf_counter()
+
+
+@app.after_request
+def _medir_pedido(resposta):
+    inicio = getattr(request, "inicio_metricas", None)
+    if inicio is not None:
+        rota = request.endpoint or "desconhecida"
+        metricas.observar("http_segundos", time.perf_counter() - inicio, rota=rota)
+        metricas.contar("http_pedidos", rota=rota, status=str(resposta.status_code))
+    return resposta
 
 
 @app.route("/")
@@ -109,10 +154,13 @@ def enviar_dados():
             datetime.datetime.strptime(dados["data"], "%Y-%m-%d")
         except ValueError:
             return jsonify({"erro": "Formato de data inválido. Use AAAA-MM-DD."}), 400
-        with lock:
-            adicionar_no_csv(dados)
+        adicionar_no_csv(dados, fila_ingestao)
+        agendador.notificar("formulario")
         return jsonify({"mensagem": "Dados salvos com sucesso!"}), 200
-    
+
+    # Fila cheia ou caso cancelado no timeout: nada foi gravado, pode reenviar
+    except (FilaCheia, TimeoutError) as e:
+        return jsonify({"erro": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"erro": str(e)}), 500
     
@@ -121,13 +169,9 @@ def enviar_dados():
 @app.route("/rodar_dbscan", methods=["GET"])
 def rodar_dbscan():
     try:
-        result = subprocess.run(["python", MAIN_PATH],
-                                capture_output=True,
-                                text=True,
-                                check=True)
-        return jsonify({"saida": result.stdout})
-    except subprocess.CalledProcessError as e:
-        return jsonify({"erro": e.stderr}), 500
+        return jsonify(motor.executar())
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
 
 
 @app.route("/rodar_dbscan_data", methods=["POST"])
@@ -138,16 +182,49 @@ def rodar_dbscan_data():
         return jsonify({"erro": "Data não fornecida"}), 400
 
     try:
-        result = subprocess.run(
-            ["python", MAIN_PATH, data_ref],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return jsonify({"saida": result.stdout})
-    except subprocess.CalledProcessError as e:
-        return jsonify({"erro": e.stderr}), 500
+        datetime.datetime.strptime(data_ref, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"erro": "Formato de data inválido. Use AAAA-MM-DD."}), 400
+
+    try:
+        return jsonify(motor.executar(data_ref))
+    except Exception as e:
+        return jsonify({"erro": str(e)}), 500
+
+
+
+@app.route("/status_pipeline")
+def status_pipeline():
+    """Quando o último pipeline terminou, quanto durou e se há outro pendente"""
+    return jsonify(agendador.status())
+
 
+@app.route("/metrics")
+def metrics():
+    """Tempos por etapa, contadores e latência das rotas no formato do Prometheus"""
+    for nome, valor in fila_ingestao.estatisticas().items():
+        metricas.definir(f"ingestao_{nome}", valor)
+    status = agendador.status()
+    metricas.definir("pipeline_rodando", int(status["rodando"]))
+    metricas.definir("pipeline_execucoes_agendadas", status["execucoes"])
+    metricas.definir("pipeline_ultima_duracao_segundos", status["ultima_duracao_s"] or 0)
+    metricas.definir("sse_clientes", canal.clientes())
+    metricas.definir("cache_janelas_entradas", len(motor.cache_janelas))
+    metricas.definir("cache_imagens_entradas", len(cache_imagens))
+    return Response(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/status_resultados")
+def status_resultados():
+    """Versão publicada dos gráficos e mapas (a mesma em todos os workers)"""
+    resultados = ler_resultados()
+    return jsonify({chave: resultados.get(chave) for chave in ("versao", "data", "dados", "data_ref", "arquivos")})
+
+
+@app.route("/status_ingestao")
+def status_ingestao():
+    """Fila de envios do formulário: tamanho, lotes, vazão e latência"""
+    return jsonify(fila_ingestao.estatisticas())
 
 
 @app.route("/grafico/<tipo>")
@@ -155,21 +232,37 @@ def grafico(tipo):
     """
     tipo: cluster_geral, barras_geral, cluster_data, barras_data,
           pizza_covid, pizza_zika, pizza_dengue, pizza_influenza
+    ?largura=N: miniatura (arredondada para uma das LARGURAS do cache)
+    ?v=<versão publicada>: com a versão atual, cacheável sem revalidar
+    Responde 304 para If-None-Match / If-Modified-Since iguais.
     """
-    path = os.path.join(IMAGENS_PATH, f"{tipo}.png")
+    # Cópia publicada (imutável) da versão atual; o PNG em imagens/ pode
+    # estar sendo trocado por um pipeline em outro processo
+    path = arquivo_publicado(os.path.join(IMAGENS_PATH, f"{tipo}.png"))
+    largura = request.args.get("largura", type=int)
+    imagem = cache_imagens.obter(path, largura_permitida(largura) if largura else None)
+    if imagem is None:
+        return f"Gráfico {tipo} ainda não gerado", 404
 
-    if os.path.exists(path):
-        return send_file(path, mimetype="image/png")
+    conteudo, etag, modificado = imagem
+    resposta = Response(conteudo, mimetype="image/png")
+    resposta.set_etag(etag)
+    resposta.last_modified = modificado
+    versao = ler_resultados().get("versao")
+    if versao is not None and request.args.get("v") == str(versao):
+        resposta.headers["Cache-Control"] = f"public, max-age={MAX_AGE_VERSIONADO}"
     else:
-        return f"Gráfico {tipo} ainda não gerado", 404
+        resposta.headers["Cache-Control"] = "no-cache"
+    return resposta.make_conditional(request)
 
 #Rotas do mapa
 
 @app.route("/mapa")
 def exibir_mapa():
     """Exibe o mapa interativo gerado pelo DBSCAN"""
-    if os.path.exists(MAPA_PATH):
-        return send_file(MAPA_PATH)
+    path = arquivo_publicado(MAPA_PATH)
+    if os.path.exists(path):
+        return send_file(path, mimetype="text/html")
     else:
         return "Mapa ainda não gerado.", 404
 
@@ -177,23 +270,109 @@ def exibir_mapa():
 @app.route("/mapa_validos")
 def exibir_mapa_validos():
     """Exibe o mapa interativo apenas com clusters válidos"""
-    path = os.path.join(BASE, "mapa_clusters_validos.html")
+    path = arquivo_publicado(MAPA_VALIDOS_PATH)
     if os.path.exists(path):
-        return send_file(path)
+        return send_file(path, mimetype="text/html")
     else:
         return "Mapa de clusters válidos ainda não gerado.", 404
 
+#API dos clusters (o ETag muda junto com a versão dos dados)
+
+def _resposta_versionada(versao, gerar):
+    consulta = hashlib.blake2b(request.query_string, digest_size=6).hexdigest()
+    etag = f"clusters-{versao}-{consulta}"
+    if etag in request.if_none_match:
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(gerar())
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta
+
+
+def _sem_resultado():
+    # Nada publicado ainda: o pipeline roda no executor, não neste pedido
+    return jsonify({"erro": "Clusters ainda não calculados."}), 503, {"Retry-After": "5"}
+
+
+@app.route("/api/clusters")
+def api_clusters():
+    """Resumo por doença: centroide, casos e extensão de cada cluster"""
+    atual = motor.resumo_clusters()
+    if atual is None:
+        return _sem_resultado()
+    versao, resumo = atual
+    return _resposta_versionada(versao, lambda: {"versao": versao, "doencas": resumo})
+
+
+@app.route("/api/clusters/pontos")
+def api_clusters_pontos():
+    """Casos agregados numa grade para ?bbox=oeste,sul,leste,norte&zoom=N[&doenca=][&validos=1]"""
+    try:
+        bbox = ler_bbox(request.args.get("bbox", "-180,-90,180,90"))
+        zoom = int(request.args.get("zoom", 12))
+    except ValueError as e:
+        return jsonify({"erro": f"Parâmetros inválidos: {e}"}), 400
+    zoom = max(0, min(zoom, ZOOM_MAXIMO))
+    doenca = request.args.get("doenca") or None
+    apenas_validos = request.args.get("validos") == "1"
+
+    atual = motor.clusters_gerais()
+    if atual is None:
+        return _sem_resultado()
+    versao, df_geral = atual
+    return _resposta_versionada(versao, lambda: {
+        "versao": versao,
+        "zoom": zoom,
+        "bbox": list(bbox),
+        "celulas": agregar_pontos(df_geral, bbox, zoom, doenca, apenas_validos),
+    })
+
+#Atualizações ao vivo (server-sent events)
+
+@app.route("/eventos")
+def eventos():
+    """
+    Stream text/event-stream com eventos 'resultado' (versão nova, casos
+    novos, clusters alterados, gráficos refeitos) e 'log' (linhas novas).
+    """
+    try:
+        ultimo_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        ultimo_id = None
+    return Response(stream_with_context(canal.assinar(ultimo_id)),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 #Saida log
 
 @app.route("/saida_python")
 def saida_python():
-    try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            conteudo = f.read()
-        return Response(conteudo, mimetype="text/plain")
-    except FileNotFoundError:
-        return Response("Nenhuma saída registrada ainda.", mimetype="text/plain")
+    """
+    Sem parâmetros: a última execução. Com ?since=<posição>: só as linhas
+    escritas depois dela. O cabeçalho X-Log-Posicao traz a posição para o
+    próximo pedido; X-Log-Truncado: 1 se parte já saiu do log (girou).
+    """
+    since = request.args.get("since")
+    truncado = False
+    if since is None:
+        conteudo, posicao = ultima_execucao()
+        conteudo = conteudo or "Nenhuma saída registrada ainda."
+    else:
+        try:
+            posicao = max(0, int(since))
+        except ValueError:
+            return jsonify({"erro": "since deve ser um número inteiro"}), 400
+        linhas, posicao, truncado = ler_desde(posicao)
+        conteudo = "".join(linha + "\n" for linha in linhas)
+    resposta = Response(conteudo, mimetype="text/plain")
+    resposta.headers["X-Log-Posicao"] = str(posicao)
+    resposta.headers["Cache-Control"] = "no-cache"
+    if truncado:
+        resposta.headers["X-Log-Truncado"] = "1"
+    return resposta
 
 if __name__ == "__main__":
+    iniciar_servicos()
     #app.run(debug=True)
     app.run(host="0.0.0.0", port=5000, debug=False)# CMD ipconfig
\ No newline at end of file
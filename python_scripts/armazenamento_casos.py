@@ -0,0 +1,357 @@
+import os
+import sqlite3
+import json
+import sys
+import zipfile
+import numpy as np
+import pandas as pd
+from publicacao import trava, gravar_atomico
+
+
+# Caminhos
+# GEOEPI_DADOS: outra pasta para banco, matrizes, imagens e mapas (ex.: benchmark)
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
+DB_PATH = os.path.join(base_path, "casos.db")
+CSV_PATH = os.path.join(base_path, "dados_pacientes.csv")
+
+COLUNAS = ['nome', 'idade', 'genero', 'peso', 'altura',
+           'local_lat', 'local_lon', 'bairro', 'data', 'diagnostico']
+COLUNAS_NUMERICAS = ['idade', 'peso', 'altura', 'local_lat', 'local_lon']
+# Poucos valores distintos: no retrato em disco ficam como categoria
+COLUNAS_CATEGORIAS = ['genero', 'bairro', 'diagnostico']
+# Texto livre: no retrato vai como lista no JSON
+COLUNAS_TEXTO = ['nome']
+# O que identifica um caso da planilha já gravado pelo CSV antigo: a data
+# (dia do download) e as coordenadas (sorteadas no bairro) não servem
+COLUNAS_IDENTIDADE = ['nome', 'idade', 'genero', 'peso', 'altura', 'bairro', 'diagnostico']
+
+# Acima disso de linhas novas desde o último retrato, ele é regravado
+MIN_LINHAS_REGRAVAR = 1000
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS casos (
+    id INTEGER PRIMARY KEY,
+    nome TEXT,
+    idade INTEGER,
+    genero TEXT,
+    peso REAL,
+    altura REAL,
+    local_lat REAL,
+    local_lon REAL,
+    bairro TEXT,
+    data TEXT,
+    diagnostico TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_casos_data ON casos(data);
+CREATE INDEX IF NOT EXISTS idx_casos_diagnostico_data ON casos(diagnostico, data);
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor INTEGER
+);
+INSERT OR IGNORE INTO meta(chave, valor) VALUES ('geracao', 0);
+-- Total de casos, mantido por _inserir/_importar (count(*) só na primeira vez)
+INSERT OR IGNORE INTO meta(chave, valor) SELECT 'casos', count(*) FROM casos;
+CREATE TABLE IF NOT EXISTS sincronizacao (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+
+# Bancos com tabelas e WAL já conferidos neste processo
+_preparados = set()
+
+
+def caminho_retrato(caminho=DB_PATH):
+    return os.path.splitext(caminho)[0] + "_retrato.npz"
+
+
+def conectar(caminho=DB_PATH):
+    """
+    Abre o banco SQLite dos casos. Na primeira vez cria as tabelas e, se
+    existir o dados_pacientes.csv antigo, importa as linhas dele (com a
+    trava dos casos: com vários processos, só um cria e importa).
+    """
+    if os.path.exists(caminho):
+        return _abrir(caminho)
+    with trava("casos"):
+        novo = not os.path.exists(caminho)
+        # Arquivo apagado e criado de novo: as tabelas também
+        _preparados.discard(caminho)
+        con = _abrir(caminho)
+        if novo and caminho == DB_PATH and os.path.exists(CSV_PATH):
+            print("[INFO] Importando dados_pacientes.csv para o banco de casos.")
+            _importar(con, pd.read_csv(CSV_PATH, sep=",", quotechar='"', engine="python"), legado=True)
+        return con
+
+
+def _abrir(caminho):
+    con = sqlite3.connect(caminho, timeout=30)
+    # synchronous vale por conexão; o WAL e as tabelas ficam no arquivo,
+    # então o esquema (DDL + escrita em meta) roda uma vez por processo
+    con.execute("PRAGMA synchronous=FULL")
+    if caminho not in _preparados:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.executescript(ESQUEMA)
+        _preparados.add(caminho)
+    return con
+
+
+def _normalizar(df):
+    """Tipos fixos para cada coluna; valores inválidos viram nulos."""
+    df = df.reindex(columns=COLUNAS)
+    for coluna in COLUNAS_NUMERICAS:
+        df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+    datas = pd.to_datetime(df["data"], errors="coerce")
+    df["data"] = datas.dt.strftime("%Y-%m-%d").where(datas.notna(), None)
+    df = df.astype(object).where(df.notna(), None)
+    df["idade"] = [int(v) if v is not None else None for v in df["idade"]]
+    return df
+
+
+def _inserir(con, df):
+    cursor = con.executemany(
+        f"INSERT INTO casos({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})",
+        _normalizar(df).itertuples(index=False, name=None)
+    )
+    # Na mesma transação dos casos: a contagem nunca fica para trás
+    con.execute("UPDATE meta SET valor = valor + ? WHERE chave = 'casos'", (cursor.rowcount,))
+    return cursor.rowcount
+
+
+def _importar(con, df, legado=False):
+    with trava("casos"), con:
+        con.execute("DELETE FROM casos")
+        con.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'geracao'")
+        con.execute("UPDATE meta SET valor = 0 WHERE chave = 'casos'")
+        if legado:
+            # O CSV antigo já tem as linhas da planilha: a primeira
+            # sincronização confere quais já estão no banco
+            con.execute("INSERT OR REPLACE INTO sincronizacao(chave, valor) VALUES ('legado', 'true')")
+        return _inserir(con, df)
+
+
+def inserir_casos(linhas, caminho=DB_PATH):
+    """Acrescenta casos (lista de listas na ordem de COLUNAS, ou dicts) numa única transação."""
+    if not linhas:
+        return 0
+    if isinstance(linhas[0], dict):
+        df = pd.DataFrame(linhas)
+    else:
+        df = pd.DataFrame(linhas, columns=COLUNAS)
+    con = conectar(caminho)
+    try:
+        # Escritores de vários processos entram em fila na trava em vez de
+        # disputar o banco (SQLITE_BUSY + espera do timeout)
+        with trava("casos"), con:
+            return _inserir(con, df)
+    finally:
+        con.close()
+
+
+def ler_estado_sincronizacao(caminho=DB_PATH):
+    """Estado da sincronização com a planilha (ETag, marca d'água, ...)."""
+    con = conectar(caminho)
+    try:
+        return {chave: json.loads(valor)
+                for chave, valor in con.execute("SELECT chave, valor FROM sincronizacao")}
+    finally:
+        con.close()
+
+
+def inserir_casos_sincronizados(linhas, estado, caminho=DB_PATH):
+    """
+    Grava os casos novos da planilha e o novo estado da sincronização na
+    mesma transação: ou entram os dois, ou nenhum (sem perder nem duplicar).
+    """
+    con = conectar(caminho)
+    try:
+        with trava("casos"), con:
+            inseridos = _inserir(con, pd.DataFrame(linhas, columns=COLUNAS)) if linhas else 0
+            con.executemany(
+                "INSERT OR REPLACE INTO sincronizacao(chave, valor) VALUES (?, ?)",
+                [(chave, json.dumps(valor)) for chave, valor in estado.items()]
+            )
+        return inseridos
+    finally:
+        con.close()
+
+
+def identidades(linhas):
+    """Identidade (COLUNAS_IDENTIDADE, já normalizadas) de cada linha na ordem de COLUNAS."""
+    if not linhas:
+        return []
+    df = _normalizar(pd.DataFrame(linhas, columns=COLUNAS))
+    return list(df[COLUNAS_IDENTIDADE].itertuples(index=False, name=None))
+
+
+def identidades_gravadas(caminho=DB_PATH):
+    """Identidade de cada caso do banco (com repetições)."""
+    con = conectar(caminho)
+    try:
+        return con.execute(f"SELECT {', '.join(COLUNAS_IDENTIDADE)} FROM casos").fetchall()
+    finally:
+        con.close()
+
+
+def contar_casos(caminho=DB_PATH):
+    con = conectar(caminho)
+    try:
+        return con.execute("SELECT valor FROM meta WHERE chave = 'casos'").fetchone()[0]
+    finally:
+        con.close()
+
+
+def assinatura(caminho=DB_PATH):
+    """
+    (geração, maior id, total): muda sempre que os casos mudam. O total vem
+    de meta e o max(id) do índice da chave: não percorre a tabela.
+    """
+    con = conectar(caminho)
+    try:
+        # Uma consulta só: os três valores do mesmo instante
+        return tuple(con.execute(
+            "SELECT (SELECT valor FROM meta WHERE chave = 'geracao'),"
+            " (SELECT coalesce(max(id), 0) FROM casos),"
+            " (SELECT valor FROM meta WHERE chave = 'casos')"
+        ).fetchone())
+    finally:
+        con.close()
+
+
+def _tipar(df):
+    """Colunas do banco/retrato para os tipos usados no pipeline."""
+    df["data"] = pd.to_datetime(df["data"], format="%Y-%m-%d", errors="coerce")
+    for coluna in COLUNAS_NUMERICAS:
+        df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+    return df
+
+
+def _ler_sql(con, where="", parametros=()):
+    df = pd.read_sql_query(
+        f"SELECT id, {', '.join(COLUNAS)} FROM casos {where} ORDER BY id", con, params=parametros
+    )
+    return _tipar(df)
+
+
+def carregar_casos(inicio=None, fim=None, doenca=None, caminho=DB_PATH):
+    """
+    DataFrame tipado dos casos (coluna 'id' + COLUNAS), na ordem de chegada.
+    Com filtros (datas inclusivas e/ou doença) usa os índices do banco.
+    Sem filtros lê o retrato colunar em disco e só busca no banco as
+    linhas que chegaram depois dele.
+    """
+    con = conectar(caminho)
+    try:
+        if inicio is not None or fim is not None or doenca is not None:
+            condicoes, parametros = [], []
+            if doenca is not None:
+                condicoes.append("diagnostico = ?")
+                parametros.append(doenca)
+            if inicio is not None:
+                condicoes.append("data >= ?")
+                parametros.append(pd.to_datetime(inicio).strftime("%Y-%m-%d"))
+            if fim is not None:
+                condicoes.append("data <= ?")
+                parametros.append(pd.to_datetime(fim).strftime("%Y-%m-%d"))
+            return _ler_sql(con, "WHERE " + " AND ".join(condicoes), parametros)
+        return _carregar_tudo(con, caminho)
+    finally:
+        con.close()
+
+
+def _carregar_tudo(con, caminho):
+    geracao = con.execute("SELECT valor FROM meta WHERE chave = 'geracao'").fetchone()[0]
+    retrato = None
+    arquivo = caminho_retrato(caminho)
+    if os.path.exists(arquivo):
+        try:
+            retrato = _ler_retrato(arquivo)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"[ERRO] Retrato dos casos ilegível, relendo do banco: {e}")
+    if retrato is None or retrato["geracao"] != geracao:
+        base, maior_id = None, 0
+    else:
+        base, maior_id = retrato["df"], retrato["maior_id"]
+
+    novos = _ler_sql(con, "WHERE id > ?", (maior_id,))
+    if base is None:
+        df = novos
+    elif novos.empty:
+        df = base
+    else:
+        df = pd.concat([base, novos], ignore_index=True)
+    for coluna in COLUNAS_CATEGORIAS:
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(str)
+
+    if base is None or len(novos) >= max(MIN_LINHAS_REGRAVAR, len(base) // 20):
+        _gravar_retrato(df, geracao, arquivo)
+    return df
+
+
+def _gravar_retrato(df, geracao, arquivo):
+    """
+    Retrato sem pickle: colunas numéricas e datas como arrays do .npz; as de
+    texto num JSON guardado no mesmo arquivo (categorias + códigos para as
+    COLUNAS_CATEGORIAS, lista para as COLUNAS_TEXTO).
+    """
+    maior_id = int(df["id"].max()) if len(df) else 0
+    arrays = {"id": df["id"].to_numpy(), "data": df["data"].to_numpy()}
+    for coluna in COLUNAS_NUMERICAS:
+        arrays[coluna] = df[coluna].to_numpy()
+    textos = {"geracao": geracao, "maior_id": maior_id, "categorias": {}}
+    for coluna in COLUNAS_CATEGORIAS:
+        categorias = df[coluna].astype("category")
+        arrays[coluna] = categorias.cat.codes.to_numpy(dtype=np.int32)
+        textos["categorias"][coluna] = categorias.cat.categories.tolist()
+    for coluna in COLUNAS_TEXTO:
+        textos[coluna] = df[coluna].astype(object).where(df[coluna].notna(), None).tolist()
+    arrays["textos"] = np.array(json.dumps(textos, ensure_ascii=False))
+    gravar_atomico(arquivo, lambda temporario: np.savez(temporario, **arrays))
+
+
+def _ler_retrato(arquivo):
+    """Lê o que o _gravar_retrato gravou (allow_pickle=False: só arrays)."""
+    with np.load(arquivo, allow_pickle=False) as dados:
+        textos = json.loads(str(dados["textos"]))
+        colunas = {"id": dados["id"]}
+        for coluna in COLUNAS:
+            if coluna in COLUNAS_CATEGORIAS:
+                colunas[coluna] = pd.Categorical.from_codes(dados[coluna], textos["categorias"][coluna])
+            elif coluna in COLUNAS_TEXTO:
+                colunas[coluna] = textos[coluna]
+            else:
+                colunas[coluna] = dados[coluna]
+    return {"geracao": textos["geracao"], "maior_id": textos["maior_id"], "df": pd.DataFrame(colunas)}
+
+
+def importar_csv(caminho_csv=CSV_PATH, caminho=DB_PATH):
+    """Substitui todos os casos do banco pelos do CSV. Devolve quantos entraram."""
+    df = pd.read_csv(caminho_csv, sep=",", quotechar='"', engine="python")
+    con = conectar(caminho)
+    try:
+        return _importar(con, df)
+    finally:
+        con.close()
+
+
+def exportar_csv(caminho_csv=CSV_PATH, caminho=DB_PATH):
+    """Grava os casos no formato do dados_pacientes.csv (mesmo cabeçalho)."""
+    df = carregar_casos(caminho=caminho)
+    df = df[COLUNAS].copy()
+    df["data"] = df["data"].dt.strftime("%Y-%m-%d")
+    df["idade"] = df["idade"].astype("Int64")
+    gravar_atomico(caminho_csv, lambda temporario: df.to_csv(temporario, index=False))
+    return len(df)
+
+
+if __name__ == "__main__":
+    # python armazenamento_casos.py importar|exportar [arquivo.csv]
+    if len(sys.argv) > 1 and sys.argv[1] in ("importar", "exportar"):
+        arquivo_csv = sys.argv[2] if len(sys.argv) > 2 else CSV_PATH
+        if sys.argv[1] == "importar":
+            print(f"{importar_csv(arquivo_csv)} casos importados de {arquivo_csv}")
+        else:
+            print(f"{exportar_csv(arquivo_csv)} casos exportados para {arquivo_csv}")
+    else:
+        print("Uso: python armazenamento_casos.py importar|exportar [arquivo.csv]")
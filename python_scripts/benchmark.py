@@ -0,0 +1,384 @@
+"""
+Benchmark do GeoEpi com casos sintéticos.
+
+    python benchmark.py [--tamanhos 1000 10000 100000 1000000] [--dias 365] [--saida relatorio.json]
+    python benchmark.py --comparar antigo.json novo.json
+    python benchmark.py --importacao
+
+Tudo roda numa pasta temporária (GEOEPI_DADOS): banco, matrizes, imagens e
+mapas de verdade não são tocados. O relatório JSON tem, para cada tamanho
+e etapa, o tempo e o pico de memória (tracemalloc), além do tempo de
+importar main.py e app.py num processo novo (--importacao só mede isso e
+termina com erro se passar de ORCAMENTO_IMPORTACAO_S).
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Antes de importar o projeto: os caminhos são lidos na importação. Os
+# processos dos pools (forkserver/spawn) reimportam este arquivo e usam a
+# mesma pasta em vez de criar outra
+PASTA_BENCHMARK = os.environ.get("GEOEPI_BENCHMARK_PASTA") or tempfile.mkdtemp(prefix="geoepi_benchmark_")
+os.environ["GEOEPI_BENCHMARK_PASTA"] = PASTA_BENCHMARK
+os.environ["GEOEPI_DADOS"] = PASTA_BENCHMARK
+_diretorio_original = os.getcwd()
+os.chdir(PASTA_BENCHMARK)
+
+import numpy as np
+import pandas as pd
+
+import armazenamento_casos
+from coleta_dados_google import bairro_coords, adicionar_no_csv, baixar_e_formatar_csv
+from dbscan import atualizar_matriz_distancia, detectar_clusters, detectar_surtos_por_data
+from gerar_imagens import gerar_mapas, renderizar_graficos, tarefas_grafico_geral, tarefas_graficos_pizza
+from ingestao import FilaIngestao
+
+
+# 1_000_000 também funciona, mas só com --tamanhos (leva minutos)
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]
+# Proporção de cada doença nos casos sintéticos
+MISTURA_DOENCAS = {"Dengue": 0.45, "COVID": 0.25, "Influenza": 0.2, "Zika": 0.1}
+# Etapas que crescem com n² ou geram um arquivo por caso têm teto
+LIMITE_MATRIZ = 10_000
+LIMITE_FORMULARIO = 500
+LIMITE_MAPA = 100_000
+# Importar main.py/app.py não pode carregar bibliotecas pesadas
+MODULOS_IMPORTACAO = ("main", "app")
+MODULOS_PESADOS = ("matplotlib", "folium", "sklearn", "scipy")
+ORCAMENTO_IMPORTACAO_S = 1.0
+
+
+def gerar_casos(n, dias=365, inicio="2025-01-01", semente=0):
+    """
+    Casos sintéticos no formato do banco: bairros e coordenadas do
+    bairro_coords (com um pequeno deslocamento), mistura de doenças e datas
+    espalhadas por `dias` dias a partir de `inicio`.
+    """
+    rng = np.random.default_rng(semente)
+    bairros = list(bairro_coords)
+    bairro_idx = rng.integers(0, len(bairros), n)
+    lats = np.empty(n)
+    lons = np.empty(n)
+    for b, bairro in enumerate(bairros):
+        pontos = np.array(bairro_coords[bairro], dtype=float)
+        sel = np.flatnonzero(bairro_idx == b)
+        escolhidos = pontos[rng.integers(0, len(pontos), len(sel))]
+        lats[sel] = escolhidos[:, 0]
+        lons[sel] = escolhidos[:, 1]
+    # ~200 m de espalhamento em volta do ponto do bairro
+    lats += rng.normal(0, 0.002, n)
+    lons += rng.normal(0, 0.002, n)
+    doencas = rng.choice(list(MISTURA_DOENCAS), n, p=list(MISTURA_DOENCAS.values()))
+    datas = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, dias, n), unit="D")
+    return pd.DataFrame({
+        "nome": [f"Sintetico {i}" for i in range(n)],
+        "idade": rng.integers(0, 95, n),
+        "genero": rng.choice(["Masculino", "Feminino"], n),
+        "peso": rng.normal(70, 15, n).round(1),
+        "altura": rng.normal(1.70, 0.1, n).round(2),
+        "local_lat": lats.round(6),
+        "local_lon": lons.round(6),
+        "bairro": np.array(bairros)[bairro_idx],
+        "data": datas,
+        "diagnostico": doencas,
+    })
+
+
+def _csv_planilha(df):
+    """Mesmo layout do CSV exportado do Google Forms."""
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    escritor.writerow(["Carimbo de data/hora", "Nome", "Idade", "Gênero", "Peso",
+                       "Altura", "Bairro", "Diagnóstico"])
+    carimbos = df["data"].dt.strftime("%d/%m/%Y") + " 12:00:00"
+    for carimbo, linha in zip(carimbos, df.itertuples(index=False)):
+        escritor.writerow([carimbo, linha.nome, linha.idade, linha.genero, linha.peso,
+                           linha.altura, linha.bairro, linha.diagnostico])
+    return saida.getvalue().encode("utf-8")
+
+
+class _PlanilhaLocal:
+    """Servidor HTTP local no lugar do Google Sheets (responde 304 ao ETag)."""
+
+    def __init__(self, conteudo):
+        etag = f'"{len(conteudo)}-{hash(conteudo) & 0xffffffff:x}"'
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv; charset=utf-8")
+                self.send_header("Content-Length", str(len(conteudo)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(conteudo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}/planilha.csv"
+
+    def __enter__(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def _zerar_dados():
+    """Apaga banco, matrizes, imagens e mapas da pasta do benchmark."""
+    for nome in os.listdir(PASTA_BENCHMARK):
+        caminho = os.path.join(PASTA_BENCHMARK, nome)
+        if nome == "imagens":
+            for arquivo in os.listdir(caminho):
+                os.remove(os.path.join(caminho, arquivo))
+        elif os.path.isdir(caminho):
+            shutil.rmtree(caminho)
+        else:
+            os.remove(caminho)
+
+
+def medir(etapa, n, funcao, medir_memoria=True, **extras):
+    """Roda funcao() e devolve o registro do relatório (tempo, pico de memória, extras)."""
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    retorno = funcao()
+    segundos = time.perf_counter() - inicio
+    pico = None
+    if medir_memoria:
+        pico = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    registro = {"etapa": etapa, "n": n, "segundos": round(segundos, 6),
+                "pico_memoria_mb": round(pico, 3) if pico is not None else None}
+    registro.update(extras)
+    print(f"  {etapa:<28} {segundos:10.4f} s" + (f"  {pico:9.1f} MiB" if pico is not None else ""))
+    return registro, retorno
+
+
+def _pulado(etapa, n, motivo):
+    print(f"  {etapa:<28} pulado ({motivo})")
+    return {"etapa": etapa, "n": n, "pulado": motivo}
+
+
+def rodar_tamanho(n, dias, medir_memoria=True):
+    _zerar_dados()
+    df = gerar_casos(n, dias)
+    registros = []
+    mem = medir_memoria
+
+    # Formulário do site: um caso por chamada, direto e pela fila em lote
+    n_form = min(n, LIMITE_FORMULARIO)
+    amostra = df.head(n_form).copy()
+    amostra["data"] = amostra["data"].dt.strftime("%Y-%m-%d")
+    envios = amostra.astype(str).to_dict("records")
+    r, _ = medir("adicionar_no_csv", n_form, lambda: [adicionar_no_csv(d) for d in envios], mem)
+    r["por_segundo"] = round(n_form / r["segundos"], 2)
+    registros.append(r)
+
+    def enviar_em_paralelo():
+        fila = FilaIngestao().iniciar()
+        partes = [envios[i::8] for i in range(8)]
+        threads = [threading.Thread(target=lambda p=p: [adicionar_no_csv(d, fila) for d in p])
+                   for p in partes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return fila.estatisticas()
+    r, estat = medir("adicionar_no_csv_fila_8", n_form, enviar_em_paralelo, mem)
+    r["por_segundo"] = round(n_form / r["segundos"], 2)
+    r["media_por_lote"] = estat["media_por_lote"]
+    registros.append(r)
+
+    # Planilha: carga completa e depois um ciclo sem mudança (304)
+    _zerar_dados()
+    with _PlanilhaLocal(_csv_planilha(df)) as planilha:
+        r, inseridas = medir("baixar_e_formatar_csv", n, lambda: baixar_e_formatar_csv(planilha.url), mem)
+        r["inseridas"] = inseridas
+        r["por_segundo"] = round(n / r["segundos"], 2)
+        registros.append(r)
+        r, _ = medir("baixar_e_formatar_csv_304", n, lambda: baixar_e_formatar_csv(planilha.url), mem)
+        registros.append(r)
+
+    r, casos = medir("carregar_casos", n, armazenamento_casos.carregar_casos, mem)
+    registros.append(r)
+
+    # Matriz de distâncias: 90% já em disco, 10% chegando
+    doenca = max(MISTURA_DOENCAS, key=MISTURA_DOENCAS.get)
+    grupo = df[df["diagnostico"] == doenca]
+    if len(grupo) <= LIMITE_MATRIZ:
+        corte = int(len(grupo) * 0.9)
+        coords = list(zip(grupo["local_lat"], grupo["local_lon"]))
+        datas = list(grupo["data"])
+        atualizar_matriz_distancia("benchmark_matriz", [], [], coords[:corte], datas[:corte])
+        r, _ = medir("atualizar_matriz_distancia", len(grupo),
+                     lambda: atualizar_matriz_distancia("benchmark_matriz", coords[:corte], datas[:corte],
+                                                        coords[corte:], datas[corte:]), mem,
+                     novos=len(grupo) - corte)
+    else:
+        r = _pulado("atualizar_matriz_distancia", len(grupo), f"mais de {LIMITE_MATRIZ} casos")
+    registros.append(r)
+
+    # Clusterização
+    if n <= LIMITE_MATRIZ:
+        r, _ = medir("detectar_clusters_denso", n,
+                     lambda: detectar_clusters(df, usar_cache=False, modo="denso"), mem)
+    else:
+        r = _pulado("detectar_clusters_denso", n, f"mais de {LIMITE_MATRIZ} casos")
+    registros.append(r)
+    r, df_clusters = medir("detectar_clusters_esparso", n, lambda: detectar_clusters(df, modo="esparso"), mem)
+    r["clusters"] = int(df_clusters["cluster"].max() + 1)
+    registros.append(r)
+
+    data_ref = (pd.Timestamp("2025-01-01") + pd.Timedelta(days=dias // 2)).strftime("%Y-%m-%d")
+    r, _ = medir("detectar_surtos_por_data", n,
+                 lambda: detectar_surtos_por_data(df, data_ref, modo="esparso"), mem)
+    registros.append(r)
+
+    # Gráficos: primeira vez e ciclo sem mudança
+    tarefas = tarefas_grafico_geral(df_clusters) + tarefas_graficos_pizza(df_clusters)
+    r, feitos = medir("graficos", n, lambda: renderizar_graficos(tarefas), mem)
+    r["desenhados"] = len(feitos)
+    registros.append(r)
+    r, feitos = medir("graficos_sem_mudanca", n, lambda: renderizar_graficos(tarefas), mem)
+    r["desenhados"] = len(feitos)
+    registros.append(r)
+
+    if n <= LIMITE_MAPA:
+        r, caminhos = medir("mapas", n, lambda: gerar_mapas(df_clusters), mem)
+        r["tamanho_mapa_mb"] = round(os.path.getsize(caminhos[0]) / 2**20, 3)
+    else:
+        r = _pulado("mapas", n, f"mais de {LIMITE_MAPA} casos")
+    registros.append(r)
+    return registros
+
+
+_CODIGO_IMPORTACAO = """
+import json, sys, time
+inicio = time.perf_counter()
+__import__(sys.argv[1])
+segundos = time.perf_counter() - inicio
+print(json.dumps({"segundos": segundos, "pesados": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def medir_importacao(modulo):
+    """
+    Tempo de `import modulo` num processo novo (sem nada em cache), e quais
+    dos MODULOS_PESADOS ele carregou.
+    """
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    processo = subprocess.run([sys.executable, "-c", _CODIGO_IMPORTACAO, modulo, *MODULOS_PESADOS],
+                              capture_output=True, text=True, cwd=pasta, timeout=120,
+                              env={**os.environ, "GEOEPI_DADOS": PASTA_BENCHMARK})
+    if processo.returncode != 0:
+        raise RuntimeError(f"import {modulo} falhou:\n{processo.stderr}")
+    medida = json.loads(processo.stdout.strip().splitlines()[-1])
+    return {"etapa": f"importar_{modulo}", "n": 0, "segundos": round(medida["segundos"], 4),
+            "pesados": medida["pesados"],
+            "dentro_orcamento": medida["segundos"] <= ORCAMENTO_IMPORTACAO_S and not medida["pesados"]}
+
+
+def verificar_importacao():
+    """Mede MODULOS_IMPORTACAO; devolve (registros, tudo dentro do orçamento)."""
+    registros = [medir_importacao(modulo) for modulo in MODULOS_IMPORTACAO]
+    for r in registros:
+        situacao = "ok" if r["dentro_orcamento"] else "[ERRO] fora do orçamento"
+        pesados = f" carregou {', '.join(r['pesados'])}" if r["pesados"] else ""
+        print(f"{r['etapa']:<28} {r['segundos']:>8.3f} s (orçamento {ORCAMENTO_IMPORTACAO_S} s){pesados} {situacao}")
+    return registros, all(r["dentro_orcamento"] for r in registros)
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(arquivo_antigo, arquivo_novo):
+    """Tabela de tempo novo / antigo por (etapa, n)."""
+    with open(arquivo_antigo, encoding="utf-8") as f:
+        antigo = {(r["etapa"], r["n"]): r for r in json.load(f)["resultados"] if "segundos" in r}
+    with open(arquivo_novo, encoding="utf-8") as f:
+        novo = [r for r in json.load(f)["resultados"] if "segundos" in r]
+    print(f"{'etapa':<28} {'n':>9} {'antigo (s)':>11} {'novo (s)':>11} {'razão':>7}")
+    for r in novo:
+        base = antigo.get((r["etapa"], r["n"]))
+        if base is None:
+            continue
+        razao = r["segundos"] / base["segundos"] if base["segundos"] else float("inf")
+        print(f"{r['etapa']:<28} {r['n']:>9} {base['segundos']:>11.4f} {r['segundos']:>11.4f} {razao:>7.2f}")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark do GeoEpi com casos sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS_PADRAO)
+    parser.add_argument("--dias", type=int, default=365, help="espalhamento das datas dos casos")
+    parser.add_argument("--saida", help="arquivo JSON do relatório")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória (mais rápido)")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTIGO", "NOVO"))
+    parser.add_argument("--importacao", action="store_true",
+                        help="só mede o tempo de importar main.py e app.py (sai com erro acima do orçamento)")
+    args = parser.parse_args(argumentos)
+
+    if args.importacao:
+        try:
+            _, dentro = verificar_importacao()
+        finally:
+            os.chdir(_diretorio_original)
+            shutil.rmtree(PASTA_BENCHMARK, ignore_errors=True)
+        sys.exit(0 if dentro else 1)
+
+    if args.comparar:
+        os.chdir(_diretorio_original)
+        shutil.rmtree(PASTA_BENCHMARK, ignore_errors=True)
+        comparar(*args.comparar)
+        return None
+
+    relatorio = {
+        "versao_codigo": _versao_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"tamanhos": args.tamanhos, "dias": args.dias},
+        "resultados": [],
+    }
+    try:
+        relatorio["resultados"].extend(verificar_importacao()[0])
+        for n in args.tamanhos:
+            print(f"[INFO] {n} casos")
+            relatorio["resultados"].extend(rodar_tamanho(n, args.dias, not args.sem_memoria))
+    finally:
+        os.chdir(_diretorio_original)
+        shutil.rmtree(PASTA_BENCHMARK, ignore_errors=True)
+
+    saida = args.saida or f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"Relatório salvo em: {os.path.abspath(saida)}")
+    return relatorio
+
+
+if __name__ == "__main__":
+    main()
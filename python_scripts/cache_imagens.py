@@ -0,0 +1,102 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from metricas import contar, definir
+
+
+# Larguras (px) das miniaturas; um pedido é arredondado para a próxima
+LARGURAS = (160, 320, 480, 640, 960)
+LIMITE_BYTES = 32 * 1024 * 1024
+
+
+def largura_permitida(pedida):
+    """Menor largura de LARGURAS que cobre a pedida (None: a imagem original)."""
+    for largura in LARGURAS:
+        if pedida <= largura:
+            return largura
+    return None
+
+
+def _miniatura(conteudo, largura):
+    # Pillow já vem com o matplotlib; só é carregado se alguém pedir miniatura
+    from PIL import Image
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        if imagem.width <= largura:
+            return conteudo
+        altura = max(1, round(imagem.height * largura / imagem.width))
+        menor = imagem.resize((largura, altura), Image.LANCZOS)
+        saida = io.BytesIO()
+        menor.save(saida, format="PNG", optimize=True)
+        return saida.getvalue()
+
+
+class CacheImagens:
+    """
+    PNGs (e miniaturas) em memória, do menos usado para o mais usado, até
+    limite_bytes. A chave inclui o arquivo e seu mtime/tamanho: um PNG
+    publicado numa versão nova é outra entrada, e a antiga sai pelo LRU.
+    """
+
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def _buscar(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+            return entrada
+
+    def _guardar(self, chave, entrada):
+        with self._trava:
+            if chave not in self._entradas:
+                self._entradas[chave] = entrada
+                self._bytes += len(entrada[0])
+            while self._bytes > self.limite_bytes and len(self._entradas) > 1:
+                _, (conteudo, _, _) = self._entradas.popitem(last=False)
+                self._bytes -= len(conteudo)
+            definir("cache_imagens_bytes", self._bytes)
+        return entrada
+
+    def obter(self, caminho, largura=None):
+        """
+        (conteúdo, etag, última modificação) do PNG em `caminho`, reduzido
+        para `largura` se pedida. None se o arquivo não existe.
+        """
+        try:
+            estado = os.stat(caminho)
+        except FileNotFoundError:
+            return None
+        chave = (caminho, estado.st_mtime_ns, estado.st_size, largura)
+        entrada = self._buscar(chave)
+        if entrada is not None:
+            contar("cache_imagens", resultado="acerto")
+            return entrada
+        contar("cache_imagens", resultado="falta")
+
+        if largura is None:
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            modificado = datetime.fromtimestamp(estado.st_mtime, timezone.utc)
+            etag = hashlib.blake2b(conteudo, digest_size=12).hexdigest()
+            return self._guardar(chave, (conteudo, etag, modificado))
+
+        original = self.obter(caminho)
+        if original is None:
+            return None
+        conteudo, etag, modificado = original
+        return self._guardar(chave, (_miniatura(conteudo, largura), f"{etag}-{largura}", modificado))
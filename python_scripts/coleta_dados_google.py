@@ -1,18 +1,15 @@
 import os
 import csv
 import random
-import requests
 from datetime import datetime
 from dotenv import load_dotenv
 import re
-import time
-
-load_dotenv()
-url = os.getenv("GOOGLE_SHEET_URL")
-
-pasta_destino = os.path.join(os.getcwd(), "python_scripts")
-os.makedirs(pasta_destino, exist_ok=True)
-arquivo_csv = os.path.join(pasta_destino, "dados_pacientes.csv")
+import hashlib
+from collections import Counter
+from metricas import contar, cronometrar
+from publicacao import trava
+from armazenamento_casos import (inserir_casos, inserir_casos_sincronizados, ler_estado_sincronizacao,
+                                 identidades, identidades_gravadas)
 
 
 bairro_coords = {
@@ -69,83 +66,158 @@ bairro_coords = {
 }
 
 
-def baixar_e_formatar_csv():
-    pasta_destino = os.path.join(os.getcwd(), "python_scripts")
-    os.makedirs(pasta_destino, exist_ok=True)
-    arquivo_csv = os.path.join(pasta_destino, "dados_pacientes.csv")
+# Formatos do carimbo de data/hora do Google Forms (pt-BR e en-US)
+FORMATOS_CARIMBO = ["%d/%m/%Y %H:%M:%S", "%m/%d/%Y %H:%M:%S"]
 
-    #Baixa do Google
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"[ERRO] Falha ao baixar o CSV. Status code: {response.status_code}")
-        return
-
-    content = response.content.decode('utf-8').splitlines()
-    reader = csv.reader(content)
-    next(reader, None)  # ignora o cabeçalho do Google Forms
-    linhas_novas_brutas = list(reader)
-
-    #Conta as linhas
-    if os.path.exists(arquivo_csv):
-        with open(arquivo_csv, "r", encoding="utf-8") as f:
-            leitor = csv.reader(f)
-            linhas_atuais = list(leitor)[1:]  # ignora cabeçalho
-    else:
-        linhas_atuais = []
 
-    num_linhas_atuais = len(linhas_atuais)
-    num_linhas_novas = len(linhas_novas_brutas)
-    diferenca = num_linhas_novas - num_linhas_atuais
+def url_planilha_padrao():
+    """GOOGLE_SHEET_URL do ambiente ou do .env (lido só quando a planilha é baixada)."""
+    load_dotenv()
+    return os.getenv("GOOGLE_SHEET_URL")
 
-    if diferenca <= 0:
-        print("[INFO] Nenhuma nova linha encontrada.")
-        return
-
-    #Formatação
-    novas_formatadas = []
-    for row in linhas_novas_brutas[-diferenca:]:
-        nome = row[1]
-        nome_limpo = re.sub(r'[^A-Za-zÀ-ÿ0-9 ]+', ' ', nome).strip()
-        idade = row[2]
-        genero = row[3]
-        peso = row[4]
-        altura = row[5]
-        bairro = row[6]
-        diagnostico = row[7]
-        data_formatada = datetime.now().strftime('%Y-%m-%d')
-
-        coords_list = bairro_coords.get(bairro)
-        if coords_list:
-            #latitude, longitude = coords_list[0] #No Random
-            latitude, longitude = random.choice(coords_list) #RANDOM
-        else:
-            latitude, longitude = [None, None]
 
-        novas_formatadas.append([
-            nome_limpo, idade, genero, peso, altura, latitude, longitude, bairro, data_formatada, diagnostico
-        ])
+def _ler_carimbo(texto):
+    for formato in FORMATOS_CARIMBO:
+        try:
+            return datetime.strptime(texto.strip(), formato)
+        except ValueError:
+            continue
+    return None
+
+
+def _identidade_linha(row):
+    return hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()
+
+
+def _formatar_linha_planilha(row, carimbo):
+    nome = row[1]
+    nome_limpo = re.sub(r'[^A-Za-zÀ-ÿ0-9 ]+', ' ', nome).strip()
+    idade = row[2]
+    genero = row[3]
+    peso = row[4]
+    altura = row[5]
+    bairro = row[6]
+    diagnostico = row[7]
+    data_formatada = carimbo.strftime('%Y-%m-%d')
+
+    coords_list = bairro_coords.get(bairro)
+    if coords_list:
+        #latitude, longitude = coords_list[0] #No Random
+        latitude, longitude = random.choice(coords_list) #RANDOM
+    else:
+        latitude, longitude = [None, None]
 
-    header = ['nome', 'idade', 'genero', 'peso', 'altura',
-              'local_lat', 'local_lon', 'bairro', 'data', 'diagnostico']
+    return [nome_limpo, idade, genero, peso, altura, latitude, longitude, bairro, data_formatada, diagnostico]
+
+
+@cronometrar("planilha")
+def baixar_e_formatar_csv(url_planilha=None):
+    """
+    Sincroniza a planilha do Google com o banco de casos. Devolve quantas
+    linhas entraram.
+    - Pedido condicional (ETag / Last-Modified): sem mudança, o Google
+      responde 304 e nada é baixado nem relido.
+    - O CSV é lido em fluxo, linha a linha.
+    - O carimbo de data/hora do formulário é a marca d'água: só entram
+      linhas mais novas que a marca (ou do mesmo instante e ainda não
+      vistas). Casos inseridos pelo site não mexem nessa conta.
+    - Primeira sincronização depois de importar o dados_pacientes.csv
+      antigo: as linhas da planilha que já vieram no CSV (mesmo nome,
+      idade, gênero, peso, altura, bairro e diagnóstico) não entram de novo.
+    Com a trava 'planilha': dois processos nunca leem a mesma marca e
+    inserem as mesmas linhas.
+    """
+    with trava("planilha"):
+        return _sincronizar_planilha(url_planilha or url_planilha_padrao())
+
+
+def _sincronizar_planilha(url_planilha):
+    # requests só é importado quando há planilha para baixar
+    import requests
+    estado = ler_estado_sincronizacao()
+    cabecalhos = {}
+    if estado.get("etag"):
+        cabecalhos["If-None-Match"] = estado["etag"]
+    if estado.get("last_modified"):
+        cabecalhos["If-Modified-Since"] = estado["last_modified"]
 
-    if not os.path.exists(arquivo_csv):
-        with open(arquivo_csv, "w", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(header)
-            f.write("\n")
+    #Baixa do Google
+    response = requests.get(url_planilha, headers=cabecalhos, stream=True, timeout=30)
+    with response:
+        if response.status_code == 304:
+            print("[INFO] Planilha sem alterações (304).")
+            contar("planilha_downloads", status="304")
+            return 0
+        if response.status_code != 200:
+            print(f"[ERRO] Falha ao baixar o CSV. Status code: {response.status_code}")
+            contar("planilha_downloads", status=str(response.status_code))
+            return 0
+
+        marca = datetime.fromisoformat(estado["marca"]) if estado.get("marca") else None
+        vistos_na_marca = set(estado.get("vistos_na_marca", []))
+        nova_marca, vistos_nova_marca = marca, set(vistos_na_marca)
+
+        response.encoding = "utf-8"
+        reader = csv.reader(response.iter_lines(decode_unicode=True))
+        next(reader, None)  # ignora o cabeçalho do Google Forms
+
+        #Formatação
+        novas_formatadas = []
+        for row in reader:
+            if len(row) < 8:
+                continue
+            carimbo = _ler_carimbo(row[0])
+            if carimbo is None:
+                print(f"[ERRO] Carimbo de data/hora inválido na planilha: {row[0]!r}")
+                continue
+            identidade = _identidade_linha(row)
+            if marca is not None and (carimbo < marca or (carimbo == marca and identidade in vistos_na_marca)):
+                continue
+            novas_formatadas.append(_formatar_linha_planilha(row, carimbo))
+            if nova_marca is None or carimbo > nova_marca:
+                nova_marca, vistos_nova_marca = carimbo, {identidade}
+            elif carimbo == nova_marca:
+                vistos_nova_marca.add(identidade)
+
+        if marca is None and estado.get("legado"):
+            novas_formatadas = _sem_casos_importados(novas_formatadas)
+
+        novo_estado = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "marca": nova_marca.isoformat() if nova_marca else None,
+            "vistos_na_marca": sorted(vistos_nova_marca),
+            "legado": False,
+        }
+
+    # Grava as novas linhas e a nova marca numa única transação
+    inseridas = inserir_casos_sincronizados(novas_formatadas, novo_estado)
+    contar("planilha_downloads", status="200")
+    contar("casos_inseridos", inseridas, origem="planilha")
+    if not inseridas:
+        print("[INFO] Nenhuma nova linha encontrada.")
+    return inseridas
 
-    # Garante que as novas linhas sejam salvas
-    with open(arquivo_csv, "a", newline='', encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(novas_formatadas)
-        f.flush()
-        os.fsync(f.fileno())
-    time.sleep(1)
 
+def _sem_casos_importados(linhas):
+    """Tira das linhas as que já estão no banco (cada caso gravado descarta uma linha)."""
+    gravados = Counter(identidades_gravadas())
+    novas = []
+    for linha, identidade in zip(linhas, identidades(linhas)):
+        if gravados[identidade] > 0:
+            gravados[identidade] -= 1
+        else:
+            novas.append(linha)
+    if len(novas) < len(linhas):
+        print(f"[INFO] {len(linhas) - len(novas)} linhas da planilha já vieram do dados_pacientes.csv.")
+    return novas
 
-def adicionar_no_csv(dados):
-    header = ['nome', 'idade', 'genero', 'peso', 'altura',
-              'local_lat', 'local_lon', 'bairro', 'data', 'diagnostico']
+
+def adicionar_no_csv(dados, fila=None):
+    """
+    Valida, limpa e grava um caso vindo do formulário do site no banco de casos.
+    Com uma FilaIngestao, a gravação entra no lote dela (group commit).
+    """
     obrigatorios = ['nome', 'idade', 'genero', 'peso', 'altura', 'bairro', 'diagnostico']
     for campo in obrigatorios:
         if campo not in dados or not dados[campo]:
@@ -171,11 +243,8 @@ def adicionar_no_csv(dados):
         latitude, longitude, bairro, data_str, diagnostico
     ]
 
-    arquivo_existe = os.path.exists(arquivo_csv)
-    with open(arquivo_csv, "a", newline='', encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not arquivo_existe:
-            writer.writerow(header)
-        writer.writerow(linha)
-        f.flush()
-        os.fsync(f.fileno())
+    if fila is not None:
+        fila.enviar(linha)
+    else:
+        inserir_casos([linha])
+    contar("casos_inseridos", origem="formulario")
@@ -1,83 +1,656 @@
 import pandas as pd
 import numpy as np
-from sklearn.cluster import DBSCAN
-from haversine import haversine
 from datetime import timedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
+import hashlib
 import os
-import sys
 
+from metricas import etapa, contar, definir, cronometrar, retirar, incorporar
+from publicacao import trava, gravar_atomico
+from registro import caminho_registro, iniciar_registro
 
+# sklearn e scipy são importados dentro das funções que os usam: importar
+# este módulo (ex.: só para ler uma matriz) não carrega nenhum dos dois.
 
-# Salvar Logs
-LOG_FILE = "saida_python.log"
-sys.stdout = open(LOG_FILE, "w", encoding="utf-8")
+
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
+MATRIZES_PATH = os.path.join(base_path, "matrizes")
+
+
+# Número máximo de elementos calculados por bloco (limita o uso de memória)
+TAMANHO_BLOCO = 2_000_000
+NS_POR_DIA = 86_400 * 10**9
+RAIO_TERRA_KM = 6371.0088
+# Abaixo disso o custo de subir os processos não compensa
+MIN_CASOS_PARALELO = 5_000
+TIPOS_COMPARTILHADOS = {"lats": np.float64, "lons": np.float64, "dias": np.int64}
+_pool = None
+
+
+def _distancia_hibrida(lat_i, lon_i, dias_i, lat_j, lon_j, dias_j, peso_tempo):
+    """Fórmula do haversine() + timedelta.days, aplicada elemento a elemento."""
+    lat1 = np.radians(lat_i)
+    lon1 = np.radians(lon_i)
+    lat2 = np.radians(lat_j)
+    lon2 = np.radians(lon_j)
+    d = (np.sin((lat2 - lat1) * 0.5) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2)
+    dist_geo = RAIO_TERRA_KM * (2 * np.arcsin(np.sqrt(d)))
+    # timedelta.days arredonda para baixo, por isso floor_divide antes do abs
+    dist_tempo = np.abs(np.floor_divide(dias_i - dias_j, NS_POR_DIA))
+    return dist_geo + dist_tempo * peso_tempo * 5
+
+
+def calcular_bloco_distancias(lats_i, lons_i, dias_i, lats_j, lons_j, dias_j, peso_tempo=1/30):
+    """
+    Calcula de uma vez as distâncias híbridas (geo + tempo) entre os pontos i
+    (linhas) e j (colunas). Mesma fórmula do haversine() e do timedelta.days.
+    """
+    return _distancia_hibrida(
+        lats_i[:, None], lons_i[:, None], dias_i[:, None],
+        lats_j[None, :], lons_j[None, :], dias_j[None, :],
+        peso_tempo
+    )
+
+
+def construir_grafo_vizinhanca(lats, lons, dias, eps_km, peso_tempo=1/30):
+    """
+    Grafo esparso (CSR) só com os pares a distância híbrida <= eps_km.
+    Os candidatos vêm de um BallTree (haversine) montado por faixas de
+    tempo: dois casos só podem estar a menos de eps_km se a diferença de
+    dias couber em eps_km / (peso_tempo * 5).
+    """
+    from sklearn.neighbors import BallTree
+    from scipy.sparse import csr_matrix
+    n = len(lats)
+    dia_abs = np.floor_divide(dias, NS_POR_DIA)
+    if peso_tempo > 0:
+        # +1 cobre a diferença entre floor(a) - floor(b) e floor(a - b)
+        largura = int(eps_km / (peso_tempo * 5)) + 2
+        faixas = (dia_abs - dia_abs.min()) // largura if n else dia_abs
+    else:
+        faixas = np.zeros(n, dtype=np.int64)
+
+    raio = eps_km / RAIO_TERRA_KM * (1 + 1e-6)
+    pontos_rad = np.radians(np.column_stack([lats, lons]))
+    membros = {f: np.flatnonzero(faixas == f) for f in np.unique(faixas)}
+
+    origens, destinos = [], []
+    for faixa, idx in membros.items():
+        candidatos = np.concatenate([idx, membros.get(faixa + 1, idx[:0])])
+        arvore = BallTree(pontos_rad[candidatos], metric="haversine")
+        vizinhos = arvore.query_radius(pontos_rad[idx], r=raio)
+        for a, viz in zip(idx, vizinhos):
+            b = candidatos[viz]
+            # Cada par uma única vez: dentro da faixa só b > a
+            b = b[(b > a) | (faixas[b] != faixa)]
+            origens.append(np.full(len(b), a))
+            destinos.append(b)
+
+    a = np.concatenate(origens) if origens else np.zeros(0, dtype=np.int64)
+    b = np.concatenate(destinos) if destinos else np.zeros(0, dtype=np.int64)
+    # Mesma orientação da matriz densa: linha i maior que coluna j
+    i, j = np.maximum(a, b), np.minimum(a, b)
+    dist = _distancia_hibrida(lats[i], lons[i], dias[i], lats[j], lons[j], dias[j], peso_tempo)
+    dentro = dist <= eps_km
+    i, j, dist = i[dentro], j[dentro], dist[dentro]
+
+    grafo = csr_matrix(
+        (np.concatenate([dist, dist]), (np.concatenate([i, j]), np.concatenate([j, i]))),
+        shape=(n, n)
+    )
+    grafo.sort_indices()
+    return grafo
+
+
+def caminho_matriz(arquivo_matriz):
+    return os.path.join(MATRIZES_PATH, f"{arquivo_matriz}.npy")
+
+
+def caminho_metadados(arquivo_matriz):
+    return os.path.join(MATRIZES_PATH, f"{arquivo_matriz}_meta.npz")
+
+
+def identificar_casos(grupo):
+    """
+    Identidade de cada caso: hash do conteúdo da linha. Uma linha editada
+    muda de identidade, duas linhas idênticas têm a mesma.
+    """
+    return pd.util.hash_pandas_object(grupo, index=False).to_numpy(dtype=np.uint64)
+
+
+def carregar_metadados_matriz(arquivo_matriz):
+    """Lê coordenadas, datas e identidades dos pontos de uma matriz salva."""
+    caminho = caminho_metadados(arquivo_matriz)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with np.load(caminho) as meta:
+            return {chave: meta[chave] for chave in meta.files}
+    except (OSError, ValueError) as e:
+        print(f"[ERRO] Metadados da matriz {arquivo_matriz} ilegíveis: {e}")
+        return None
+
+
+def salvar_metadados_matriz(arquivo_matriz, lats, lons, dias, ids, peso_tempo):
+    gravar_atomico(caminho_metadados(arquivo_matriz), lambda temporario: np.savez(
+        temporario,
+        lats=lats, lons=lons, dias=dias, ids=ids,
+        peso_tempo=np.array(peso_tempo)
+    ))
+
+
+# Formato condensado: só o triângulo inferior (i > j), linha a linha.
+# O par (i, j) fica na posição i*(i-1)/2 + j, então casos novos (linhas
+# novas) entram sempre no fim do arquivo. Equivale ao triângulo superior
+# lido por colunas.
+
+def tamanho_condensado(n):
+    return n * (n - 1) // 2
+
+
+def indice_condensado(i, j):
+    """Posição do par (i, j), i != j, no vetor condensado."""
+    i, j = np.maximum(i, j), np.minimum(i, j)
+    return i * (i - 1) // 2 + j
+
+
+def pontos_da_matriz_condensada(condensada):
+    """Número de pontos n a partir do tamanho n*(n-1)/2."""
+    return int((1 + np.sqrt(1 + 8 * len(condensada))) // 2)
+
+
+def abrir_matriz_condensada(arquivo_matriz):
+    """Abre a matriz salva mapeada em memória (sem copiar o arquivo para a RAM)."""
+    condensada = np.load(caminho_matriz(arquivo_matriz), mmap_mode="r")
+    if condensada.ndim != 1:
+        raise ValueError(f"{arquivo_matriz} não está no formato condensado")
+    return condensada
+
+
+def expandir_matriz(condensada):
+    """Monta a matriz quadrada simétrica (cópia em RAM) a partir da condensada."""
+    n = pontos_da_matriz_condensada(condensada)
+    matriz = np.zeros((n, n), dtype=condensada.dtype)
+    linhas_por_bloco = max(1, TAMANHO_BLOCO // max(n, 1))
+    for inicio in range(1, n, linhas_por_bloco):
+        fim = min(inicio + linhas_por_bloco, n)
+        trecho = np.asarray(condensada[tamanho_condensado(inicio):tamanho_condensado(fim)])
+        mascara = np.tri(fim - inicio, fim, k=inicio - 1, dtype=bool)
+        bloco = matriz[inicio:fim, :fim]
+        bloco[mascara] = trecho
+    return matriz + matriz.T
+
+
+def grafo_da_matriz_condensada(condensada, eps_km):
+    """
+    Percorre a matriz condensada em blocos e devolve o grafo esparso (CSR)
+    dos pares <= eps_km, que o DBSCAN aceita no lugar da matriz densa.
+    """
+    from scipy.sparse import csr_matrix
+    n = pontos_da_matriz_condensada(condensada)
+    inicios_linha = tamanho_condensado(np.arange(n, dtype=np.int64))
+    linhas, colunas, dists = [], [], []
+    for inicio in range(0, len(condensada), TAMANHO_BLOCO):
+        trecho = np.asarray(condensada[inicio:inicio + TAMANHO_BLOCO])
+        pos = np.flatnonzero(trecho <= eps_km) + inicio
+        i = np.searchsorted(inicios_linha, pos, side="right") - 1
+        linhas.append(i)
+        colunas.append(pos - inicios_linha[i])
+        dists.append(trecho[pos - inicio].astype(float))
+    i = np.concatenate(linhas) if linhas else np.zeros(0, dtype=np.int64)
+    j = np.concatenate(colunas) if colunas else np.zeros(0, dtype=np.int64)
+    dist = np.concatenate(dists) if dists else np.zeros(0)
+    grafo = csr_matrix(
+        (np.concatenate([dist, dist]), (np.concatenate([i, j]), np.concatenate([j, i]))),
+        shape=(n, n)
+    )
+    grafo.sort_indices()
+    return grafo
+
+
+def _preencher_distancias(nova_matrix, lats, lons, dias, n_antigo, peso_tempo):
+    """Calcula apenas as linhas/colunas a partir de n_antigo, em blocos."""
+    n_total = len(lats)
+    linhas_por_bloco = max(1, TAMANHO_BLOCO // max(n_total, 1))
+    for inicio in range(n_antigo, n_total, linhas_por_bloco):
+        fim = min(inicio + linhas_por_bloco, n_total)
+        bloco = calcular_bloco_distancias(
+            lats[inicio:fim], lons[inicio:fim], dias[inicio:fim],
+            lats[:fim], lons[:fim], dias[:fim],
+            peso_tempo
+        )
+        # Mantém só j < i, como no laço original (haversine(i, j) com i > j)
+        bloco = np.tril(bloco, k=inicio - 1)
+        nova_matrix[inicio:fim, :inicio] = bloco[:, :inicio]
+        nova_matrix[:inicio, inicio:fim] = bloco[:, :inicio].T
+        intra = bloco[:, inicio:fim]
+        nova_matrix[inicio:fim, inicio:fim] = intra + intra.T
+
+
+def _preencher_condensada(condensada, lats, lons, dias, n_antigo, peso_tempo):
+    """Mesmo cálculo de _preencher_distancias, gravando no formato condensado."""
+    n_total = len(lats)
+    linhas_por_bloco = max(1, TAMANHO_BLOCO // max(n_total, 1))
+    for inicio in range(max(n_antigo, 1), n_total, linhas_por_bloco):
+        fim = min(inicio + linhas_por_bloco, n_total)
+        bloco = calcular_bloco_distancias(
+            lats[inicio:fim], lons[inicio:fim], dias[inicio:fim],
+            lats[:fim], lons[:fim], dias[:fim],
+            peso_tempo
+        )
+        mascara = np.tri(fim - inicio, fim, k=inicio - 1, dtype=bool)
+        condensada[tamanho_condensado(inicio):tamanho_condensado(fim)] = bloco[mascara]
+
+
+def _como_arrays(coords, datas):
+    lats = np.array([c[0] for c in coords], dtype=float)
+    lons = np.array([c[1] for c in coords], dtype=float)
+    dias = np.array(datas, dtype="datetime64[ns]").astype(np.int64)
+    return lats, lons, dias
 
 
 def atualizar_matriz_distancia(
     arquivo_matriz,
     coords_antigos, datas_antigas,
     coords_novos, datas_novas,
-    peso_tempo=1/30
+    peso_tempo=1/30,
+    ids_antigos=None, ids_novos=None,
+    precisao="float64"
 ):
     """
     Atualiza ou cria uma matriz de distâncias híbridas (geo + tempo)
-    e salva em disco para reutilização futura.
+    e salva em disco, no formato condensado, para reutilização futura.
+    Se ids forem passados, salva também os metadados dos pontos.
+    Devolve a matriz condensada mapeada em memória.
     """
+    caminho = caminho_matriz(arquivo_matriz)
 
-    # Verifica se já existe uma matriz salva
-    if os.path.exists(f"./matrizes/{arquivo_matriz}"):
-        dist_matrix = np.load(f"./matrizes/{arquivo_matriz}")
-        n_antigo = dist_matrix.shape[0]
-        print(f"[INFO] Matriz existente carregada ({n_antigo} pontos anteriores).")
-    else:
-        dist_matrix = np.zeros((0, 0))
+    # Verifica se já existe uma matriz salva compatível com os pontos antigos
+    antiga = None
+    n_antigo = 0
+    if coords_antigos and os.path.exists(caminho):
+        try:
+            antiga = abrir_matriz_condensada(arquivo_matriz)
+            n_antigo = pontos_da_matriz_condensada(antiga)
+            print(f"[INFO] Matriz existente carregada ({n_antigo} pontos anteriores).")
+        except ValueError as e:
+            print(f"[INFO] {e}.")
+    if n_antigo != len(coords_antigos) or (antiga is not None and antiga.dtype != np.dtype(precisao)):
+        print("[INFO] Nenhuma matriz anterior compatível encontrada. Criando nova.")
+        coords_novos = coords_antigos + coords_novos
+        datas_novas = datas_antigas + datas_novas
+        coords_antigos, datas_antigas = [], []
+        antiga = None
         n_antigo = 0
-        print("[INFO] Nenhuma matriz anterior encontrada. Criando nova.")
 
     # Dados combinados
     coords_total = coords_antigos + coords_novos
     datas_total = datas_antigas + datas_novas
+    n_total = len(coords_total)
 
-    n_novo = len(coords_novos)
-    n_total = n_antigo + n_novo
-
-    # Cria nova matriz expandida
-    nova_matrix = np.zeros((n_total, n_total))
-    if n_antigo > 0:
-        nova_matrix[:n_antigo, :n_antigo] = dist_matrix
+    # Cria o arquivo novo, copia o trecho antigo e calcula só as linhas novas
+    lats, lons, dias = _como_arrays(coords_total, datas_total)
 
-    # Calcula apenas as distâncias novas
-    for i in range(n_antigo, n_total):
-        for j in range(i):
-            dist_geo = haversine(coords_total[i], coords_total[j])
-            dist_tempo = abs((datas_total[i] - datas_total[j]).days)
-            dist_total = dist_geo + dist_tempo * peso_tempo * 5
-            nova_matrix[i, j] = nova_matrix[j, i] = dist_total
+    def escrever(temporario):
+        nonlocal antiga
+        nova = np.lib.format.open_memmap(
+            temporario, mode="w+", dtype=precisao, shape=(tamanho_condensado(n_total),)
+        )
+        if antiga is not None:
+            for inicio in range(0, len(antiga), TAMANHO_BLOCO):
+                fim = min(inicio + TAMANHO_BLOCO, len(antiga))
+                nova[inicio:fim] = antiga[inicio:fim]
+            # Fecha o mapeamento antes da troca (no Windows é obrigatório)
+            antiga = None
+        _preencher_condensada(nova, lats, lons, dias, n_antigo, peso_tempo)
+        nova.flush()
+        del nova
 
-    # Salva novamente
-    np.save(f"python_scripts\matrizes\{arquivo_matriz}", nova_matrix)
+    # Salva novamente: quem já tem a matriz antiga mapeada continua lendo a antiga
+    gravar_atomico(caminho, escrever)
+    if ids_antigos is not None and ids_novos is not None:
+        ids = np.concatenate([np.asarray(ids_antigos, dtype=np.uint64),
+                              np.asarray(ids_novos, dtype=np.uint64)])
+        salvar_metadados_matriz(arquivo_matriz, lats, lons, dias, ids, peso_tempo)
     print(f"[INFO] Matriz atualizada salva com {n_total} pontos totais.")
 
-    return nova_matrix
+    return abrir_matriz_condensada(arquivo_matriz)
+
+
+def obter_matriz_distancia(arquivo_matriz, coords, datas, ids, peso_tempo=1/30, precisao="float64"):
+    """
+    Reaproveita a matriz salva quando os casos dela são um prefixo dos casos
+    atuais (mesma identidade, coordenadas e datas, na mesma ordem): só os
+    casos novos ganham linhas e colunas. Qualquer outra diferença (linha
+    editada, removida ou reordenada) força a reconstrução completa.
+    Devolve a matriz condensada mapeada em memória.
+    Com a trava da matriz: outro processo que pede a mesma matriz espera e
+    reaproveita a que este gravou.
+    """
+    with trava(f"matriz_{arquivo_matriz}"):
+        return _obter_matriz_distancia(arquivo_matriz, coords, datas, ids, peso_tempo, precisao)
+
+
+def _obter_matriz_distancia(arquivo_matriz, coords, datas, ids, peso_tempo, precisao):
+    ids = np.asarray(ids, dtype=np.uint64)
+    lats, lons, dias = _como_arrays(coords, datas)
+    meta = carregar_metadados_matriz(arquivo_matriz)
+
+    n_antigo = 0
+    if meta is not None:
+        k = len(meta["ids"])
+        if (k <= len(ids)
+                and float(meta["peso_tempo"]) == peso_tempo
+                and np.array_equal(meta["ids"], ids[:k])
+                and np.array_equal(meta["lats"], lats[:k])
+                and np.array_equal(meta["lons"], lons[:k])
+                and np.array_equal(meta["dias"], dias[:k])):
+            n_antigo = k
+        else:
+            print(f"[INFO] Casos de {arquivo_matriz} mudaram. Reconstruindo matriz.")
+
+    if n_antigo == len(ids) and os.path.exists(caminho_matriz(arquivo_matriz)):
+        try:
+            condensada = abrir_matriz_condensada(arquivo_matriz)
+        except ValueError:
+            condensada = None
+        if (condensada is not None
+                and len(condensada) == tamanho_condensado(n_antigo)
+                and condensada.dtype == np.dtype(precisao)):
+            print(f"[INFO] Matriz {arquivo_matriz} já atualizada ({n_antigo} pontos).")
+            contar("matriz_cache", resultado="pronta")
+            definir("matriz_pontos", n_antigo, matriz=arquivo_matriz)
+            return condensada
+        # Fecha o mapeamento antes de o arquivo ser substituído
+        del condensada
+
+    tipo = "incremental" if n_antigo else "reconstruida"
+    contar("matriz_cache", resultado=tipo)
+    definir("matriz_pontos", len(ids), matriz=arquivo_matriz)
+    definir("matriz_bytes", tamanho_condensado(len(ids)) * np.dtype(precisao).itemsize, matriz=arquivo_matriz)
+    with etapa("matriz_distancia", tipo=tipo):
+        return atualizar_matriz_distancia(
+            arquivo_matriz,
+            coords_antigos=coords[:n_antigo],
+            datas_antigas=datas[:n_antigo],
+            coords_novos=coords[n_antigo:],
+            datas_novas=datas[n_antigo:],
+            peso_tempo=peso_tempo,
+            ids_antigos=ids[:n_antigo],
+            ids_novos=ids[n_antigo:],
+            precisao=precisao
+        )
+
+
+def calcular_matriz_distancia(coords, datas, peso_tempo=1/30):
+    """Matriz híbrida só em memória, sem cache em disco."""
+    lats, lons, dias = _como_arrays(coords, datas)
+    matriz = np.zeros((len(lats), len(lats)))
+    _preencher_distancias(matriz, lats, lons, dias, 0, peso_tempo)
+    return matriz
+
+
+def pontos_unicos(lats, lons, dias):
+    """
+    Casos no mesmo lugar e no mesmo instante viram um único ponto.
+    Devolve (posição do primeiro caso de cada ponto, na ordem de aparição;
+    ponto de cada caso; quantos casos cada ponto representa).
+    """
+    codigos = pd.DataFrame({"lat": lats, "lon": lons, "dia": dias}) \
+        .groupby(["lat", "lon", "dia"], sort=False).ngroup().to_numpy()
+    _, primeiros = np.unique(codigos, return_index=True)
+    return primeiros, codigos, np.bincount(codigos)
+
+
+def identificar_pontos(lats, lons, dias):
+    """Identidade de cada ponto (hash de lat, lon e data) para a matriz em disco."""
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({"lat": lats, "lon": lons, "dia": dias}), index=False
+    ).to_numpy(dtype=np.uint64)
+
+
+def _rotular_pontos(lats, lons, dias, doenca, eps_km, min_samples, peso_tempo, usar_cache, modo,
+                    precisao_matriz="float64"):
+    """
+    DBSCAN de uma doença a partir dos arrays de latitude, longitude e data (ns).
+    Casos repetidos (mesmo lugar e data) entram uma vez só, com peso igual
+    à quantidade (sample_weight): a distância entre eles é zero, então os
+    rótulos são os mesmos do DBSCAN com todas as linhas.
+    """
+    contar("casos_clusterizados", len(lats), modo=modo)
+    primeiros, codigos, pesos = pontos_unicos(lats, lons, dias)
+    if len(primeiros) == len(lats):
+        pesos = None
+    else:
+        lats, lons, dias = lats[primeiros], lons[primeiros], dias[primeiros]
+    contar("pontos_clusterizados", len(lats), modo=modo)
+    if modo == "esparso":
+        with etapa("grafo_vizinhanca"):
+            entrada = construir_grafo_vizinhanca(lats, lons, dias, eps_km, peso_tempo)
+        definir("grafo_arestas", entrada.nnz, doenca=doenca)
+    elif modo == "denso":
+        coords = list(zip(lats.tolist(), lons.tolist()))
+        datas = list(dias.astype("datetime64[ns]"))
+        if usar_cache:
+            condensada = obter_matriz_distancia(
+                f"{doenca}_arquivo_matriz",
+                coords, datas,
+                identificar_pontos(lats, lons, dias),
+                peso_tempo,
+                precisao_matriz
+            )
+            # Lida direto do arquivo mapeado, sem montar a matriz n x n
+            entrada = grafo_da_matriz_condensada(condensada, eps_km)
+        else:
+            with etapa("matriz_memoria"):
+                entrada = calcular_matriz_distancia(coords, datas, peso_tempo)
+    else:
+        raise ValueError(f"Modo desconhecido: {modo}")
+    from sklearn.cluster import DBSCAN
+    db = DBSCAN(eps=eps_km, min_samples=min_samples, metric="precomputed")
+    with etapa("dbscan", modo=modo):
+        labels = db.fit_predict(entrada, sample_weight=pesos)
+    # Cada caso recebe o rótulo do seu ponto
+    return labels[codigos] if pesos is not None else labels
+
+
+def _arrays_do_grupo(grupo):
+    lats = grupo["local_lat"].to_numpy(dtype=float)
+    lons = grupo["local_lon"].to_numpy(dtype=float)
+    dias = grupo["data"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return lats, lons, dias
 
 
-def detectar_clusters(df, eps_km=0.8, min_samples=2):
+def _rotular_grupo(grupo, doenca, eps_km, min_samples, peso_tempo, usar_cache, modo,
+                   precisao_matriz="float64"):
+    """Roda o DBSCAN de uma doença e devolve os rótulos crus (sem deslocamento)."""
+    lats, lons, dias = _arrays_do_grupo(grupo)
+    return _rotular_pontos(lats, lons, dias, doenca, eps_km, min_samples, peso_tempo,
+                           usar_cache, modo, precisao_matriz)
+
+
+def _rotular_compartilhado(tarefa):
+    """
+    Roda num processo do pool: lê os pontos da doença direto da memória
+    compartilhada (nada de DataFrame serializado) e devolve os rótulos.
+    """
+    nomes, total, inicio, fim, doenca, parametros = tarefa
+    blocos = {campo: shared_memory.SharedMemory(name=nome) for campo, nome in nomes.items()}
+    try:
+        arrays = {campo: np.ndarray((total,), dtype=TIPOS_COMPARTILHADOS[campo], buffer=bloco.buf)[inicio:fim]
+                  for campo, bloco in blocos.items()}
+        labels = _rotular_pontos(arrays["lats"], arrays["lons"], arrays["dias"], doenca, **parametros)
+        del arrays
+        # As métricas do processo voltam junto com os rótulos
+        return np.asarray(labels).copy(), retirar()
+    finally:
+        for bloco in blocos.values():
+            bloco.close()
+
+
+def _obter_pool(processos):
+    global _pool
+    if _pool is None or _pool[0] != processos:
+        if _pool is not None:
+            _pool[1].shutdown()
+        # forkserver (spawn no Windows), não fork: o processo do Flask tem
+        # threads, e um fork copiaria travas fechadas por elas
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        log = caminho_registro()
+        _pool = (processos, ProcessPoolExecutor(
+            max_workers=processos, mp_context=multiprocessing.get_context(metodo),
+            # Os prints dos processos vão para o mesmo log do pai
+            initializer=iniciar_registro if log else None, initargs=(log,) if log else ()))
+    return _pool[1]
+
+
+def _rotular_em_paralelo(pendentes, processos, parametros):
+    """
+    Rótulos de várias doenças ao mesmo tempo, uma por processo. Latitude,
+    longitude e data de todas ficam em blocos de memória compartilhada;
+    cada tarefa leva só o nome dos blocos e o trecho da sua doença. Devolve {doenca: rótulos}.
+    """
+    total = sum(len(grupo) for _, grupo in pendentes)
+    campos = ["lats", "lons", "dias"]
+    blocos = {}
+    try:
+        for campo in campos:
+            tamanho = max(total * np.dtype(TIPOS_COMPARTILHADOS[campo]).itemsize, 1)
+            blocos[campo] = shared_memory.SharedMemory(create=True, size=tamanho)
+        arrays = {campo: np.ndarray((total,), dtype=TIPOS_COMPARTILHADOS[campo], buffer=bloco.buf)
+                  for campo, bloco in blocos.items()}
+        tarefas = []
+        inicio = 0
+        for doenca, grupo in pendentes:
+            fim = inicio + len(grupo)
+            arrays["lats"][inicio:fim], arrays["lons"][inicio:fim], arrays["dias"][inicio:fim] = \
+                _arrays_do_grupo(grupo)
+            tarefas.append(({campo: bloco.name for campo, bloco in blocos.items()},
+                            total, inicio, fim, doenca, parametros))
+            inicio = fim
+        del arrays
+
+        # Maiores primeiro: o tempo total fica perto do da maior doença
+        tarefas.sort(key=lambda t: t[3] - t[2], reverse=True)
+        pool = _obter_pool(processos)
+        with etapa("clusterizacao_paralela", processos=processos):
+            futuros = {tarefa[4]: pool.submit(_rotular_compartilhado, tarefa) for tarefa in tarefas}
+            rotulos = {}
+            for doenca, futuro in futuros.items():
+                rotulos[doenca], medidas = futuro.result()
+                incorporar(medidas)
+            return rotulos
+    finally:
+        for bloco in blocos.values():
+            bloco.close()
+            bloco.unlink()
+
+
+class IndiceTemporal:
+    """
+    Casos ordenados por data: uma janela [inicio, fim] sai com duas buscas
+    binárias (O(log n + tamanho da janela)) em vez de uma máscara no df todo.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        datas = df["data"].to_numpy(dtype="datetime64[ns]")
+        self.ordem = np.argsort(datas, kind="stable")
+        self.datas = datas[self.ordem]
+
+    def janela(self, inicio, fim):
+        a = np.searchsorted(self.datas, np.datetime64(inicio, "ns"), side="left")
+        b = np.searchsorted(self.datas, np.datetime64(fim, "ns"), side="right")
+        # Volta à ordem original das linhas, para os rótulos baterem com a máscara
+        return self.df.iloc[np.sort(self.ordem[a:b])]
+
+
+class CacheJanelas:
+    """
+    Rótulos do DBSCAN por (doença, janela, eps, min_samples, ...). Cada
+    entrada guarda a impressão digital dos casos da janela: ela só é
+    descartada quando algum caso dentro da janela muda.
+    """
+
+    def __init__(self, limite=256):
+        self.limite = limite
+        self._entradas = OrderedDict()
+        self.acertos = 0
+        self.faltas = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @staticmethod
+    def impressao(grupo):
+        return hashlib.blake2b(identificar_casos(grupo).tobytes(), digest_size=16).hexdigest()
+
+    def obter(self, chave, impressao):
+        entrada = self._entradas.get(chave)
+        if entrada is not None and entrada[0] == impressao:
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            contar("cache_janelas", resultado="acerto")
+            return entrada[1]
+        self.faltas += 1
+        contar("cache_janelas", resultado="falta")
+        return None
+
+    def guardar(self, chave, impressao, labels):
+        self._entradas[chave] = (impressao, labels)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.limite:
+            self._entradas.popitem(last=False)
+
+
+@cronometrar("detectar_clusters")
+def detectar_clusters(df, eps_km=0.8, min_samples=2, usar_cache=True, modo="denso", peso_tempo=1/30,
+                      precisao_matriz="float64", cache=None, chave_cache=None, processos=1):
+    """
+    modo="denso": todas as distâncias, com cache em disco no formato
+    condensado (precisao_matriz="float32" ocupa metade do espaço).
+    modo="esparso": só os pares a menos de eps_km, mesmos rótulos com
+    memória proporcional ao número de vizinhos.
+    cache/chave_cache: CacheJanelas e o que identifica o recorte (ex.: a
+    janela de datas); doenças sem mudança reaproveitam os rótulos.
+    processos > 1: doenças clusterizadas ao mesmo tempo em processos
+    separados (só quando há MIN_CASOS_PARALELO casos ou mais); os IDs
+    de cluster são os mesmos da execução serial.
+    """
+    parametros = {"eps_km": eps_km, "min_samples": min_samples, "peso_tempo": peso_tempo,
+                  "usar_cache": usar_cache, "modo": modo, "precisao_matriz": precisao_matriz}
+    grupos = [(doenca, grupo) for doenca, grupo in df.groupby("diagnostico") if not grupo.empty]
+
+    # Rótulos já no cache de janelas; o resto é calculado (em paralelo, se pedido)
+    rotulos, impressoes = {}, {}
+    for doenca, grupo in grupos:
+        if cache is not None:
+            impressoes[doenca] = CacheJanelas.impressao(grupo)
+            labels = cache.obter((doenca, chave_cache, eps_km, min_samples, peso_tempo, modo),
+                                 impressoes[doenca])
+            if labels is not None:
+                rotulos[doenca] = labels
+    pendentes = [(doenca, grupo) for doenca, grupo in grupos if doenca not in rotulos]
+    if (processos > 1 and len(pendentes) > 1
+            and sum(len(grupo) for _, grupo in pendentes) >= MIN_CASOS_PARALELO):
+        rotulos.update(_rotular_em_paralelo(pendentes, processos, parametros))
+    else:
+        for doenca, grupo in pendentes:
+            rotulos[doenca] = _rotular_grupo(grupo, doenca, **parametros)
+    if cache is not None:
+        for doenca, _ in pendentes:
+            cache.guardar((doenca, chave_cache, eps_km, min_samples, peso_tempo, modo),
+                          impressoes[doenca], rotulos[doenca])
+
+    # Deslocamento dos IDs sempre na ordem do groupby, com ou sem paralelismo
     resultados = []
     proximo_cluster_id = 0
-    for doenca, grupo in df.groupby("diagnostico"):
-        if grupo.empty:
-            continue
-        coords = list(zip(grupo["local_lat"], grupo["local_lon"]))
-        datas = list(grupo["data"])
-        dist_matrix = atualizar_matriz_distancia(
-            f"{doenca}_{"arquivo_matriz"}",
-            coords_antigos=[],
-            datas_antigas=[],
-            coords_novos=coords,
-            datas_novas=datas
-        )
-        db = DBSCAN(eps=eps_km, min_samples=min_samples, metric="precomputed")
-        labels = db.fit_predict(dist_matrix)
+    for doenca, grupo in grupos:
+        labels = rotulos[doenca]
         labels_ajustados = np.where(labels != -1, labels + proximo_cluster_id, -1)
         grupo = grupo.copy()
         grupo["cluster"] = labels_ajustados
@@ -91,13 +664,353 @@ def detectar_clusters(df, eps_km=0.8, min_samples=2):
         return pd.DataFrame(columns=df.columns.tolist() + ["cluster"])
 
 
-def detectar_surtos_por_data(df, data_ref, janela_dias=30):
+@cronometrar("detectar_surtos_por_data")
+def detectar_surtos_por_data(df, data_ref, janela_dias=30, modo="denso", indice=None, cache=None,
+                             processos=1):
+    """
+    indice: IndiceTemporal de df, para extrair a janela sem varrer o df.
+    cache: CacheJanelas, para não reclusterizar janelas que não mudaram.
+    """
     data_ref = pd.to_datetime(data_ref)
-    mask = (df['data'] >= data_ref - timedelta(days=janela_dias)) & \
-           (df['data'] <= data_ref + timedelta(days=janela_dias))
-    subset = df[mask].copy()
+    inicio = data_ref - timedelta(days=janela_dias)
+    fim = data_ref + timedelta(days=janela_dias)
+    if indice is not None:
+        subset = indice.janela(inicio, fim).copy()
+    else:
+        mask = (df['data'] >= inicio) & (df['data'] <= fim)
+        subset = df[mask].copy()
     if subset.empty:
         print(f"Nenhum dado encontrado no intervalo de ±{janela_dias} dias de {data_ref.date()}")
         return subset
-    df_resultado = detectar_clusters(subset)
-    return df_resultado
\ No newline at end of file
+    # Janelas mudam a cada data, então não vale guardar a matriz em disco
+    df_resultado = detectar_clusters(subset, usar_cache=False, modo=modo,
+                                     cache=cache, chave_cache=(inicio, fim), processos=processos)
+    return df_resultado
+
+
+def rotular_por_grafo(grafo, nucleo):
+    """
+    Rótulos idênticos aos do DBSCAN a partir do grafo eps e da lista de
+    núcleos: clusters são as componentes conexas entre núcleos, numeradas
+    pela ordem do menor índice de núcleo; cada borda fica com o cluster de
+    menor número entre os núcleos vizinhos (é o que o sklearn alcança primeiro).
+    """
+    from scipy.sparse.csgraph import connected_components
+    n = grafo.shape[0]
+    labels = np.full(n, -1, dtype=np.int64)
+    idx_nucleo = np.flatnonzero(nucleo)
+    if len(idx_nucleo) == 0:
+        return labels
+    _, componente = connected_components(grafo[idx_nucleo][:, idx_nucleo], directed=False)
+    _, primeira = np.unique(componente, return_index=True)
+    numero = np.empty(len(primeira), dtype=np.int64)
+    numero[componente[np.sort(primeira)]] = np.arange(len(primeira))
+    labels[idx_nucleo] = numero[componente]
+
+    idx_borda = np.flatnonzero(~nucleo)
+    if len(idx_borda):
+        ligacoes = grafo[idx_borda][:, idx_nucleo].tocsr()
+        tem_vizinho = np.diff(ligacoes.indptr) > 0
+        if np.any(tem_vizinho):
+            rotulos_viz = labels[idx_nucleo][ligacoes.indices]
+            minimos = np.minimum.reduceat(rotulos_viz, ligacoes.indptr[:-1][tem_vizinho])
+            labels[idx_borda[tem_vizinho]] = minimos
+    return labels
+
+
+class _ComponentesNucleos:
+    """
+    Componentes conexas entre os núcleos ativos de um grafo eps, mantidas
+    enquanto a janela do varrer_surtos anda. Núcleo novo junta as
+    componentes dos núcleos vizinhos (a menor passa para a maior); núcleo
+    que sai da janela ou deixa de ser núcleo só faz recalcular as
+    componentes em que estava. componente[p] >= 0 só para núcleos ativos.
+    """
+
+    def __init__(self, grafo):
+        self.grafo = grafo
+        self.componente = np.full(grafo.shape[0], -1, dtype=np.int64)
+        self.membros = {}
+        self._proxima = 0
+
+    def _nova(self, pontos):
+        c = self._proxima
+        self._proxima += 1
+        self.membros[c] = list(pontos)
+        self.componente[pontos] = c
+        return c
+
+    def _unir(self, a, b):
+        if len(self.membros[a]) < len(self.membros[b]):
+            a, b = b, a
+        membros_b = self.membros.pop(b)
+        self.componente[membros_b] = a
+        self.membros[a].extend(membros_b)
+        return a
+
+    def adicionar(self, pontos):
+        """Pontos que passaram a ser núcleo."""
+        indptr, indices = self.grafo.indptr, self.grafo.indices
+        for p in pontos:
+            c = self._nova([p])
+            for outra in np.unique(self.componente[indices[indptr[p]:indptr[p + 1]]]):
+                if outra >= 0 and outra != c:
+                    c = self._unir(c, outra)
+
+    def remover(self, pontos):
+        """Pontos que deixaram de ser núcleo (ou saíram da janela)."""
+        from scipy.sparse.csgraph import connected_components
+        afetadas = np.unique(self.componente[pontos])
+        self.componente[pontos] = -1
+        restantes = []
+        for c in afetadas:
+            membros = np.array(self.membros.pop(int(c)), dtype=np.int64)
+            restantes.append(membros[self.componente[membros] == c])
+        restantes = np.concatenate(restantes) if restantes else np.zeros(0, dtype=np.int64)
+        if len(restantes) == 0:
+            return
+        # Uma chamada para todas as afetadas: não há aresta entre componentes diferentes
+        _, partes = connected_components(self.grafo[restantes][:, restantes], directed=False)
+        ordem = np.argsort(partes, kind="stable")
+        for grupo in np.split(restantes[ordem], np.flatnonzero(np.diff(partes[ordem])) + 1):
+            self._nova(grupo)
+
+    def rotulos(self, posicoes):
+        """
+        Rótulos do DBSCAN para os pontos ativos `posicoes` (em ordem): mesma
+        numeração e mesma regra de bordas do rotular_por_grafo.
+        """
+        labels = np.full(len(posicoes), -1, dtype=np.int64)
+        nucleo = self.componente[posicoes] >= 0
+        if not nucleo.any():
+            return labels
+        _, primeira, inverso = np.unique(self.componente[posicoes[nucleo]],
+                                         return_index=True, return_inverse=True)
+        numero = np.empty(len(primeira), dtype=np.int64)
+        numero[np.argsort(primeira)] = np.arange(len(primeira))
+        labels[nucleo] = numero[inverso]
+
+        # Bordas: vizinhos núcleo de cada ponto ativo que não é núcleo
+        bordas = np.flatnonzero(~nucleo)
+        linhas = posicoes[bordas]
+        inicio = self.grafo.indptr[linhas]
+        quantos = self.grafo.indptr[linhas + 1] - inicio
+        if quantos.sum() == 0:
+            return labels
+        deslocamento = np.arange(quantos.sum()) - np.repeat(np.cumsum(quantos) - quantos, quantos)
+        vizinhos = self.grafo.indices[np.repeat(inicio, quantos) + deslocamento]
+        origem = np.repeat(bordas, quantos)
+        ligadas = self.componente[vizinhos] >= 0
+        if ligadas.any():
+            origem = origem[ligadas]
+            rotulos_viz = labels[np.searchsorted(posicoes, vizinhos[ligadas])]
+            minimo = np.full(len(posicoes), np.iinfo(np.int64).max)
+            np.minimum.at(minimo, origem, rotulos_viz)
+            alcancadas = np.unique(origem)
+            labels[alcancadas] = minimo[alcancadas]
+        return labels
+
+
+@cronometrar("varrer_surtos")
+def varrer_surtos(df, data_inicio, data_fim, janela_dias=30, eps_km=0.8, min_samples=2, peso_tempo=1/30):
+    """
+    Resultado do detectar_surtos_por_data para cada dia de data_inicio a
+    data_fim, sem reclusterizar a cada dia. O grafo de vizinhança de cada
+    doença é montado uma única vez; ao andar um dia, só os casos que entram
+    e saem da janela (e os seus vizinhos) são olhados: o número de vizinhos
+    ativos muda, núcleos novos juntam componentes e núcleos perdidos só
+    fazem recalcular as componentes em que estavam (_ComponentesNucleos).
+    Rótulos com a mesma numeração do DBSCAN. Dias sem entrada nem saída
+    reaproveitam o dia anterior.
+
+    Devolve uma linha por (data, diagnostico) com casos na janela, número
+    de clusters, ruído, tamanhos e membros (índices do df) de cada cluster.
+    """
+    dias_consulta = pd.date_range(pd.to_datetime(data_inicio), pd.to_datetime(data_fim), freq="D")
+    janela = timedelta(days=janela_dias)
+    por_dia = {dia: [] for dia in dias_consulta}
+
+    for doenca, grupo in df.groupby("diagnostico"):
+        lats = grupo["local_lat"].to_numpy(dtype=float)
+        lons = grupo["local_lon"].to_numpy(dtype=float)
+        datas = grupo["data"].to_numpy(dtype="datetime64[ns]")
+        dias = datas.astype(np.int64)
+        grafo = construir_grafo_vizinhanca(lats, lons, dias, eps_km, peso_tempo)
+        indices_df = grupo.index.to_numpy()
+        componentes = _ComponentesNucleos(grafo)
+
+        ordem = np.argsort(datas, kind="stable")
+        datas_ordenadas = datas[ordem]
+        ativo = np.zeros(len(grupo), dtype=bool)
+        grau = np.zeros(len(grupo), dtype=np.int64)
+        lo = hi = 0
+        anterior = None
+
+        def alternar(p, entrando):
+            viz = grafo.indices[grafo.indptr[p]:grafo.indptr[p + 1]]
+            viz_ativos = viz[ativo[viz]]
+            passo = 1 if entrando else -1
+            grau[viz_ativos] += passo
+            ativo[p] = entrando
+            grau[p] = len(viz_ativos) if entrando else 0
+            tocados.append(viz_ativos)
+            tocados.append(np.array([p]))
+
+        for dia in dias_consulta:
+            limite_sup = np.datetime64(dia + janela, "ns")
+            limite_inf = np.datetime64(dia - janela, "ns")
+            tocados = []
+            while hi < len(ordem) and datas_ordenadas[hi] <= limite_sup:
+                alternar(ordem[hi], True)
+                hi += 1
+            while lo < hi and datas_ordenadas[lo] < limite_inf:
+                alternar(ordem[lo], False)
+                lo += 1
+
+            if tocados:
+                tocados = np.unique(np.concatenate(tocados))
+                nucleo = ativo[tocados] & (grau[tocados] + 1 >= min_samples)
+                era_nucleo = componentes.componente[tocados] >= 0
+                componentes.remover(tocados[era_nucleo & ~nucleo])
+                componentes.adicionar(tocados[~era_nucleo & nucleo])
+
+                posicoes = np.sort(ordem[lo:hi])
+                if len(posicoes) == 0:
+                    anterior = None
+                    continue
+                anterior = (posicoes, componentes.rotulos(posicoes))
+            if anterior is not None:
+                por_dia[dia].append((doenca, indices_df[anterior[0]], anterior[1]))
+
+    linhas = []
+    for dia, resultados in por_dia.items():
+        # Mesmo deslocamento de IDs entre doenças do detectar_clusters
+        proximo_cluster_id = 0
+        for doenca, indices, labels in resultados:
+            n_clusters = int(labels.max()) + 1 if len(labels) else 0
+            membros = [indices[labels == k].tolist() for k in range(n_clusters)]
+            linhas.append({
+                "data": dia,
+                "diagnostico": doenca,
+                "casos": int(len(labels)),
+                "clusters": n_clusters,
+                "ruido": int((labels == -1).sum()),
+                "primeiro_cluster": proximo_cluster_id,
+                "tamanhos": [len(m) for m in membros],
+                "membros": membros,
+            })
+            proximo_cluster_id += n_clusters
+    colunas = ["data", "diagnostico", "casos", "clusters", "ruido", "primeiro_cluster", "tamanhos", "membros"]
+    return pd.DataFrame(linhas, columns=colunas)
+
+
+def _arestas_por_distancia(grafo):
+    """Arestas (i < j) de um grafo eps simétrico, da menor para a maior distância."""
+    linhas = np.repeat(np.arange(grafo.shape[0]), np.diff(grafo.indptr))
+    manter = linhas < grafo.indices
+    origem, destino, distancia = linhas[manter], grafo.indices[manter].astype(np.int64), grafo.data[manter]
+    ordem = np.argsort(distancia, kind="stable")
+    return origem[ordem], destino[ordem], distancia[ordem]
+
+
+def _rotulos_da_varredura(componente, nucleo, origem, destino):
+    """
+    Rótulos do DBSCAN a partir da componente de cada núcleo: mesma
+    numeração e mesma regra de bordas do rotular_por_grafo.
+    """
+    n = len(nucleo)
+    labels = np.full(n, -1, dtype=np.int64)
+    idx_nucleo = np.flatnonzero(nucleo)
+    if len(idx_nucleo) == 0:
+        return labels
+    componente = componente[idx_nucleo]
+    _, primeira = np.unique(componente, return_index=True)
+    numero = np.empty(n, dtype=np.int64)
+    numero[componente[np.sort(primeira)]] = np.arange(len(primeira))
+    labels[idx_nucleo] = numero[componente]
+
+    # Arestas núcleo-borda, nos dois sentidos: cada borda fica com o menor rótulo
+    nucleo_origem = nucleo[origem]
+    nucleo_destino = nucleo[destino]
+    para_borda = nucleo_origem & ~nucleo_destino
+    de_borda = ~nucleo_origem & nucleo_destino
+    bordas = np.concatenate([destino[para_borda], origem[de_borda]])
+    if len(bordas):
+        rotulos = np.concatenate([labels[origem[para_borda]], labels[destino[de_borda]]])
+        minimo = np.full(n, np.iinfo(np.int64).max)
+        np.minimum.at(minimo, bordas, rotulos)
+        alcancadas = np.unique(bordas)
+        labels[alcancadas] = minimo[alcancadas]
+    return labels
+
+
+@cronometrar("varrer_parametros")
+def varrer_parametros(df, eps_lista=(0.8,), min_samples_lista=(2,), pesos_tempo=(1/30,)):
+    """
+    Resumo do detectar_clusters para cada combinação de eps_km, min_samples
+    e peso_tempo, sem refazer distâncias. Para cada doença e peso_tempo o
+    grafo de vizinhança é montado uma vez com o maior eps e as arestas são
+    ordenadas por distância: cada eps é um prefixo delas, com os graus
+    contados uma vez. Os min_samples vão do maior para o menor: os núcleos
+    só aumentam, então as componentes de um passam para o seguinte e só as
+    arestas dos núcleos novos entram nas componentes conexas (sobre o grafo
+    já contraído). Rótulos iguais aos do DBSCAN.
+
+    Devolve uma linha por (peso_tempo, eps_km, min_samples, diagnostico)
+    com casos, número de clusters, ruído, proporção de ruído e tamanhos.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    eps_ordenados = sorted(set(eps_lista))
+    min_samples_ordenados = sorted(set(min_samples_lista))
+    linhas = []
+    for peso_tempo in pesos_tempo:
+        for doenca, grupo in df.groupby("diagnostico"):
+            lats = grupo["local_lat"].to_numpy(dtype=float)
+            lons = grupo["local_lon"].to_numpy(dtype=float)
+            dias = grupo["data"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            grafo_maximo = construir_grafo_vizinhanca(lats, lons, dias, eps_ordenados[-1], peso_tempo)
+            n = len(lats)
+            todas_origem, todas_destino, distancia = _arestas_por_distancia(grafo_maximo)
+
+            for eps_km in eps_ordenados:
+                k = np.searchsorted(distancia, eps_km, side="right")
+                origem, destino = todas_origem[:k], todas_destino[:k]
+                # Vizinhos de cada ponto, contando ele mesmo (como no DBSCAN)
+                vizinhos = np.bincount(origem, minlength=n) + np.bincount(destino, minlength=n) + 1
+                componente = np.arange(n)
+                nucleo_anterior = np.zeros(n, dtype=bool)
+                por_min_samples = {}
+                for min_samples in reversed(min_samples_ordenados):
+                    nucleo = vizinhos >= min_samples
+                    novos = nucleo & ~nucleo_anterior
+                    # Arestas entre núcleos que ainda não entraram: uma ponta é núcleo novo
+                    entram = nucleo[origem] & nucleo[destino] & (novos[origem] | novos[destino])
+                    if entram.any():
+                        ligacoes = coo_matrix(
+                            (np.ones(int(entram.sum()), dtype=np.int8),
+                             (componente[origem[entram]], componente[destino[entram]])),
+                            shape=(n, n))
+                        _, contraida = connected_components(ligacoes, directed=False)
+                        componente = contraida[componente]
+                    nucleo_anterior = nucleo
+                    por_min_samples[min_samples] = _rotulos_da_varredura(componente, nucleo, origem, destino)
+
+                for min_samples in min_samples_ordenados:
+                    labels = por_min_samples[min_samples]
+                    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+                    ruido = int((labels == -1).sum())
+                    linhas.append({
+                        "peso_tempo": peso_tempo,
+                        "eps_km": eps_km,
+                        "min_samples": min_samples,
+                        "diagnostico": doenca,
+                        "casos": int(len(labels)),
+                        "clusters": n_clusters,
+                        "ruido": ruido,
+                        "razao_ruido": ruido / len(labels) if len(labels) else 0.0,
+                        "tamanhos": np.bincount(labels[labels != -1], minlength=n_clusters).tolist(),
+                    })
+    colunas = ["peso_tempo", "eps_km", "min_samples", "diagnostico",
+               "casos", "clusters", "ruido", "razao_ruido", "tamanhos"]
+    return pd.DataFrame(linhas, columns=colunas)
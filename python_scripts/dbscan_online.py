@@ -0,0 +1,330 @@
+import numpy as np
+import pandas as pd
+from math import ceil, cos, radians
+
+from dbscan import (
+    _distancia_hibrida, construir_grafo_vizinhanca,
+    NS_POR_DIA, RAIO_TERRA_KM
+)
+
+
+class _Vetor:
+    """Array numpy que cresce dobrando de tamanho: anexar é O(1) amortizado."""
+
+    __slots__ = ("dados", "n")
+
+    def __init__(self, dtype, capacidade=64):
+        self.dados = np.empty(capacidade, dtype=dtype)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, indice):
+        return self.dados[indice]
+
+    def __setitem__(self, indice, valor):
+        self.dados[indice] = valor
+
+    def anexar(self, valor):
+        if self.n == len(self.dados):
+            maior = np.empty(2 * len(self.dados), dtype=self.dados.dtype)
+            maior[:self.n] = self.dados[:self.n]
+            self.dados = maior
+        self.dados[self.n] = valor
+        self.n += 1
+
+    def estender(self, valores):
+        necessario = self.n + len(valores)
+        if necessario > len(self.dados):
+            maior = np.empty(max(2 * len(self.dados), necessario), dtype=self.dados.dtype)
+            maior[:self.n] = self.dados[:self.n]
+            self.dados = maior
+        self.dados[self.n:necessario] = valores
+        self.n = necessario
+
+    @property
+    def valores(self):
+        return self.dados[:self.n]
+
+
+class _EstadoDoenca:
+    """Pontos, vizinhanças e rótulos de uma doença na clusterização online."""
+
+    def __init__(self, eps_km, min_samples, peso_tempo):
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.peso_tempo = peso_tempo
+        # Grade espacial (graus) + faixa de tempo (dias) para achar vizinhos
+        self.celula_graus = np.degrees(eps_km / RAIO_TERRA_KM)
+        if peso_tempo > 0:
+            self.largura_faixa = int(eps_km / (peso_tempo * 5)) + 2
+        else:
+            self.largura_faixa = None
+        self.grade = {}
+
+        # Um caso novo lê só as posições dos candidatos, sem copiar o histórico
+        self.lats = _Vetor(np.float64)
+        self.lons = _Vetor(np.float64)
+        self.dias = _Vetor(np.int64)
+        self.contagem = _Vetor(np.int64)
+        self.nucleo = _Vetor(np.bool_)
+        self.rotulo = _Vetor(np.int64)
+        # Vizinhanças: CSR dos pontos vindos do lote + arestas novas à parte
+        self.base_indptr = np.zeros(1, dtype=np.int64)
+        self.base_indices = np.zeros(0, dtype=np.int64)
+        self.extras = {}
+        # Linhas dos casos: DataFrame do lote + dicts dos casos novos
+        self.base = None
+        self.novas = []
+
+    def _chaves(self, lats, lons, dias):
+        """Células da grade (vetorizado: mesma conta para um ponto ou para o lote)."""
+        cl = np.floor_divide(lats, self.celula_graus).astype(np.int64)
+        cn = np.floor_divide(lons, self.celula_graus).astype(np.int64)
+        if self.largura_faixa is None:
+            cf = np.zeros_like(cl)
+        else:
+            cf = np.floor_divide(np.floor_divide(dias, NS_POR_DIA), self.largura_faixa)
+        return cl, cn, cf
+
+    def _chave(self, lat, lon, dia):
+        cl, cn, cf = self._chaves(np.array([lat]), np.array([lon]), np.array([dia], dtype=np.int64))
+        return (int(cl[0]), int(cn[0]), int(cf[0]))
+
+    def vizinhos(self, q):
+        """Índices dos vizinhos eps de q (sem o próprio q)."""
+        extra = self.extras.get(q)
+        if q < len(self.base_indptr) - 1:
+            base = self.base_indices[self.base_indptr[q]:self.base_indptr[q + 1]]
+            return base if extra is None else np.concatenate([base, extra])
+        return np.array(extra if extra is not None else [], dtype=np.int64)
+
+    def _candidatos(self, lat, lon, dia):
+        cl, cn, cf = self._chave(lat, lon, dia)
+        # Longitude encolhe com o cosseno da latitude: mais células em lon
+        lat_max = min(abs(lat) + self.celula_graus, 89.0)
+        alcance_lon = int(ceil(1 / cos(radians(lat_max))))
+        faixas = (cf,) if self.largura_faixa is None else (cf - 1, cf, cf + 1)
+        candidatos = []
+        for dl in (-1, 0, 1):
+            for dn in range(-alcance_lon, alcance_lon + 1):
+                for f in faixas:
+                    candidatos.extend(self.grade.get((cl + dl, cn + dn, f), ()))
+        return np.array(candidatos, dtype=np.int64)
+
+    def consultar_vizinhos(self, lat, lon, dia):
+        """Índices dos pontos já inseridos a distância híbrida <= eps_km."""
+        candidatos = self._candidatos(lat, lon, dia)
+        if len(candidatos) == 0:
+            return candidatos
+        # Mesma orientação da matriz em lote: o ponto novo é a linha (índice maior)
+        dist = _distancia_hibrida(
+            lat, lon, dia,
+            self.lats[candidatos], self.lons[candidatos], self.dias[candidatos],
+            self.peso_tempo
+        )
+        return np.sort(candidatos[dist <= self.eps_km])
+
+    def registrar_ponto(self, lat, lon, dia, linha):
+        indice = len(self.lats)
+        self.lats.anexar(lat)
+        self.lons.anexar(lon)
+        self.dias.anexar(dia)
+        self.contagem.anexar(1)
+        self.nucleo.anexar(False)
+        self.rotulo.anexar(-1)
+        self.novas.append(linha)
+        self.grade.setdefault(self._chave(lat, lon, dia), []).append(indice)
+        return indice
+
+    def carregar_lote(self, grupo, rotulos):
+        """Preenche o estado de uma vez a partir das linhas e rótulos do lote."""
+        lats = grupo["local_lat"].to_numpy(dtype=float)
+        lons = grupo["local_lon"].to_numpy(dtype=float)
+        dias = grupo["data"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        grafo = construir_grafo_vizinhanca(lats, lons, dias, self.eps_km, self.peso_tempo)
+        # O grafo não guarda a diagonal: +1 conta o próprio ponto
+        contagem = np.diff(grafo.indptr) + 1
+        self.lats.estender(lats)
+        self.lons.estender(lons)
+        self.dias.estender(dias)
+        self.contagem.estender(contagem)
+        self.nucleo.estender(contagem >= self.min_samples)
+        self.rotulo.estender(rotulos)
+        self.base_indptr = grafo.indptr.astype(np.int64)
+        self.base_indices = grafo.indices.astype(np.int64)
+        self.base = grupo.reset_index(drop=True)
+
+        cl, cn, cf = self._chaves(lats, lons, dias)
+        celulas = pd.DataFrame({"cl": cl, "cn": cn, "cf": cf}).groupby(["cl", "cn", "cf"]).indices
+        self.grade = {tuple(int(c) for c in chave): idx.tolist() for chave, idx in celulas.items()}
+
+    def tabela(self):
+        """Linhas dos casos na ordem de inserção."""
+        novas = pd.DataFrame(self.novas)
+        if self.base is None:
+            return novas
+        if novas.empty:
+            return self.base.copy()
+        return pd.concat([self.base, novas], ignore_index=True)
+
+
+class ClusterizacaoOnline:
+    """
+    DBSCAN incremental: cada caso novo consulta só a própria vizinhança eps,
+    promove a núcleo os pontos que atingem min_samples e cria, estende ou
+    une clusters no lugar. Os IDs são estáveis: um cluster novo recebe o
+    próximo ID livre e, numa união, fica o menor ID (o mais antigo).
+    """
+
+    def __init__(self, eps_km=0.8, min_samples=2, peso_tempo=1/30):
+        self.eps_km = eps_km
+        self.min_samples = min_samples
+        self.peso_tempo = peso_tempo
+        self.estados = {}
+        self.pai = {}
+        self.proximo_cluster_id = 0
+
+    # Union-find dos IDs de cluster
+    def _raiz(self, cluster_id):
+        raiz = cluster_id
+        while self.pai[raiz] != raiz:
+            raiz = self.pai[raiz]
+        while self.pai[cluster_id] != raiz:
+            self.pai[cluster_id], cluster_id = raiz, self.pai[cluster_id]
+        return raiz
+
+    def _novo_cluster(self):
+        cluster_id = self.proximo_cluster_id
+        self.proximo_cluster_id += 1
+        self.pai[cluster_id] = cluster_id
+        return cluster_id
+
+    def _unir(self, ids):
+        raizes = sorted({self._raiz(c) for c in ids})
+        for outra in raizes[1:]:
+            self.pai[outra] = raizes[0]
+        return raizes[0]
+
+    def _estado(self, doenca):
+        if doenca not in self.estados:
+            self.estados[doenca] = _EstadoDoenca(self.eps_km, self.min_samples, self.peso_tempo)
+        return self.estados[doenca]
+
+    def iniciar_de_lote(self, df_clusters):
+        """
+        Recomeça do resultado de detectar_clusters (mesmos IDs): vizinhanças,
+        núcleos e grade saem de uma vez do grafo esparso do lote, e os
+        próximos casos são só incrementais.
+        """
+        self.estados = {}
+        self.pai = {}
+        self.proximo_cluster_id = 0
+        for doenca, grupo in df_clusters.groupby("diagnostico"):
+            rotulos = grupo["cluster"].to_numpy(dtype=np.int64)
+            self._estado(doenca).carregar_lote(grupo.drop(columns="cluster"), rotulos)
+            for cluster_id in np.unique(rotulos[rotulos != -1]).tolist():
+                self.pai[cluster_id] = cluster_id
+                self.proximo_cluster_id = max(self.proximo_cluster_id, cluster_id + 1)
+
+    def adicionar_caso(self, linha):
+        """
+        Insere um caso (dict com local_lat, local_lon, data, diagnostico) e
+        devolve o ID do cluster em que ele ficou (-1 = ruído).
+        """
+        estado = self._estado(linha["diagnostico"])
+        lat, lon = float(linha["local_lat"]), float(linha["local_lon"])
+        dia = pd.Timestamp(linha["data"]).value
+        vizinhos = estado.consultar_vizinhos(lat, lon, dia)
+        p = estado.registrar_ponto(lat, lon, dia, dict(linha))
+
+        estado.contagem[p] = 1 + len(vizinhos)
+        estado.contagem[vizinhos] += 1
+        estado.extras[p] = vizinhos.tolist()
+        for q in vizinhos.tolist():
+            estado.extras.setdefault(q, []).append(p)
+
+        # Pontos que viraram núcleo com a chegada de p
+        candidatos = np.insert(vizinhos, 0, p)
+        novos_nucleos = candidatos[~estado.nucleo[candidatos]
+                                   & (estado.contagem[candidatos] >= self.min_samples)]
+        estado.nucleo[novos_nucleos] = True
+        for q in novos_nucleos.tolist():
+            viz = estado.vizinhos(q)
+            rotulos_viz = estado.rotulo[viz]
+            ids = rotulos_viz[estado.nucleo[viz] & (rotulos_viz != -1)].tolist()
+            if estado.rotulo[q] != -1:
+                ids.append(int(estado.rotulo[q]))
+            cluster_id = self._unir(ids) if ids else self._novo_cluster()
+            estado.rotulo[q] = cluster_id
+            # Vizinhos núcleo ainda sem rótulo e bordas soltas entram no cluster
+            estado.rotulo[viz[estado.rotulo[viz] == -1]] = cluster_id
+
+        # p sem rótulo vira borda do primeiro núcleo vizinho, se houver
+        if estado.rotulo[p] == -1:
+            viz = estado.vizinhos(p)
+            nucleos = viz[estado.nucleo[viz]]
+            if len(nucleos):
+                estado.rotulo[p] = estado.rotulo[nucleos[0]]
+
+        rotulo = int(estado.rotulo[p])
+        return self._raiz(rotulo) if rotulo != -1 else -1
+
+    def rotulos(self, doenca):
+        """IDs de cluster atuais (já resolvidas as uniões) na ordem de inserção."""
+        estado = self.estados.get(doenca)
+        if estado is None:
+            return np.zeros(0, dtype=int)
+        # Resolve cada ID distinto uma vez só, não cada ponto
+        rotulos = estado.rotulo.valores
+        distintos, posicao = np.unique(rotulos, return_inverse=True)
+        raizes = np.array([self._raiz(r) if r != -1 else -1 for r in distintos.tolist()], dtype=int)
+        return raizes[posicao]
+
+    def resultado(self):
+        """Mesmo formato de detectar_clusters: casos com a coluna 'cluster'."""
+        partes = []
+        for doenca in sorted(self.estados):
+            grupo = self.estados[doenca].tabela()
+            grupo["cluster"] = self.rotulos(doenca)
+            partes.append(grupo)
+        if not partes:
+            return pd.DataFrame(columns=["cluster"])
+        return pd.concat(partes, ignore_index=True)
+
+    def comparar_com_lote(self, df_lote):
+        """
+        Confere contra detectar_clusters rodado sobre os mesmos casos, na
+        mesma ordem. Núcleos e a partição dos núcleos devem ser idênticos;
+        os IDs podem diferir. Pontos de borda alcançáveis por mais de um
+        cluster podem legitimamente cair em outro cluster e só são contados.
+        """
+        relatorio = {"nucleos_iguais": True, "particao_igual": True, "bordas_divergentes": 0}
+        for doenca, grupo in df_lote.groupby("diagnostico"):
+            estado = self.estados.get(doenca)
+            lote = grupo["cluster"].to_numpy(dtype=int)
+            if estado is None or len(estado.rotulo) != len(lote):
+                relatorio["nucleos_iguais"] = relatorio["particao_igual"] = False
+                continue
+            online = self.rotulos(doenca)
+            nucleo = estado.nucleo.valores
+            lats = estado.lats.valores
+            lons = estado.lons.valores
+            dias = estado.dias.valores
+            grafo = construir_grafo_vizinhanca(lats, lons, dias, self.eps_km, self.peso_tempo)
+            # O grafo não guarda a diagonal: +1 conta o próprio ponto
+            nucleo_lote = np.diff(grafo.indptr) + 1 >= self.min_samples
+            if not np.array_equal(nucleo, nucleo_lote):
+                relatorio["nucleos_iguais"] = False
+            pares = set(zip(online[nucleo], lote[nucleo]))
+            if len(pares) != len({a for a, _ in pares}) or len(pares) != len({b for _, b in pares}):
+                relatorio["particao_igual"] = False
+            mapa = dict(pares)
+            borda = ~nucleo
+            relatorio["bordas_divergentes"] += int(sum(
+                mapa.get(o, -2) != l if o != -1 else l != -1
+                for o, l in zip(online[borda], lote[borda])
+            ))
+        return relatorio
+
@@ -0,0 +1,166 @@
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+from publicacao import ler_resultados
+from registro import ler_desde, posicao_atual
+
+
+# Eventos guardados para quem reconecta com Last-Event-ID
+LIMITE_HISTORICO = 200
+# Eventos pendentes por cliente; cliente lento demais é desconectado
+LIMITE_POR_CLIENTE = 500
+INTERVALO_BATIMENTO_S = 15.0
+
+
+class CanalEventos:
+    """
+    Server-sent events para os painéis: cada evento tem um id crescente e vai
+    para todos os clientes conectados. Um cliente que reconecta recebe o que
+    perdeu (se ainda estiver no histórico).
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._clientes = set()
+        self._historico = deque(maxlen=LIMITE_HISTORICO)
+        self._proximo_id = 1
+
+    def publicar(self, tipo, dados):
+        with self._trava:
+            evento = (self._proximo_id, tipo, json.dumps(dados, ensure_ascii=False, default=str))
+            self._proximo_id += 1
+            self._historico.append(evento)
+            lentos = []
+            for fila in self._clientes:
+                try:
+                    fila.put_nowait(evento)
+                except queue.Full:
+                    lentos.append(fila)
+            for fila in lentos:
+                self._clientes.discard(fila)
+                # Descarta o atrasado e sinaliza o fim para o gerador desse cliente
+                with fila.mutex:
+                    fila.queue.clear()
+                fila.put_nowait(None)
+
+    def clientes(self):
+        with self._trava:
+            return len(self._clientes)
+
+    def assinar(self, ultimo_id=None):
+        """Gerador de texto no formato text/event-stream para um cliente."""
+        fila = queue.Queue(maxsize=LIMITE_POR_CLIENTE)
+        with self._trava:
+            if ultimo_id is not None:
+                for evento in self._historico:
+                    if evento[0] > ultimo_id:
+                        fila.put_nowait(evento)
+            self._clientes.add(fila)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = fila.get(timeout=INTERVALO_BATIMENTO_S)
+                except queue.Empty:
+                    # Comentário: mantém a conexão viva atrás de proxies
+                    yield ": batimento\n\n"
+                    continue
+                if evento is None:
+                    return
+                id_evento, tipo, dados = evento
+                yield f"id: {id_evento}\nevent: {tipo}\ndata: {dados}\n\n"
+        finally:
+            with self._trava:
+                self._clientes.discard(fila)
+
+
+class SeguidorLog:
+    """
+    Lê o que foi acrescentado ao log (de qualquer processo) e publica como
+    eventos 'log' com a posição, a mesma do /saida_python?since=.
+    """
+
+    def __init__(self, canal, caminho, intervalo_s=1.0):
+        self.canal = canal
+        self.caminho = caminho
+        self.intervalo_s = intervalo_s
+        self._posicao = None
+        self._parar = threading.Event()
+
+    def iniciar(self):
+        threading.Thread(target=self._laco, daemon=True).start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+    def _ler_novas_linhas(self):
+        if self._posicao is None:
+            # Primeira leitura: começa do fim
+            self._posicao = posicao_atual(self.caminho)
+            return None
+        inicio = self._posicao
+        linhas, self._posicao, _ = ler_desde(inicio, caminho=self.caminho)
+        if not linhas:
+            return None
+        return {"inicio": inicio, "posicao": self._posicao, "linhas": linhas}
+
+    def _laco(self):
+        while not self._parar.wait(self.intervalo_s):
+            novas = self._ler_novas_linhas()
+            if novas:
+                self.canal.publicar("log", novas)
+
+
+class SeguidorResultados:
+    """
+    Lê o resultados.json (o mesmo para todos os workers) e publica no canal
+    deste processo o evento 'resultado' de cada versão nova. Os clientes de
+    qualquer worker recebem o aviso, não só os do worker que rodou o
+    pipeline. Se mais de uma versão saiu entre duas leituras, o evento vai
+    como completo (os clientes buscam tudo de novo).
+    """
+
+    def __init__(self, canal, intervalo_s=1.0):
+        self.canal = canal
+        self.intervalo_s = intervalo_s
+        self._versao = None
+        self._parar = threading.Event()
+
+    def iniciar(self):
+        threading.Thread(target=self._laco, daemon=True).start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+
+    def _ler_versao_nova(self):
+        resultados = ler_resultados()
+        versao = resultados.get("versao")
+        anterior, self._versao = self._versao, versao
+        if versao is None or anterior is None or versao <= anterior:
+            # Primeira leitura: começa da versão atual
+            return None
+        evento = resultados.get("evento")
+        pulou = versao > anterior + 1
+        if evento is None and not pulou:
+            return None
+        evento = dict(evento or {})
+        if pulou:
+            evento.update({
+                "completo": True, "casos": [], "clusters_alterados": [],
+                "graficos": sorted(os.path.basename(nome)[:-len(".png")]
+                                   for nome in resultados.get("arquivos", {}) if nome.endswith(".png")),
+            })
+        # Versão dos PNGs/mapas publicados (o ?v= de /grafico)
+        evento["publicado"] = versao
+        return evento
+
+    def _laco(self):
+        while not self._parar.wait(self.intervalo_s):
+            evento = self._ler_versao_nova()
+            if evento:
+                self.canal.publicar("resultado", evento)
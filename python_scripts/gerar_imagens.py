@@ -1,19 +1,23 @@
-import matplotlib.pyplot as plt
-import folium
-from folium.plugins import MarkerCluster, FeatureGroupSubGroup
-from branca.element import Element
-from folium import FeatureGroup
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import hashlib
+import html
+import json
 import pandas as pd
 import os
 
+from metricas import etapa, contar, definir, cronometrar, retirar, incorporar
+from publicacao import trava, gravar_atomico, gravar_json
+from registro import caminho_registro, iniciar_registro
+from api_clusters import CLUSTERS_PATH
+
 
 # Caminhos
-base_path = os.path.dirname(__file__)
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
 imagens_path = os.path.join(base_path, "imagens")
 csv_path = os.path.join(base_path, "dados_pacientes.csv")
 
-os.makedirs(imagens_path, exist_ok=True)
-
 
 cores_doencas = {
     'Dengue': 'orange',
@@ -22,9 +26,136 @@ cores_doencas = {
     'Zika': 'green'
 }
 
-#GRAFICOS GERAIS:
+#RENDERIZAÇÃO:
+# Cada gráfico vira uma tarefa (função de desenho, arquivo, dados, parâmetros).
+# A impressão digital dos dados fica em impressoes.json: se não mudou e o
+# PNG existe, o gráfico não é refeito. Os que mudaram são desenhados em
+# paralelo e cada PNG é trocado de uma vez (gravar_atomico). A trava
+# 'graficos' vale entre processos: dois workers não desenham o mesmo lote.
+
+# Mudou o jeito de desenhar? Aumente para refazer todos os PNGs
+VERSAO_GRAFICOS = 1
+IMPRESSOES_PATH = os.path.join(imagens_path, "impressoes.json")
+MAX_PROCESSOS = min(4, os.cpu_count() or 1)
+MAPAS = ("mapa_clusters.html", "mapa_clusters_validos.html")
+
+_pool = None
+
+
+def _impressao(tarefa):
+    funcao, arquivo, dados, parametros = tarefa
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((VERSAO_GRAFICOS, funcao.__name__, arquivo, sorted(parametros.items()))).encode())
+    if isinstance(dados, pd.DataFrame):
+        h.update(repr(list(dados.columns)).encode())
+        h.update(pd.util.hash_pandas_object(dados, index=False).values.tobytes())
+    else:
+        h.update(repr(list(dados.items())).encode())
+    return h.hexdigest()
 
-def gerar_grafico_pontos_geral(df):
+
+def _ler_impressoes():
+    try:
+        with open(IMPRESSOES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _desenhar(tarefa):
+    """Desenha num arquivo temporário e troca pelo PNG final."""
+    funcao, arquivo, dados, parametros = tarefa
+    gravar_atomico(os.path.join(imagens_path, arquivo),
+                   lambda temporario: funcao(dados, temporario, **parametros))
+    return arquivo
+
+
+def _desenhar_no_processo(tarefa):
+    """_desenhar num processo do pool: as métricas dele voltam junto."""
+    return _desenhar(tarefa), retirar()
+
+
+def _pyplot():
+    """
+    matplotlib (e o folium, nos mapas) só é importado quando algo é
+    desenhado: importar este módulo não custa quase nada.
+    """
+    import matplotlib
+    # Backend sem janela: os gráficos também são gerados em threads do Flask
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _obter_pool():
+    global _pool
+    if _pool is None:
+        # forkserver (spawn no Windows), não fork: o processo do Flask tem
+        # threads, e um fork copiaria travas fechadas por elas
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        log = caminho_registro()
+        _pool = ProcessPoolExecutor(
+            max_workers=MAX_PROCESSOS, mp_context=multiprocessing.get_context(metodo),
+            # Os prints dos processos vão para o mesmo log do pai
+            initializer=iniciar_registro if log else None, initargs=(log,) if log else ())
+    return _pool
+
+
+def impressoes_graficos():
+    """Arquivo -> impressão dos dados de cada gráfico já desenhado."""
+    with trava("graficos"):
+        return _ler_impressoes()
+
+
+def arquivos_resultados():
+    """Caminhos dos PNGs, mapas e tabela dos clusters gerados até agora (para publicar_resultados)."""
+    caminhos = [os.path.join(imagens_path, arquivo) for arquivo in sorted(impressoes_graficos())]
+    return caminhos + [os.path.join(base_path, mapa) for mapa in MAPAS] + [CLUSTERS_PATH]
+
+
+def renderizar_graficos(tarefas):
+    """Desenha só os gráficos cujos dados mudaram. Devolve os arquivos refeitos."""
+    with trava("graficos"):
+        impressoes = _ler_impressoes()
+        pendentes = {}
+        for tarefa in tarefas:
+            arquivo = tarefa[1]
+            impressao = _impressao(tarefa)
+            if (impressoes.get(arquivo) == impressao
+                    and os.path.exists(os.path.join(imagens_path, arquivo))):
+                continue
+            pendentes[arquivo] = (tarefa, impressao)
+        contar("graficos", len(tarefas) - len(pendentes), resultado="reaproveitado")
+        if not pendentes:
+            return []
+        contar("graficos", len(pendentes), resultado="desenhado")
+
+        lista = [tarefa for tarefa, _ in pendentes.values()]
+        with etapa("graficos_desenho"):
+            if len(lista) == 1 or MAX_PROCESSOS == 1:
+                feitos = [_desenhar(tarefa) for tarefa in lista]
+            else:
+                global _pool
+                try:
+                    feitos = []
+                    for arquivo, medidas in _obter_pool().map(_desenhar_no_processo, lista):
+                        incorporar(medidas)
+                        feitos.append(arquivo)
+                except BrokenProcessPool as e:
+                    print(f"[ERRO] Processos de desenho falharam, desenhando aqui mesmo: {e}")
+                    _pool = None
+                    feitos = [_desenhar(tarefa) for tarefa in lista]
+
+        for arquivo in feitos:
+            impressoes[arquivo] = pendentes[arquivo][1]
+        gravar_json(IMPRESSOES_PATH, impressoes)
+        return feitos
+
+
+#DESENHOS:
+
+def _desenhar_pontos(df, caminho, titulo):
+    plt = _pyplot()
     plt.figure(figsize=(8, 6))
     for doenca, grupo in df.groupby('diagnostico'):
         cor = cores_doencas.get(doenca, 'gray')
@@ -44,207 +175,268 @@ def gerar_grafico_pontos_geral(df):
 
     plt.xlabel('Longitude')
     plt.ylabel('Latitude')
-    plt.title('Clusters gerais por doença')
+    plt.title(titulo)
     plt.legend(title='Legenda', bbox_to_anchor=(1.05, 1), loc='upper left')
     plt.tight_layout()
-    plt.savefig(os.path.join(imagens_path, "cluster_geral.png"), bbox_inches='tight')
+    plt.savefig(caminho, bbox_inches='tight')
     plt.close()
 
 
-
-def gerar_grafico_barras_geral(df):
+def _desenhar_barras(contagem, caminho, titulo):
+    plt = _pyplot()
     plt.figure(figsize=(8, 6))
-    contagem = df['diagnostico'].value_counts()
     cores_barras = [cores_doencas.get(d, 'gray') for d in contagem.index]
 
     contagem.plot(kind='bar', color=cores_barras, edgecolor='black')
     plt.xlabel('Diagnóstico')
     plt.ylabel('Quantidade de casos')
-    plt.title('Quantidade total de casos por diagnóstico')
+    plt.title(titulo)
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig(os.path.join(imagens_path, "barras_geral.png"))
+    plt.savefig(caminho)
     plt.close()
 
-#GRÁFICOS POR TEMPO
 
-def gerar_grafico_pontos_tempo(df, data_ref, janela_dias=30):
-    data_ref = pd.to_datetime(data_ref)
+def _desenhar_pizza(contagem_locais, caminho, doenca):
+    plt = _pyplot()
+    porcentagens = (contagem_locais / contagem_locais.sum() * 100).round(1)
+    plt.figure(figsize=(9, 7))
+    wedges, texts = plt.pie(
+        contagem_locais,
+        startangle=140,
+        wedgeprops={'edgecolor': 'black'}
+    )
+    legend_labels = [
+        f"{bairro} — {pct:.1f}%"
+        for bairro, pct in zip(contagem_locais.index, porcentagens)
+    ]
+    plt.legend(
+        wedges,
+        legend_labels,
+        title="Bairros",
+        loc="center left",
+        bbox_to_anchor=(1.05, 0.5),
+        fontsize=13,
+        title_fontsize=14,
+        labelspacing=1.1
+    )
+    plt.title(f"Distribuição de {doenca} por bairro", fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    plt.savefig(caminho, bbox_inches='tight')
+    plt.close()
 
-    plt.figure(figsize=(8, 6))
-    for doenca, grupo in df.groupby('diagnostico'):
-        cor = cores_doencas.get(doenca, 'gray')
-        grupo_cluster = grupo[grupo['cluster'] != -1]
-        grupo_ruido = grupo[grupo['cluster'] == -1]
 
-        plt.scatter(
-            grupo_cluster['local_lon'], grupo_cluster['local_lat'],
-            c=cor, label=f"{doenca} (cluster)",
-            alpha=0.7, s=70, edgecolor='black', marker='o'
-        )
-        plt.scatter(
-            grupo_ruido['local_lon'], grupo_ruido['local_lat'],
-            c=cor, label=f"{doenca} (isolado)",
-            alpha=0.5, s=70, edgecolor='black', marker='x'
-        )
+def _pontos(df):
+    """Só as colunas que o gráfico de pontos usa (é o que entra na impressão)."""
+    return df[['diagnostico', 'cluster', 'local_lon', 'local_lat']].reset_index(drop=True)
 
-    plt.xlabel('Longitude')
-    plt.ylabel('Latitude')
-    plt.title(f'Clusters detectados ±{janela_dias} dias de {data_ref.date()}')
-    plt.legend(title='Legenda', bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    plt.savefig(os.path.join(imagens_path, "cluster_data.png"), bbox_inches='tight')
-    plt.close()
 
+#TAREFAS:
 
-def gerar_grafico_barras_tempo(df, data_ref, janela_dias=30):
+def tarefas_grafico_geral(df):
+    return [
+        (_desenhar_pontos, "cluster_geral.png", _pontos(df),
+         {"titulo": 'Clusters gerais por doença'}),
+        (_desenhar_barras, "barras_geral.png", df['diagnostico'].value_counts(),
+         {"titulo": 'Quantidade total de casos por diagnóstico'}),
+    ]
+
+
+def tarefas_grafico_tempo(df, data_ref, janela_dias=30):
     data_ref = pd.to_datetime(data_ref)
-    plt.figure(figsize=(8, 6))
+    return [
+        (_desenhar_pontos, "cluster_data.png", _pontos(df),
+         {"titulo": f'Clusters detectados ±{janela_dias} dias de {data_ref.date()}'}),
+        (_desenhar_barras, "barras_data.png", df['diagnostico'].value_counts(),
+         {"titulo": f'Casos entre {data_ref.date()} ± {janela_dias} dias'}),
+    ]
 
-    contagem = df['diagnostico'].value_counts()
-    cores_barras = [cores_doencas.get(d, 'gray') for d in contagem.index]
 
-    contagem.plot(kind='bar', color=cores_barras, edgecolor='black')
-    plt.xlabel('Diagnóstico')
-    plt.ylabel('Quantidade de casos')
-    plt.title(f'Casos entre {data_ref.date()} ± {janela_dias} dias')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(imagens_path, "barras_data.png"))
-    plt.close()
+def tarefas_graficos_pizza(df_resultado):
+    tarefas = []
+    for doenca, grupo in df_resultado.groupby('diagnostico'):
+        contagem_locais = grupo['bairro'].value_counts()
+        if contagem_locais.empty:
+            continue
+        tarefas.append((_desenhar_pizza, f"pizza_{doenca.lower()}.png", contagem_locais,
+                        {"doenca": doenca}))
+    return tarefas
+
+
+#GRAFICOS GERAIS:
+
+def gerar_grafico_pontos_geral(df):
+    renderizar_graficos(tarefas_grafico_geral(df)[:1])
 
 
+def gerar_grafico_barras_geral(df):
+    renderizar_graficos(tarefas_grafico_geral(df)[1:])
+
+#GRÁFICOS POR TEMPO
+
+def gerar_grafico_pontos_tempo(df, data_ref, janela_dias=30):
+    renderizar_graficos(tarefas_grafico_tempo(df, data_ref, janela_dias)[:1])
+
+
+def gerar_grafico_barras_tempo(df, data_ref, janela_dias=30):
+    renderizar_graficos(tarefas_grafico_tempo(df, data_ref, janela_dias)[1:])
+
 
 #FUNÇÕES PRINCIPAIS (CHAMADAS NO MAIN)
 
 def gerar_grafico_geral(df):
-    gerar_grafico_pontos_geral(df)
-    gerar_grafico_barras_geral(df)
+    renderizar_graficos(tarefas_grafico_geral(df))
 
 
 def gerar_grafico_tempo(df, data_ref, janela_dias=30):
-    gerar_grafico_pontos_tempo(df, data_ref, janela_dias)
-    gerar_grafico_barras_tempo(df, data_ref, janela_dias)
+    renderizar_graficos(tarefas_grafico_tempo(df, data_ref, janela_dias))
 
 
 #PIZZAS:
 
 def gerar_graficos_pizza(df_resultado):
-    for doenca, grupo in df_resultado.groupby('diagnostico'):
-        contagem_locais = grupo['bairro'].value_counts()
-        if contagem_locais.empty:
-            continue
-        porcentagens = (contagem_locais / contagem_locais.sum() * 100).round(1)
-        plt.figure(figsize=(9, 7))
-        wedges, texts = plt.pie(
-            contagem_locais,
-            startangle=140,
-            wedgeprops={'edgecolor': 'black'}
-        )
-        legend_labels = [
-            f"{bairro} — {pct:.1f}%"
-            for bairro, pct in zip(contagem_locais.index, porcentagens)
-        ]
-        plt.legend(
-            wedges,
-            legend_labels,
-            title="Bairros",
-            loc="center left",
-            bbox_to_anchor=(1.05, 0.5),
-            fontsize=13,
-            title_fontsize=14,
-            labelspacing=1.1
-        )
-        plt.title(f"Distribuição de {doenca} por bairro", fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        nome_arquivo = f"pizza_{doenca.lower()}.png"
-        plt.savefig(os.path.join(imagens_path, nome_arquivo), bbox_inches='tight')
-        plt.close()
+    renderizar_graficos(tarefas_graficos_pizza(df_resultado))
 
 
 #FUNÇÕES MAPA:
-
-def gerar_mapa_clusters(df, arquivo_saida="mapa_clusters.html"):
+# Cada camada (doença - clusters / doença - ruído) vem com os casos numa
+# única coleção GeoJSON, com estilo por camada: aberto direto do arquivo,
+# o mapa mostra os pontos como sempre. Servido pelo site (/mapa), o
+# static/js/mapa_clusters.js troca o conteúdo das camadas pelos casos da
+# área visível em /api/clusters/pontos (agregados numa grade que depende
+# do zoom) a cada movimento e a cada evento 'resultado' do SSE, sem
+# recarregar a página.
+
+def _js(valor):
     """
-    Gera mapa interativo com:
-      - Menu lateral: apenas 'Doença - Clusters' e 'Doença - Ruído'
-      - Cada cluster_id tem seu próprio agrupamento visual
-      - Clusters só se unem após certo nível de zoom
+    Texto ou número como literal JS seguro dentro de um <script>. Chaves
+    também escapadas: o folium passa o HTML pelo Jinja mais de uma vez.
     """
-    cores_doencas = {
-        'Dengue': 'orange',
-        'COVID': 'red',
-        'Influenza': 'blue',
-        'Zika': 'green'
+    texto = json.dumps(valor, ensure_ascii=False)
+    return texto.replace("<", "\\u003c").replace("{", "\\u007b").replace("}", "\\u007d")
+
+
+def _objeto_js(pares):
+    """Objeto JS {chave: valor} com chaves escapadas e valores já em JS."""
+    return "{" + ", ".join(f"{_js(chave)}: {valor}" for chave, valor in pares) + "}"
+
+
+def _colecao_pontos(subset):
+    """FeatureCollection de pontos com o cluster de cada caso nas propriedades."""
+    lons = subset["local_lon"].round(6).tolist()
+    lats = subset["local_lat"].round(6).tolist()
+    clusters = subset["cluster"].astype(int).tolist()
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature",
+             "geometry": {"type": "Point", "coordinates": [lon, lat]},
+             "properties": {"cluster": cluster}}
+            for lon, lat, cluster in zip(lons, lats, clusters)
+        ],
     }
 
-    base_path = os.path.dirname(__file__)
-    caminho_arquivo = os.path.join(base_path, arquivo_saida)
-
-    lat_media = df['local_lat'].mean()
-    lon_media = df['local_lon'].mean()
-    mapa = folium.Map(location=[lat_media, lon_media], zoom_start=12)
 
-    for doenca in df['diagnostico'].unique():
-        subset = df[df['diagnostico'] == doenca]
+def _camadas_mapa(df):
+    """Uma passada pelos casos: (doença, clusters, ruído) para os dois mapas."""
+    camadas = []
+    for doenca, subset in df.groupby("diagnostico", sort=False):
+        validos = subset[subset["cluster"] >= 0].sort_values("cluster", kind="stable")
+        ruido = subset[subset["cluster"] == -1]
+        camadas.append((doenca, _colecao_pontos(validos), _colecao_pontos(ruido)))
+    return camadas
+
+
+def _camada_geojson(colecao, doenca, cor, cor_preenchimento, opacidade):
+    import folium
+    from folium.utilities import JsCode
+    estilo = {"color": cor, "fillColor": cor_preenchimento,
+              "fillOpacity": opacidade, "fill": True}
+    # Nome da doença vem da planilha: escapado para o HTML do popup e
+    # como literal JS (_js)
+    titulo = _js(f"<b>{html.escape(doenca)}</b><br>")
+    popup = JsCode(f"""
+        function(feature, layer) {{
+            var c = feature.properties.cluster;
+            layer.bindPopup({titulo} + (c >= 0 ? "Cluster " + c : "Ruído"));
+        }}
+    """)
+    return folium.GeoJson(
+        colecao,
+        marker=folium.Circle(radius=700),
+        style_function=lambda feature: estilo,
+        on_each_feature=popup,
+        control=False,
+    )
+
+
+def _montar_mapa(camadas, centro, incluir_ruido, caminho_arquivo):
+    import folium
+    from branca.element import MacroElement, Template
+    mapa = folium.Map(location=centro, zoom_start=12)
+
+    grupos = []
+    for doenca, clusters, ruido in camadas:
+        if not incluir_ruido and not clusters["features"]:
+            continue
         cor = cores_doencas.get(doenca, "gray")
 
-        grupo_clusters = folium.FeatureGroup(name=f"{doenca} - Clusters").add_to(mapa)
-
-        #MarkerCluster separado para cada cluster_id
-        subset_validos = subset[subset["cluster"] >= 0]
-        for cluster_id in sorted(subset_validos["cluster"].unique()):
-            subset_cluster = subset_validos[subset_validos["cluster"] == cluster_id]
-
-            #Cada cluster_id com seu agrupamento próprio
-            marker_cluster = MarkerCluster(
-                name=f"{doenca} - C{cluster_id}",
-                options={'disableClusteringAtZoom': 12}
-            ).add_to(grupo_clusters)
-
-            for _, row in subset_cluster.iterrows():
-                folium.Circle(
-                    location=[row["local_lat"], row["local_lon"]],
-                    radius=700,
-                    color=cor,
-                    fill=True,
-                    fill_color=cor,
-                    fill_opacity=0.45,
-                    popup=f"<b>{doenca}</b><br>Cluster {cluster_id}"
-                ).add_to(marker_cluster)
-
-        subset_ruido = subset[subset["cluster"] == -1]
-        if not subset_ruido.empty:
-            grupo_ruido = folium.FeatureGroup(name=f"{doenca} - Ruído").add_to(mapa)
-            for _, row in subset_ruido.iterrows():
-                folium.Circle(
-                    location=[row["local_lat"], row["local_lon"]],
-                    radius=700,
-                    color="black",
-                    fill=True,
-                    fill_color="gray",
-                    fill_opacity=0.35,
-                    popup=f"<b>{doenca}</b><br>Ruído"
-                ).add_to(grupo_ruido)
+        tipos = {"cluster": folium.FeatureGroup(name=f"{doenca} - Clusters").add_to(mapa)}
+        if clusters["features"]:
+            _camada_geojson(clusters, doenca, cor, cor, 0.45).add_to(tipos["cluster"])
+
+        if incluir_ruido and ruido["features"]:
+            tipos["ruido"] = folium.FeatureGroup(name=f"{doenca} - Ruído").add_to(mapa)
+            _camada_geojson(ruido, doenca, "black", "gray", 0.35).add_to(tipos["ruido"])
+        grupos.append((doenca, tipos))
 
     folium.LayerControl(collapsed=False).add_to(mapa)
 
-    reload_script = """
-    <script>
-    setInterval(() => location.reload(), 20000);
-    </script>
-    """
-    mapa.get_root().html.add_child(Element(reload_script))
-    mapa.save(caminho_arquivo)
+    # Depois do LayerControl: o script roda com o mapa e as camadas já
+    # criados. Fora do site o mapa_clusters.js não carrega e ficam os
+    # pontos do próprio arquivo.
+    camadas_js = _objeto_js(
+        (doenca, _objeto_js((tipo, grupo.get_name()) for tipo, grupo in tipos.items()))
+        for doenca, tipos in grupos
+    )
+    ligacao = MacroElement()
+    ligacao._template = Template("""
+        {% macro header(this, kwargs) %}
+            <script src="/static/js/mapa_clusters.js"></script>
+        {% endmacro %}
+        {% macro script(this, kwargs) %}
+            if (typeof iniciarMapaClusters === "function") {
+                iniciarMapaClusters({{ this._parent.get_name() }}, {{ this.opcoes }});
+            }
+        {% endmacro %}
+    """)
+    ligacao.opcoes = _objeto_js([
+        ("camadas", camadas_js),
+        ("cores", _objeto_js((doenca, _js(cor)) for doenca, cor in cores_doencas.items())),
+        ("validos", _js(not incluir_ruido)),
+    ])
+    ligacao.add_to(mapa)
+    gravar_atomico(caminho_arquivo, mapa.save)
+    definir("mapa_bytes", os.path.getsize(caminho_arquivo), mapa=os.path.basename(caminho_arquivo))
     return caminho_arquivo
 
 
-def gerar_mapa_clusters_validos(df, arquivo_saida="mapa_clusters_validos.html"):
+@cronometrar("mapas")
+def gerar_mapas(df, arquivo_saida=MAPAS[0], arquivo_validos=MAPAS[1]):
     """
-    Gera um mapa apenas com clusters válidos (exclui ruído, cluster = -1)
+    Gera o mapa completo e o de clusters válidos a partir das mesmas camadas.
+    Menu lateral: 'Doença - Clusters' e 'Doença - Ruído' (só no completo,
+    e só para doenças com ruído). Pelo site (/mapa, /mapa_validos) os casos
+    das camadas são trocados pelos da API.
     """
-    df_validos = df[df["cluster"] != -1].copy()
-    if not df_validos.empty:
-        gerar_mapa_clusters(df_validos, arquivo_saida=arquivo_saida)
+    camadas = _camadas_mapa(df)
+    caminhos = [_montar_mapa(camadas, [df['local_lat'].mean(), df['local_lon'].mean()],
+                             True, os.path.join(base_path, arquivo_saida))]
+
+    validos = df[df["cluster"] != -1]
+    if not validos.empty:
+        caminhos.append(_montar_mapa(camadas, [validos['local_lat'].mean(), validos['local_lon'].mean()],
+                                     False, os.path.join(base_path, arquivo_validos)))
     else:
         print("Nenhum cluster válido encontrado para gerar o mapa.")
+    return caminhos
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+from armazenamento_casos import inserir_casos
+
+
+class FilaCheia(Exception):
+    """A fila de ingestão está no limite; o cliente deve tentar de novo depois."""
+
+
+class _Pedido:
+    __slots__ = ("linha", "chegada", "pronto", "erro", "estado")
+
+    def __init__(self, linha):
+        self.linha = linha
+        self.chegada = time.perf_counter()
+        self.pronto = threading.Event()
+        self.erro = None
+        # "na_fila" -> "gravando" (pego pelo gravador) ou "cancelado" (timeout)
+        self.estado = "na_fila"
+
+
+class FilaIngestao:
+    """
+    Group commit para os envios do site: pedidos que chegam juntos são
+    gravados numa única transação (um único fsync). Cada envio só é
+    confirmado depois que a transação do seu lote foi gravada. A fila tem
+    tamanho máximo; cheia, o envio é recusado na hora (FilaCheia).
+
+    Se o lote falha, cada caso é gravado de novo sozinho: só os casos com
+    problema recebem o erro. No timeout, um caso que ainda está na fila é
+    cancelado (nunca será gravado, o cliente pode reenviar sem duplicar);
+    um caso que já está sendo gravado espera o fim da transação.
+    """
+
+    def __init__(self, capacidade=1000, lote_maximo=256, espera_lote_s=0.002):
+        self.capacidade = capacidade
+        self.lote_maximo = lote_maximo
+        self.espera_lote_s = espera_lote_s
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._trava = threading.Lock()
+        self._thread = None
+
+        self.recebidos = 0
+        self.gravados = 0
+        self.recusados = 0
+        self.falhas = 0
+        self.cancelados = 0
+        self.lotes = 0
+        self.maior_lote = 0
+        self.latencia_total_s = 0.0
+        self.latencia_maxima_s = 0.0
+        self._inicio = time.monotonic()
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco_gravacao, daemon=True)
+            self._thread.start()
+        return self
+
+    def enviar(self, linha, timeout=30.0):
+        """Enfileira um caso e espera até ele estar gravado em disco."""
+        pedido = _Pedido(linha)
+        try:
+            self._fila.put_nowait(pedido)
+        except queue.Full:
+            with self._trava:
+                self.recusados += 1
+            raise FilaCheia("Fila de ingestão cheia, tente novamente.")
+        with self._trava:
+            self.recebidos += 1
+        if not pedido.pronto.wait(timeout):
+            with self._trava:
+                if pedido.estado == "na_fila":
+                    pedido.estado = "cancelado"
+                    self.cancelados += 1
+                    raise TimeoutError("Tempo esgotado esperando a gravação do caso (não gravado).")
+            # Já está na transação: o resultado sai em seguida
+            pedido.pronto.wait()
+        if pedido.erro is not None:
+            raise pedido.erro
+
+    def _proximo_lote(self):
+        lote = [self._fila.get()]
+        prazo = time.perf_counter() + self.espera_lote_s
+        while len(lote) < self.lote_maximo:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                restante = prazo - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+        return lote
+
+    def _gravar(self, lote):
+        """Grava o lote numa transação; se falhar, grava caso a caso."""
+        try:
+            inserir_casos([pedido.linha for pedido in lote])
+            return
+        except Exception as e:
+            if len(lote) == 1:
+                lote[0].erro = e
+                return
+        for pedido in lote:
+            try:
+                inserir_casos([pedido.linha])
+            except Exception as e:
+                pedido.erro = e
+
+    def _laco_gravacao(self):
+        while True:
+            lote = self._proximo_lote()
+            with self._trava:
+                lote = [pedido for pedido in lote if pedido.estado != "cancelado"]
+                for pedido in lote:
+                    pedido.estado = "gravando"
+            if not lote:
+                continue
+            self._gravar(lote)
+            agora = time.perf_counter()
+            with self._trava:
+                self.lotes += 1
+                self.maior_lote = max(self.maior_lote, len(lote))
+                for pedido in lote:
+                    if pedido.erro is None:
+                        self.gravados += 1
+                    else:
+                        self.falhas += 1
+                    latencia = agora - pedido.chegada
+                    self.latencia_total_s += latencia
+                    self.latencia_maxima_s = max(self.latencia_maxima_s, latencia)
+            for pedido in lote:
+                pedido.pronto.set()
+
+    def estatisticas(self):
+        with self._trava:
+            concluidos = self.gravados + self.falhas
+            decorrido = time.monotonic() - self._inicio
+            return {
+                "na_fila": self._fila.qsize(),
+                "capacidade": self.capacidade,
+                "recebidos": self.recebidos,
+                "gravados": self.gravados,
+                "recusados": self.recusados,
+                "falhas": self.falhas,
+                "cancelados": self.cancelados,
+                "lotes": self.lotes,
+                "maior_lote": self.maior_lote,
+                "media_por_lote": round(concluidos / self.lotes, 2) if self.lotes else 0,
+                "gravados_por_s": round(self.gravados / decorrido, 2) if decorrido > 0 else 0,
+                "latencia_media_ms": round(1000 * self.latencia_total_s / concluidos, 3) if concluidos else 0,
+                "latencia_maxima_ms": round(1000 * self.latencia_maxima_s, 3),
+            }
@@ -1,49 +1,152 @@
-from gerar_imagens import gerar_mapa_clusters, gerar_mapa_clusters_validos, gerar_grafico_geral, gerar_grafico_tempo, gerar_graficos_pizza
-from dbscan import detectar_clusters, detectar_surtos_por_data
+from gerar_imagens import gerar_mapas, gerar_grafico_tempo, renderizar_graficos, tarefas_grafico_geral, tarefas_graficos_pizza, arquivos_resultados, impressoes_graficos
+from dbscan import detectar_clusters, detectar_surtos_por_data, varrer_surtos, varrer_parametros
 from coleta_dados_google import baixar_e_formatar_csv
+from armazenamento_casos import carregar_casos, assinatura
+from api_clusters import delta_resultados, gravar_clusters
+from metricas import etapa, execucao, definir, cronometrar
+from publicacao import trava, publicar_resultados
+from registro import iniciar_registro, marcar_execucao
 import os
-import pandas as pd
 import sys
-import time
 from datetime import date
 
 
 # Caminhos
-base_path = os.path.dirname(__file__)
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
 imagens_path = os.path.join(base_path, "imagens")
-csv_path = os.path.join(base_path, "dados_pacientes.csv")
-os.makedirs(imagens_path, exist_ok=True)
 
+COLUNAS_SAIDA = ["cluster", "diagnostico", "data", "local_lat", "local_lon", "nome"]
+# Doenças clusterizadas em paralelo (um processo por doença)
+PROCESSOS_CLUSTERIZACAO = min(4, os.cpu_count() or 1)
 
 
-# Ler CSV
-df = pd.read_csv(csv_path, sep=",", quotechar='"', engine="python")
-df["data"] = pd.to_datetime(df["data"], errors="coerce")
-df = df.dropna(subset=["data", "local_lat", "local_lon"])
+def carregar_dados():
+    """Lê os casos do banco e descarta linhas sem data ou coordenadas."""
+    with etapa("carregar_casos"):
+        df = carregar_casos()
+    df = df.dropna(subset=["data", "local_lat", "local_lon"])
+    definir("casos_carregados", len(df))
+    return df
+
+
+def resumir_clusters(df_clusters):
+    """Resumo estruturado (JSON) de um resultado de detectar_clusters."""
+    if df_clusters.empty:
+        return {"casos": 0, "ruido": 0, "clusters": []}
+    validos = df_clusters[df_clusters["cluster"] != -1]
+    clusters = [
+        {
+            "cluster": int(cluster_id),
+            "diagnostico": grupo["diagnostico"].iloc[0],
+            "casos": int(len(grupo)),
+            "inicio": grupo["data"].min().strftime("%Y-%m-%d"),
+            "fim": grupo["data"].max().strftime("%Y-%m-%d"),
+        }
+        for cluster_id, grupo in validos.groupby("cluster")
+    ]
+    return {
+        "casos": int(len(df_clusters)),
+        "ruido": int((df_clusters["cluster"] == -1).sum()),
+        "clusters": clusters,
+    }
+
+
+def desenhar_geral(df_geral):
+    """Gráficos gerais, pizzas, mapas e tabela da API de um resultado de clusters."""
+    # Gerais e pizzas no mesmo lote: os que mudaram são desenhados em paralelo
+    renderizar_graficos(tarefas_grafico_geral(df_geral) + tarefas_graficos_pizza(df_geral))
+    gerar_mapas(df_geral)
+    gravar_clusters(df_geral)
+
+
+@cronometrar("etapa_geral")
+def etapa_geral(df):
+    """Clusters com todos os casos, gráficos gerais, pizzas e mapas."""
+    df_geral = detectar_clusters(df, processos=PROCESSOS_CLUSTERIZACAO)
+    desenhar_geral(df_geral)
+    return df_geral
+
+
+@cronometrar("etapa_data")
+def etapa_data(df, data_ref, indice=None, cache=None):
+    """Clusters na janela em torno de data_ref e gráficos por tempo."""
+    df_data = detectar_surtos_por_data(df, data_ref, indice=indice, cache=cache,
+                                       processos=PROCESSOS_CLUSTERIZACAO)
+    if not df_data.empty:
+        gerar_grafico_tempo(df_data, data_ref=data_ref)
+    return df_data
+
+
+def texto_saida(df_geral, data_ref, df_data):
+    """Mesmo texto que o main.py sempre imprimiu."""
+    partes = ["Clusters detectados (geral):",
+              df_geral[COLUNAS_SAIDA].to_string(index=False)]
+    if not df_data.empty:
+        partes.append(f"\nSurtos detectados em torno de {data_ref}:")
+        partes.append(df_data[COLUNAS_SAIDA].to_string(index=False))
+    partes.append(f"\nGráficos salvos em: {imagens_path}")
+    return "\n".join(partes)
+
+
+def rodar_varredura(data_inicio, data_fim, arquivo_saida=None):
+    """
+    python main.py --varredura AAAA-MM-DD AAAA-MM-DD [saida.csv]
+    Tabela de surtos para cada dia do intervalo (janela deslizante).
+    """
+    tabela = varrer_surtos(carregar_dados(), data_inicio, data_fim)
+    if arquivo_saida:
+        tabela.to_csv(arquivo_saida, index=False)
+        print(f"Varredura salva em: {arquivo_saida}")
+    else:
+        print(tabela[["data", "diagnostico", "casos", "clusters", "ruido", "tamanhos"]]
+              .to_string(index=False))
+    return tabela
+
+
+def rodar_varredura_parametros(arquivo_saida=None):
+    """
+    python main.py --parametros [saida.csv]
+    Clusters e ruído por doença para uma grade de eps_km x min_samples.
+    """
+    tabela = varrer_parametros(carregar_dados(),
+                               eps_lista=[0.2, 0.4, 0.6, 0.8, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0],
+                               min_samples_lista=[2, 3, 4, 5, 6])
+    if arquivo_saida:
+        tabela.to_csv(arquivo_saida, index=False)
+        print(f"Varredura de parâmetros salva em: {arquivo_saida}")
+    else:
+        print(tabela[["eps_km", "min_samples", "diagnostico", "casos", "clusters", "ruido", "razao_ruido"]]
+              .to_string(index=False))
+    return tabela
 
 
 if __name__ == "__main__":
-    baixar_e_formatar_csv()
-    time.sleep(3)
-    df_geral = detectar_clusters(df)
-    print("Clusters detectados (geral):")
-    print(df_geral[["cluster", "diagnostico", "data", "local_lat", "local_lon","nome"]]
-          .to_string(index=False))
-    gerar_grafico_geral(df_geral)
-    gerar_graficos_pizza(df_geral)
+    if len(sys.argv) > 3 and sys.argv[1] == "--varredura":
+        rodar_varredura(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "--parametros":
+        rodar_varredura_parametros(sys.argv[2] if len(sys.argv) > 2 else None)
+        sys.exit(0)
+    iniciar_registro()
     #Verifica se tem data
     if len(sys.argv) > 1:
         data_ref = sys.argv[1]
         print(f"Rodando DBSCAN para a data: {data_ref}")
     else:
         data_ref = date.today().strftime("%Y-%m-%d")
-    df_data = detectar_surtos_por_data(df, data_ref)
-    if not df_data.empty:
-        print(f"\nSurtos detectados em torno de {data_ref}:")
-        print(df_data[["cluster", "diagnostico", "data", "local_lat", "local_lon", "nome"]]
-              .to_string(index=False))
-        gerar_grafico_tempo(df_data, data_ref=data_ref)
-    print(f"\nGráficos salvos em: {imagens_path}")
-    # Gerar mapa interativo
-    gerar_mapa_clusters(df_geral, arquivo_saida="mapa_clusters.html")
-    gerar_mapa_clusters_validos(df_geral, arquivo_saida="mapa_clusters_validos.html")
+    with execucao("main", data_ref=data_ref):
+        # A sincronização grava numa transação: os casos já estão no banco
+        baixar_e_formatar_csv()
+        dados = ".".join(map(str, assinatura()))
+        df = carregar_dados()
+        # Mesma trava do pipeline do app.py: não escrevem os arquivos juntos
+        with trava("pipeline"):
+            marcar_execucao(f"main {data_ref}")
+            df_geral = etapa_geral(df)
+            df_data = etapa_data(df, data_ref)
+            # Painéis abertos no site: sem o resultado anterior, o aviso vai completo
+            evento = {"versao": dados, "data_ref": data_ref,
+                      "graficos": sorted(arquivo[:-len(".png")] for arquivo in impressoes_graficos()),
+                      **delta_resultados(None, df_geral)}
+            publicar_resultados(arquivos_resultados(), evento=evento, dados=dados, data_ref=data_ref)
+    print(texto_saida(df_geral, data_ref, df_data))
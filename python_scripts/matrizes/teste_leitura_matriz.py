@@ -1,6 +1,21 @@
+import os
 import numpy as np
 
-matriz = np.load("python_scripts/matrizes/Zika_arquivo_matriz.npy")
-print(matriz)
-print('-'*50)
-print(matriz[:5, :5])
+# Abre mapeado em memória: não carrega o arquivo inteiro na RAM
+matriz = np.load(os.path.join(os.path.dirname(__file__), "Zika_arquivo_matriz.npy"), mmap_mode="r")
+
+if matriz.ndim == 1:
+    # Formato condensado: par (i, j), i > j, na posição i*(i-1)/2 + j
+    n = int((1 + np.sqrt(1 + 8 * len(matriz))) // 2)
+    print(f"Matriz condensada: {n} pontos, {len(matriz)} distâncias ({matriz.dtype})")
+    print('-'*50)
+    k = min(n, 5)
+    amostra = np.zeros((k, k))
+    for i in range(1, k):
+        for j in range(i):
+            amostra[i, j] = amostra[j, i] = matriz[i * (i - 1) // 2 + j]
+    print(amostra)
+else:
+    print(matriz)
+    print('-'*50)
+    print(matriz[:5, :5])
@@ -0,0 +1,270 @@
+"""
+Tempos por etapa, contadores e valores do pipeline e do site.
+
+    with etapa("dbscan", modo="denso"):
+        ...
+    contar("graficos_desenhados", 3)
+    definir("matriz_pontos", n, doenca="Dengue")
+
+O /metrics do app.py mostra tudo no formato texto do Prometheus. Os
+processos dos pools (dbscan, gráficos) devolvem o que mediram junto com o
+resultado: retirar() no processo filho, incorporar() no pai. Com
+GEOEPI_TRACE=<pasta>, cada execução registrada com execucao() grava um
+JSON com todas as etapas na pasta. GEOEPI_METRICAS=0 desliga tudo: as
+funções voltam na hora, sem medir nem guardar nada.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+ATIVO = os.environ.get("GEOEPI_METRICAS", "1") != "0"
+PASTA_TRACE = os.environ.get("GEOEPI_TRACE") or None
+
+PREFIXO = "geoepi"
+# Limites (segundos) dos baldes do histograma de duração
+BALDES = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trava = threading.Lock()
+_duracoes = {}
+_contadores = {}
+_valores = {}
+_local = threading.local()
+
+
+def _reiniciar_no_filho():
+    # Processo filho (fork): a trava pode ter sido copiada fechada por
+    # outra thread do pai
+    global _trava
+    _trava = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+class _Duracao:
+    __slots__ = ("baldes", "quantidade", "soma", "maximo")
+
+    def __init__(self):
+        self.baldes = [0] * len(BALDES)
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        for i, limite in enumerate(BALDES):
+            if segundos <= limite:
+                self.baldes[i] += 1
+                break
+        self.quantidade += 1
+        self.soma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+
+def _chave(nome, rotulos):
+    return (nome, tuple(sorted(rotulos.items())))
+
+
+def observar(nome, segundos, **rotulos):
+    """Registra uma duração já medida (ex.: latência de um pedido HTTP)."""
+    if not ATIVO:
+        return
+    chave = _chave(nome, rotulos)
+    with _trava:
+        duracao = _duracoes.get(chave)
+        if duracao is None:
+            duracao = _duracoes[chave] = _Duracao()
+        duracao.observar(segundos)
+
+
+def contar(nome, valor=1, **rotulos):
+    if not ATIVO:
+        return
+    chave = _chave(nome, rotulos)
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def definir(nome, valor, **rotulos):
+    if not ATIVO:
+        return
+    with _trava:
+        _valores[_chave(nome, rotulos)] = valor
+
+
+class _EtapaVazia:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_ETAPA_VAZIA = _EtapaVazia()
+
+
+class _Etapa:
+    __slots__ = ("nome", "rotulos", "inicio")
+
+    def __init__(self, nome, rotulos):
+        self.nome = nome
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_erro, erro, rastro):
+        fim = time.perf_counter()
+        observar("etapa_segundos", fim - self.inicio, etapa=self.nome, **self.rotulos)
+        if tipo_erro is not None:
+            contar("etapa_erros", etapa=self.nome)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace["etapas"].append({
+                "etapa": self.nome,
+                **self.rotulos,
+                "inicio_s": round(self.inicio - trace["_inicio"], 6),
+                "duracao_s": round(fim - self.inicio, 6),
+                "erro": repr(erro) if erro is not None else None,
+            })
+        return False
+
+
+def etapa(nome, **rotulos):
+    """Context manager que mede a duração de uma etapa."""
+    if not ATIVO:
+        return _ETAPA_VAZIA
+    return _Etapa(nome, rotulos)
+
+
+def cronometrar(nome):
+    """Decorador: cada chamada da função é uma etapa."""
+    def decorador(funcao):
+        def envolvida(*args, **kwargs):
+            with etapa(nome):
+                return funcao(*args, **kwargs)
+        envolvida.__name__ = funcao.__name__
+        envolvida.__doc__ = funcao.__doc__
+        envolvida.__wrapped__ = funcao
+        return envolvida
+    return decorador
+
+
+@contextmanager
+def execucao(nome, **detalhes):
+    """
+    Uma execução do pipeline. Com GEOEPI_TRACE definido, as etapas feitas
+    nesta thread entram num JSON gravado na pasta do trace ao final.
+    """
+    if not ATIVO or PASTA_TRACE is None or getattr(_local, "trace", None) is not None:
+        with etapa(nome):
+            yield
+        return
+    trace = {"execucao": nome, **detalhes, "data": datetime.now().isoformat(timespec="seconds"),
+             "etapas": [], "_inicio": time.perf_counter()}
+    _local.trace = trace
+    try:
+        with etapa(nome):
+            yield
+    finally:
+        _local.trace = None
+        trace["duracao_s"] = round(time.perf_counter() - trace.pop("_inicio"), 6)
+        os.makedirs(PASTA_TRACE, exist_ok=True)
+        arquivo = os.path.join(PASTA_TRACE, f"trace_{datetime.now():%Y%m%d_%H%M%S_%f}_{nome}.json")
+        with open(arquivo, "w", encoding="utf-8") as f:
+            json.dump(trace, f, indent=1, ensure_ascii=False, default=str)
+
+
+def _rotulos_texto(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+
+def texto_prometheus():
+    """Todas as métricas no formato texto de exposição do Prometheus."""
+    with _trava:
+        duracoes = {k: (list(v.baldes), v.quantidade, v.soma, v.maximo) for k, v in _duracoes.items()}
+        contadores = dict(_contadores)
+        valores = dict(_valores)
+
+    linhas = []
+    por_nome = {}
+    for (nome, rotulos), dados in sorted(duracoes.items()):
+        por_nome.setdefault(nome, []).append((rotulos, dados))
+    for nome, series in por_nome.items():
+        linhas.append(f"# TYPE {PREFIXO}_{nome} histogram")
+        for rotulos, (baldes, quantidade, soma, _) in series:
+            acumulado = 0
+            for limite, qtd in zip(BALDES, baldes):
+                acumulado += qtd
+                linhas.append(f"{PREFIXO}_{nome}_bucket{_rotulos_texto(rotulos, [('le', limite)])} {acumulado}")
+            linhas.append(f"{PREFIXO}_{nome}_bucket{_rotulos_texto(rotulos, [('le', '+Inf')])} {quantidade}")
+            linhas.append(f"{PREFIXO}_{nome}_sum{_rotulos_texto(rotulos)} {soma:.6f}")
+            linhas.append(f"{PREFIXO}_{nome}_count{_rotulos_texto(rotulos)} {quantidade}")
+        linhas.append(f"# TYPE {PREFIXO}_{nome}_max gauge")
+        for rotulos, (_, _, _, maximo) in series:
+            linhas.append(f"{PREFIXO}_{nome}_max{_rotulos_texto(rotulos)} {maximo:.6f}")
+
+    ultimo = None
+    for (nome, rotulos), valor in sorted(contadores.items()):
+        if nome != ultimo:
+            linhas.append(f"# TYPE {PREFIXO}_{nome}_total counter")
+            ultimo = nome
+        linhas.append(f"{PREFIXO}_{nome}_total{_rotulos_texto(rotulos)} {valor}")
+
+    ultimo = None
+    for (nome, rotulos), valor in sorted(valores.items()):
+        if nome != ultimo:
+            linhas.append(f"# TYPE {PREFIXO}_{nome} gauge")
+            ultimo = nome
+        linhas.append(f"{PREFIXO}_{nome}{_rotulos_texto(rotulos)} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+def retirar():
+    """
+    Devolve e zera tudo o que este processo mediu. Usado pelos processos
+    dos pools: o resultado vai para o pai, que chama incorporar().
+    """
+    with _trava:
+        dados = ({k: (list(v.baldes), v.quantidade, v.soma, v.maximo) for k, v in _duracoes.items()},
+                 dict(_contadores), dict(_valores))
+        _duracoes.clear()
+        _contadores.clear()
+        _valores.clear()
+    return dados
+
+
+def incorporar(dados):
+    """Soma ao processo atual as métricas devolvidas por retirar() em outro processo."""
+    if not ATIVO or not dados:
+        return
+    duracoes, contadores, valores = dados
+    with _trava:
+        for chave, (baldes, quantidade, soma, maximo) in duracoes.items():
+            duracao = _duracoes.get(chave)
+            if duracao is None:
+                duracao = _duracoes[chave] = _Duracao()
+            duracao.baldes = [a + b for a, b in zip(duracao.baldes, baldes)]
+            duracao.quantidade += quantidade
+            duracao.soma += soma
+            duracao.maximo = max(duracao.maximo, maximo)
+        for chave, valor in contadores.items():
+            _contadores[chave] = _contadores.get(chave, 0) + valor
+        _valores.update(valores)
+
+
+def zerar():
+    with _trava:
+        _duracoes.clear()
+        _contadores.clear()
+        _valores.clear()
@@ -0,0 +1,322 @@
+"""
+Escrita segura com vários processos (ex.: app.py com vários workers).
+
+- trava(nome): trava exclusiva entre processos e threads (arquivo em travas/).
+- assumir_trava(nome): pega a trava sem esperar e fica com ela até o fim do
+  processo; elege um processo entre vários (ex.: quem roda o agendador).
+- gravar_atomico(caminho, escrever): escreve num temporário na mesma pasta
+  e troca pelo arquivo final de uma vez; quem lê vê o antigo ou o novo inteiro.
+- publicar_resultados(arquivos): congela uma cópia imutável de cada PNG/mapa
+  em publicados/ e troca o ponteiro resultados.json. Os workers servem o
+  que o ponteiro indica, todos a mesma versão, enquanto um pipeline escreve,
+  e avisam os seus clientes (SSE) quando a versão muda.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
+TRAVAS_PATH = os.path.join(base_path, "travas")
+PUBLICADOS_PATH = os.path.join(base_path, "publicados")
+RESULTADOS_PATH = os.path.join(base_path, "resultados.json")
+
+# Versões anteriores cujos arquivos continuam em disco (pedidos em andamento)
+MANTER_VERSOES = 3
+# No Windows o os.replace falha enquanto outro processo lê o arquivo
+TENTATIVAS_TROCA = 20
+
+
+#TRAVAS:
+
+if os.name == "nt":
+    def _travar(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK desiste depois de ~10 s; continua esperando
+                continue
+
+    def _destravar(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _tentar_travar(f):
+        f.seek(0)
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+else:
+    def _travar(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _tentar_travar(f):
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _destravar(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class _Trava:
+    __slots__ = ("caminho", "local", "profundidade", "arquivo")
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        # Threads do mesmo processo esperam aqui; reentrante na mesma thread
+        self.local = threading.RLock()
+        self.profundidade = 0
+        self.arquivo = None
+
+
+_travas = {}
+_travas_trava = threading.Lock()
+# Travas de assumir_trava: arquivos abertos até o fim do processo
+_assumidas = {}
+
+
+def _reiniciar_travas():
+    # Processo filho (fork) não herda as travas de threads que não existem nele
+    global _travas, _travas_trava, _assumidas
+    _travas = {}
+    _travas_trava = threading.Lock()
+    # Nem as assumidas pelo pai: fechando a cópia, a trava some junto com o pai
+    for arquivo in _assumidas.values():
+        arquivo.close()
+    _assumidas = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_travas)
+
+
+@contextmanager
+def trava(nome):
+    """Trava exclusiva `nome` entre processos (fcntl/msvcrt) e entre threads."""
+    with _travas_trava:
+        t = _travas.get(nome)
+        if t is None:
+            t = _travas[nome] = _Trava(os.path.join(TRAVAS_PATH, f"{nome}.lock"))
+    with t.local:
+        if t.profundidade == 0:
+            os.makedirs(TRAVAS_PATH, exist_ok=True)
+            arquivo = open(t.caminho, "a+b")
+            try:
+                _travar(arquivo)
+            except BaseException:
+                arquivo.close()
+                raise
+            t.arquivo = arquivo
+        t.profundidade += 1
+        try:
+            yield
+        finally:
+            t.profundidade -= 1
+            if t.profundidade == 0:
+                try:
+                    _destravar(t.arquivo)
+                finally:
+                    t.arquivo.close()
+                    t.arquivo = None
+
+
+def assumir_trava(nome):
+    """
+    Tenta pegar a trava `nome` sem esperar. Conseguindo, o processo fica
+    com ela até terminar (o sistema solta a trava quando ele morre, mesmo
+    sem aviso). True se a trava é deste processo.
+    """
+    with _travas_trava:
+        if nome in _assumidas:
+            return True
+        os.makedirs(TRAVAS_PATH, exist_ok=True)
+        arquivo = open(os.path.join(TRAVAS_PATH, f"{nome}.lock"), "a+b")
+        if not _tentar_travar(arquivo):
+            arquivo.close()
+            return False
+        _assumidas[nome] = arquivo
+        return True
+
+
+#GRAVAÇÃO ATÔMICA:
+
+def _trocar(temporario, caminho):
+    for tentativa in range(TENTATIVAS_TROCA):
+        try:
+            os.replace(temporario, caminho)
+            return
+        except PermissionError:
+            if tentativa == TENTATIVAS_TROCA - 1:
+                raise
+            time.sleep(0.05)
+
+
+def _criar_temporario(pasta, nome):
+    """
+    Temporário com nome aleatório ao lado do final. Criado com 0666 (menos
+    o umask, aplicado pelo sistema), não com o 0600 do mkstemp: o arquivo
+    final fica com a permissão padrão sem precisar ler o umask.
+    """
+    extensao = os.path.splitext(nome)[1]
+    while True:
+        temporario = os.path.join(pasta, f".{nome}.{os.urandom(6).hex()}{extensao}")
+        try:
+            descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                                0o666)
+        except FileExistsError:
+            continue
+        os.close(descritor)
+        return temporario
+
+
+def gravar_atomico(caminho, escrever):
+    """
+    escrever(caminho_temporario) grava o conteúdo; depois o temporário vai
+    para o disco (fsync) e substitui `caminho`. Se escrever falhar, o
+    arquivo antigo fica intacto. O temporário tem a mesma extensão do final
+    (np.savez, savefig e afins olham a extensão).
+    """
+    pasta, nome = os.path.split(caminho)
+    os.makedirs(pasta or ".", exist_ok=True)
+    temporario = _criar_temporario(pasta or ".", nome)
+    try:
+        escrever(temporario)
+        with open(temporario, "rb+") as f:
+            os.fsync(f.fileno())
+        _trocar(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return caminho
+
+
+def gravar_json(caminho, dados):
+    def escrever(temporario):
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, indent=1, sort_keys=True, ensure_ascii=False)
+    return gravar_atomico(caminho, escrever)
+
+
+#PONTEIRO DOS RESULTADOS:
+
+_ponteiro = (None, {})
+_ponteiro_trava = threading.Lock()
+
+
+def ler_resultados():
+    """
+    Conteúdo de resultados.json ({} se ainda não houver): versão, data e
+    nome -> arquivo publicado. Relido só quando o arquivo muda.
+    """
+    global _ponteiro
+    try:
+        estado = os.stat(RESULTADOS_PATH)
+    except FileNotFoundError:
+        return {}
+    chave = (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+    with _ponteiro_trava:
+        if _ponteiro[0] == chave:
+            return _ponteiro[1]
+    try:
+        with open(RESULTADOS_PATH, encoding="utf-8") as f:
+            resultados = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ERRO] resultados.json ilegível: {e}")
+        return {}
+    with _ponteiro_trava:
+        _ponteiro = (chave, resultados)
+    return resultados
+
+
+def _nome(caminho):
+    return os.path.relpath(caminho, base_path).replace(os.sep, "/")
+
+
+def arquivo_publicado(caminho):
+    """
+    Caminho da cópia publicada de `caminho` na versão atual; o próprio
+    `caminho` se ele ainda não foi publicado (ex.: antes do 1º pipeline).
+    """
+    publicado = ler_resultados().get("arquivos", {}).get(_nome(caminho))
+    if publicado:
+        publicado = os.path.join(PUBLICADOS_PATH, publicado)
+        if os.path.exists(publicado):
+            return publicado
+    return caminho
+
+
+def _congelar(caminho):
+    """Cópia imutável em publicados/, com o hash do conteúdo no nome."""
+    with open(caminho, "rb") as f:
+        conteudo = f.read()
+    base, extensao = os.path.splitext(os.path.basename(caminho))
+    publicado = f"{base}.{hashlib.blake2b(conteudo, digest_size=8).hexdigest()}{extensao}"
+    destino = os.path.join(PUBLICADOS_PATH, publicado)
+    if not os.path.exists(destino):
+        def escrever(temporario):
+            with open(temporario, "wb") as f:
+                f.write(conteudo)
+        gravar_atomico(destino, escrever)
+    return publicado
+
+
+def _limpar_publicados(resultados):
+    em_uso = set(resultados["arquivos"].values())
+    for anteriores in resultados.get("anteriores", []):
+        em_uso.update(anteriores)
+    if not os.path.isdir(PUBLICADOS_PATH):
+        return
+    for arquivo in os.listdir(PUBLICADOS_PATH):
+        if arquivo not in em_uso and not arquivo.startswith("."):
+            try:
+                os.remove(os.path.join(PUBLICADOS_PATH, arquivo))
+            except OSError:
+                pass
+
+
+def publicar_resultados(arquivos, evento=None, **detalhes):
+    """
+    Publica os arquivos (caminhos dentro da pasta de dados) como a versão
+    atual. Sem mudança no conteúdo nem nos dados (detalhes['dados']), a
+    versão fica a mesma. `evento` vai junto no ponteiro: é o que o
+    SeguidorResultados de cada worker manda aos painéis. Devolve o
+    conteúdo do ponteiro.
+    """
+    with trava("resultados"):
+        atual = ler_resultados()
+        publicados = dict(atual.get("arquivos", {}))
+        for caminho in arquivos:
+            if os.path.exists(caminho):
+                publicados[_nome(caminho)] = _congelar(caminho)
+        if atual and publicados == atual.get("arquivos") and detalhes.get("dados") == atual.get("dados"):
+            return atual
+
+        anteriores = ([sorted(set(atual["arquivos"].values()))] if atual else []) + atual.get("anteriores", [])
+        resultados = {
+            "versao": atual.get("versao", 0) + 1,
+            "data": datetime.now().isoformat(timespec="seconds"),
+            **detalhes,
+            "evento": evento,
+            "arquivos": publicados,
+            "anteriores": anteriores[:MANTER_VERSOES],
+        }
+        gravar_json(RESULTADOS_PATH, resultados)
+        _limpar_publicados(resultados)
+        return resultados
@@ -0,0 +1,287 @@
+"""
+Log das execuções (o que o pipeline imprime), no lugar do
+sys.stdout = open("saida_python.log", "w") que o dbscan fazia ao ser importado.
+
+    iniciar_registro()          # app.py / main.py, ao iniciar
+    marcar_execucao("pipeline") # começo de uma execução
+    ler_desde(posicao)          # só as linhas escritas depois da posição
+
+Cada linha ganha data/hora e o pid de quem escreveu. O arquivo gira ao
+passar de TAMANHO_MAXIMO (saida_python.log.1, .2, ...) e começa com um
+cabeçalho com a posição do seu primeiro byte: a posição não volta a zero
+ao girar e vale para todos os processos que escrevem no mesmo log.
+Uma posição que já foi para uma cópia girada é lida da cópia.
+As últimas linhas deste processo ficam também em memória (ultima_execucao).
+"""
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+
+from publicacao import trava, gravar_atomico
+
+
+base_path = os.environ.get("GEOEPI_DADOS", os.path.dirname(__file__))
+LOG_PATH = os.path.join(base_path, "saida_python.log")
+
+TAMANHO_MAXIMO = 5 * 1024 * 1024
+COPIAS = 3
+# Linhas guardadas em memória (a última execução)
+LINHAS_MEMORIA = 5000
+# Máximo de bytes devolvidos por leitura (?since=)
+LIMITE_LEITURA = 256 * 1024
+# Sem execução em memória: quanto do fim do arquivo mostrar
+TAMANHO_CAUDA = 64 * 1024
+
+CABECALHO = "# inicio={:020d}\n"
+TAMANHO_CABECALHO = len(CABECALHO.format(0))
+
+_saida = None
+
+
+def _ler_base(f):
+    """Posição do primeiro byte do arquivo (None se não tem o cabeçalho)."""
+    f.seek(0)
+    cabecalho = f.read(TAMANHO_CABECALHO)
+    if len(cabecalho) != TAMANHO_CABECALHO or not cabecalho.startswith(b"# inicio="):
+        return None
+    try:
+        return int(cabecalho[len("# inicio="):-1])
+    except ValueError:
+        return None
+
+
+def _criar_arquivo(caminho, base):
+    def escrever(temporario):
+        with open(temporario, "wb") as f:
+            f.write(CABECALHO.format(base).encode("ascii"))
+    gravar_atomico(caminho, escrever)
+
+
+class SaidaRegistro:
+    """Substitui o sys.stdout: grava linhas completas no log e na memória."""
+
+    encoding = "utf-8"
+
+    def __init__(self, caminho=LOG_PATH, tamanho_maximo=TAMANHO_MAXIMO, copias=COPIAS):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.copias = copias
+        self.recentes = deque(maxlen=LINHAS_MEMORIA)
+        self.inicio_execucao = None
+        self.posicao = None
+        self._pendente = ""
+        self._trava = threading.RLock()
+        self._fd = None
+        self._inode = None
+        self._base = 0
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return False
+
+    def flush(self):
+        pass
+
+    def write(self, texto):
+        with self._trava:
+            self._pendente += texto
+            if "\n" in self._pendente:
+                completo, _, self._pendente = self._pendente.rpartition("\n")
+                self._gravar(completo.split("\n"))
+        return len(texto)
+
+    def marcar(self, nome):
+        with self._trava:
+            self.write(f"=== {nome} ===\n")
+            self.inicio_execucao = self.recentes[-1][0]
+
+    def _abrir(self):
+        with trava("registro"):
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            base = None
+            if os.path.exists(self.caminho):
+                with open(self.caminho, "rb") as f:
+                    base = _ler_base(f)
+                if base is None:
+                    # Log do formato antigo (sem cabeçalho): vai para a cópia .1
+                    os.replace(self.caminho, self.caminho + ".1")
+            if base is None:
+                base = 0
+                _criar_arquivo(self.caminho, base)
+            self._fd = os.open(self.caminho, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+            self._inode = os.fstat(self._fd).st_ino
+            self._base = base
+
+    def _girar(self):
+        with trava("registro"):
+            try:
+                if os.stat(self.caminho).st_ino != self._inode:
+                    return  # outro processo já girou
+                # Tamanho real: outros processos podem ter escrito depois deste
+                tamanho = os.fstat(self._fd).st_size
+                os.close(self._fd)
+                self._fd = None
+                for i in range(self.copias - 1, 0, -1):
+                    if os.path.exists(f"{self.caminho}.{i}"):
+                        os.replace(f"{self.caminho}.{i}", f"{self.caminho}.{i + 1}")
+                os.replace(self.caminho, self.caminho + ".1")
+                _criar_arquivo(self.caminho, self._base + tamanho - TAMANHO_CABECALHO)
+            except OSError:
+                # Sem girar desta vez (ex.: Windows com o arquivo aberto); tenta na próxima
+                pass
+            finally:
+                self._abrir()
+
+    def _gravar(self, linhas):
+        prefixo = f"{datetime.now():%Y-%m-%d %H:%M:%S} [{os.getpid()}] "
+        codificadas = [(prefixo + linha + "\n").encode("utf-8", errors="replace") for linha in linhas]
+        # Com a trava, nenhum processo escreve no arquivo que outro está girando
+        with trava("registro"):
+            try:
+                atual = os.stat(self.caminho).st_ino
+            except FileNotFoundError:
+                atual = None
+            if self._fd is None or atual != self._inode:
+                self._abrir()
+            bloco = b"".join(codificadas)
+            os.write(self._fd, bloco)
+            fim = os.lseek(self._fd, 0, os.SEEK_CUR)
+            posicao = self._base + fim - TAMANHO_CABECALHO - len(bloco)
+            if fim > self.tamanho_maximo:
+                self._girar()
+        for linha, codificada in zip(linhas, codificadas):
+            self.recentes.append((posicao, prefixo + linha))
+            posicao += len(codificada)
+        self.posicao = posicao
+
+
+def _reiniciar_no_filho():
+    # Processo filho (fork): trava nova e descritor próprio (a posição do
+    # descritor herdado é compartilhada com o pai)
+    if _saida is not None:
+        _saida._trava = threading.RLock()
+        _saida._fd = None
+        _saida._inode = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def iniciar_registro(caminho=LOG_PATH):
+    """Manda o stdout deste processo para o log. Chamar uma vez, ao iniciar."""
+    global _saida
+    if _saida is None:
+        _saida = SaidaRegistro(caminho)
+        sys.stdout = _saida
+    return _saida
+
+
+def caminho_registro():
+    """Caminho do log se o stdout deste processo foi para ele (None se não)."""
+    return _saida.caminho if _saida is not None else None
+
+
+def marcar_execucao(nome):
+    """Linha de início de execução; ultima_execucao() mostra a partir dela."""
+    if _saida is not None:
+        _saida.marcar(nome)
+
+
+def posicao_atual(caminho=LOG_PATH):
+    """Posição do fim do log (o próximo byte a ser escrito)."""
+    try:
+        with open(caminho, "rb") as f:
+            base = _ler_base(f)
+            f.seek(0, 2)
+            return 0 if base is None else base + f.tell() - TAMANHO_CABECALHO
+    except FileNotFoundError:
+        return 0
+
+
+def _abrir_trecho(posicao, caminho):
+    """
+    Arquivo do log (atual ou cópia girada) onde está `posicao`, já aberto, e
+    a base dele. Vai pelo cabeçalho de cada um, não pelo nome: se o log girar
+    no meio da busca, as cópias só mudam de nome. Se a posição já saiu de
+    todas as cópias, o mais antigo.
+    """
+    mais_antigo = None
+    i = 0
+    while True:
+        nome = caminho if i == 0 else f"{caminho}.{i}"
+        i += 1
+        try:
+            f = open(nome, "rb")
+        except FileNotFoundError:
+            if i == 1:
+                continue  # atual recém-girado; as cópias ainda servem
+            break
+        base = _ler_base(f)
+        if base is None:
+            f.close()
+            continue
+        if posicao >= base:
+            if mais_antigo is not None:
+                mais_antigo[0].close()
+            return f, base
+        if mais_antigo is not None:
+            mais_antigo[0].close()
+        mais_antigo = (f, base)
+    return mais_antigo if mais_antigo is not None else (None, None)
+
+
+def ler_desde(posicao, limite=LIMITE_LEITURA, caminho=LOG_PATH):
+    """
+    Linhas completas escritas a partir de `posicao` (no máximo `limite`
+    bytes). Se a posição ficou numa cópia girada (.1, .2, ...), lê dela até
+    o fim; a próxima leitura segue no arquivo seguinte. Devolve (linhas,
+    próxima posição, truncado); truncado indica que parte do pedido já
+    saiu de todas as cópias.
+    """
+    f, base = _abrir_trecho(posicao, caminho)
+    if f is None:
+        return [], posicao, False
+    with f:
+        f.seek(0, 2)
+        fim = base + f.tell() - TAMANHO_CABECALHO
+        truncado = posicao < base
+        inicio = min(max(posicao, base), fim)
+        f.seek(TAMANHO_CABECALHO + inicio - base)
+        bloco = f.read(min(limite, fim - inicio))
+    corte = bloco.rfind(b"\n") + 1
+    if corte:
+        bloco = bloco[:corte]
+    elif len(bloco) < limite:
+        # Linha ainda incompleta: fica para a próxima leitura
+        bloco = b""
+    return bloco.decode("utf-8", errors="replace").splitlines(), inicio + len(bloco), truncado
+
+
+def ultima_execucao(caminho=LOG_PATH):
+    """
+    (texto, posição) da última execução marcada neste processo, da memória.
+    Sem ela (ex.: a execução foi em outro worker), o fim do arquivo.
+    """
+    if _saida is not None and _saida.inicio_execucao is not None:
+        with _saida._trava:
+            linhas = [linha for posicao, linha in _saida.recentes if posicao >= _saida.inicio_execucao]
+            posicao = _saida.posicao
+        if linhas:
+            return "\n".join(linhas) + "\n", posicao
+    fim = posicao_atual(caminho)
+    linhas, posicao, truncado = ler_desde(max(0, fim - TAMANHO_CAUDA), caminho=caminho)
+    # A cauda pode começar numa cópia girada: segue até o arquivo atual
+    novas = linhas
+    while novas and posicao < fim:
+        novas, posicao, _ = ler_desde(posicao, caminho=caminho)
+        linhas += novas
+    if fim > TAMANHO_CAUDA and not truncado and linhas:
+        linhas = linhas[1:]  # a primeira pode ter começado antes do trecho lido
+    return "".join(linha + "\n" for linha in linhas), posicao
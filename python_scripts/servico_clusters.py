@@ -0,0 +1,238 @@
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date
+
+from coleta_dados_google import baixar_e_formatar_csv
+from gerar_imagens import gerar_grafico_tempo, impressoes_graficos, arquivos_resultados
+from dbscan import IndiceTemporal, CacheJanelas
+from dbscan_online import ClusterizacaoOnline
+from armazenamento_casos import assinatura
+from api_clusters import resumo_por_doenca, delta_resultados, ler_clusters, CLUSTERS_PATH
+from metricas import execucao, contar, etapa
+from publicacao import trava, publicar_resultados, ler_resultados, arquivo_publicado
+from registro import marcar_execucao
+from main import carregar_dados, etapa_geral, etapa_data, desenhar_geral, resumir_clusters, texto_saida
+
+
+# Quantas datas de consulta ficam guardadas por versão dos dados
+LIMITE_DATAS = 32
+# Casos novos aplicados um a um (DBSCAN online); acima disso, lote de novo
+LIMITE_CASOS_ONLINE = 2000
+
+
+class MotorClusterizacao:
+    """
+    Mantém o pipeline do main.py vivo dentro do processo do Flask: os casos
+    carregados, os últimos resultados e os gráficos/mapas já gerados.
+    - Só recarrega os casos quando o banco muda.
+    - Pedidos iguais ao mesmo tempo esperam a mesma execução.
+    - Sem mudança nos dados, devolve o resultado guardado.
+    - Casos só acrescentados entram nos clusters gerais pelo DBSCAN online,
+      sem reclusterizar tudo.
+    """
+
+    def __init__(self):
+        self._estado = threading.Lock()
+        self._em_andamento = {}
+        self._assinatura = None
+        self._df = None
+        self._indice = None
+        # Sobrevive às recargas dos casos: cada janela se invalida sozinha
+        self.cache_janelas = CacheJanelas()
+        self.versao = 0
+        self._geral = None
+        # ClusterizacaoOnline dos clusters gerais e casos ainda não aplicados
+        self._online = None
+        self._novos = None
+        self._por_data = {}
+        self._data_renderizada = None
+        # (versão dos dados, clusters gerais) do último pipeline, para a API.
+        # A versão vem da assinatura do banco: não muda ao reiniciar o servidor.
+        self._publicado = None
+        # (arquivo, (versão, clusters)) lido da tabela publicada por outro processo
+        self._lido = None
+        self._resumo = None
+
+    def _dados_atuais(self):
+        """Recarrega os casos se o banco mudou e invalida os resultados antigos."""
+        atual = assinatura()
+        if self._df is None or atual != self._assinatura:
+            anterior = self._assinatura
+            self._df = carregar_dados()
+            self._indice = IndiceTemporal(self._df)
+            self._assinatura = atual
+            self.versao += 1
+            # Mesma geração: só entraram casos com id maior que o último visto
+            self._novos = None
+            if self._geral is not None and anterior is not None and anterior[0] == atual[0]:
+                novos = self._df[self._df["id"] > anterior[1]]
+                if len(novos) <= LIMITE_CASOS_ONLINE:
+                    self._novos = novos
+            if self._novos is None:
+                self._geral = None
+                self._online = None
+            self._por_data = {}
+            self._data_renderizada = None
+        return self._df
+
+    def sincronizar_planilha(self):
+        """Baixa a planilha sem disputar o banco com um pipeline em andamento."""
+        with trava("pipeline"):
+            return baixar_e_formatar_csv()
+
+    def dados_mudaram(self):
+        """True se os casos no banco não são os que estão carregados."""
+        return assinatura() != self._assinatura
+
+    def executar(self, data_ref=None, baixar_planilha=False):
+        """
+        Roda (ou reaproveita) o pipeline para data_ref (padrão: hoje) e
+        devolve {"saida": texto, "resultado": resumo estruturado}.
+        """
+        if baixar_planilha:
+            self.sincronizar_planilha()
+        data_ref = data_ref or date.today().strftime("%Y-%m-%d")
+
+        with self._estado:
+            futuro = self._em_andamento.get(data_ref)
+            dono = futuro is None
+            if dono:
+                futuro = Future()
+                self._em_andamento[data_ref] = futuro
+        if not dono:
+            return futuro.result()
+
+        try:
+            with execucao("pipeline", data_ref=data_ref):
+                resposta = self._calcular(data_ref)
+            contar("pipeline_execucoes", reaproveitado=str(resposta["resultado"]["reaproveitado"]).lower())
+            futuro.set_result(resposta)
+            return resposta
+        except Exception as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._estado:
+                del self._em_andamento[data_ref]
+
+    def clusters_gerais(self):
+        """
+        (versão, DataFrame dos clusters gerais) da versão publicada, ou None
+        se nenhum pipeline publicou ainda. Não roda o pipeline (isso fica
+        com o executor): em outro worker, lê a tabela publicada.
+        """
+        publicado = self._publicado
+        versao = ler_resultados().get("dados")
+        if versao is None or (publicado is not None and publicado[0] == versao):
+            return publicado
+        arquivo = arquivo_publicado(CLUSTERS_PATH)
+        if arquivo == CLUSTERS_PATH:
+            # Versão publicada sem a tabela (ainda): fica o que houver aqui
+            return publicado
+        lido = self._lido
+        if lido is None or lido[0] != arquivo:
+            lido = (arquivo, (versao, ler_clusters(arquivo)))
+            self._lido = lido
+        return lido[1]
+
+    def resumo_clusters(self):
+        """(versão, resumo por doença) dos clusters gerais, calculado uma vez por versão (None sem resultado)."""
+        atual = self.clusters_gerais()
+        if atual is None:
+            return None
+        versao, df_geral = atual
+        resumo = self._resumo
+        if resumo is None or resumo[0] != versao:
+            resumo = (versao, resumo_por_doenca(df_geral))
+            self._resumo = resumo
+        return resumo
+
+    def _calcular(self, data_ref):
+        # Um pipeline por vez, também entre processos (vários workers do
+        # app.py): as etapas sobrescrevem os mesmos PNG/HTML e matrizes
+        with trava("pipeline"):
+            inicio = time.perf_counter()
+            graficos_antes = impressoes_graficos()
+            publicado_antes = self._publicado
+            df = self._dados_atuais()
+            reaproveitado = True
+            publicar = False
+            if self._geral is None or data_ref not in self._por_data:
+                marcar_execucao(f"pipeline {data_ref} (dados {'.'.join(map(str, self._assinatura))})")
+
+            if self._geral is None:
+                self._geral = etapa_geral(df)
+                reaproveitado = False
+            elif self._novos is not None:
+                if len(self._novos):
+                    self._geral = self._aplicar_novos(self._novos)
+                    reaproveitado = False
+                self._novos = None
+            df_geral = self._geral
+            self._publicado = (".".join(map(str, self._assinatura)), df_geral)
+
+            if data_ref not in self._por_data:
+                if len(self._por_data) >= LIMITE_DATAS:
+                    self._por_data.pop(next(iter(self._por_data)))
+                self._por_data[data_ref] = etapa_data(df, data_ref, self._indice, self.cache_janelas)
+                self._data_renderizada = data_ref
+                reaproveitado = False
+            df_data = self._por_data[data_ref]
+            if self._data_renderizada != data_ref:
+                # Resultado guardado, mas os PNGs em disco são de outra data
+                if not df_data.empty:
+                    gerar_grafico_tempo(df_data, data_ref=data_ref)
+                self._data_renderizada = data_ref
+                publicar = True
+            if publicar or not reaproveitado:
+                # O evento vai no ponteiro: todos os workers avisam os seus clientes
+                evento = None if reaproveitado else self._evento(publicado_antes, graficos_antes, data_ref)
+                publicar_resultados(arquivos_resultados(), evento=evento,
+                                    dados=self._publicado[0], data_ref=data_ref)
+
+            resultado = {
+                "versao": self.versao,
+                "data_ref": data_ref,
+                "reaproveitado": reaproveitado,
+                "duracao_s": round(time.perf_counter() - inicio, 4),
+                "geral": resumir_clusters(df_geral),
+                "data": resumir_clusters(df_data),
+            }
+            return {"saida": texto_saida(df_geral, data_ref, df_data), "resultado": resultado}
+
+    def _aplicar_novos(self, novos):
+        """Acrescenta os casos novos aos clusters gerais (IDs dos clusters antigos mantidos)."""
+        if self._online is None:
+            # Uma vez por geração: vizinhanças do resultado em lote atual
+            with etapa("online_inicio"):
+                self._online = ClusterizacaoOnline()
+                self._online.iniciar_de_lote(self._geral)
+        with etapa("clusterizacao_online"):
+            for linha in novos.to_dict("records"):
+                self._online.adicionar_caso(linha)
+            df_geral = self._online.resultado()
+        contar("casos_online", len(novos))
+        desenhar_geral(df_geral)
+        return df_geral
+
+    def _evento(self, publicado_antes, graficos_antes, data_ref):
+        """Evento leve para os painéis: versão nova e só o que mudou (None se nada mudou)."""
+        versao, df_geral = self._publicado
+        graficos_depois = impressoes_graficos()
+        graficos = sorted(arquivo[:-len(".png")] for arquivo, impressao in graficos_depois.items()
+                          if graficos_antes.get(arquivo) != impressao)
+        mesma_versao = publicado_antes is not None and publicado_antes[0] == versao
+        if mesma_versao and not graficos:
+            return None
+        delta = ({"completo": False, "novos_casos": 0, "casos": [],
+                  "clusters_alterados": [], "clusters_removidos": 0}
+                 if mesma_versao else
+                 delta_resultados(publicado_antes[1] if publicado_antes else None, df_geral))
+        return {
+            "versao": versao,
+            "execucao": self.versao,
+            "data_ref": data_ref,
+            "graficos": graficos,
+            **delta,
+        }
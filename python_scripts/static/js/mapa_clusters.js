@@ -0,0 +1,85 @@
+// Mapas gerados pelo folium (mapa_clusters*.html). O HTML traz os casos
+// de cada camada (para abrir o arquivo sem o site); aqui eles são trocados
+// pelos casos da área visível em /api/clusters/pontos, agregados numa
+// grade que depende do zoom, no lugar (sem recarregar a página). Sem
+// resposta da API, ficam os pontos do arquivo. Camada de ruído só existe
+// para doenças com ruído.
+//
+//   iniciarMapaClusters(mapa, {
+//     camadas: { Dengue: { cluster: grupo, ruido: grupo }, ... },
+//     cores: { Dengue: "orange", ... },
+//     validos: false,
+//   });
+
+function iniciarMapaClusters(mapa, opcoes) {
+  let pedido = null;
+
+  // Texto montado com textContent: nome da doença não vira HTML
+  function popup(celula) {
+    const div = document.createElement("div");
+    const titulo = document.createElement("b");
+    titulo.textContent = celula.doenca;
+    div.appendChild(titulo);
+    div.appendChild(document.createElement("br"));
+    let texto;
+    if (celula.tipo === "ruido") texto = "Ruído";
+    else if (celula.cluster !== null) texto = "Cluster " + celula.cluster;
+    else texto = celula.clusters + " clusters";
+    if (celula.casos > 1) texto += " (" + celula.casos + " casos)";
+    div.appendChild(document.createTextNode(texto));
+    return div;
+  }
+
+  function circulo(celula) {
+    const cor = opcoes.cores[celula.doenca] || "gray";
+    const estilo = celula.tipo === "ruido"
+      ? { color: "black", fillColor: "gray", fillOpacity: 0.35 }
+      : { color: cor, fillColor: cor, fillOpacity: 0.45 };
+    // Um caso: o círculo de 700 m de sempre; vários: marcador que cresce com o total
+    if (celula.casos === 1) return L.circle([celula.lat, celula.lon], { radius: 700, ...estilo });
+    const raio = Math.min(24, 6 + 2 * Math.sqrt(celula.casos));
+    return L.circleMarker([celula.lat, celula.lon], { radius: raio, ...estilo });
+  }
+
+  function desenhar(celulas) {
+    Object.values(opcoes.camadas).forEach((tipos) => {
+      Object.values(tipos).forEach((grupo) => grupo.clearLayers());
+    });
+    celulas.forEach((celula) => {
+      const grupo = (opcoes.camadas[celula.doenca] || {})[celula.tipo];
+      if (grupo) circulo(celula).bindPopup(popup(celula)).addTo(grupo);
+    });
+  }
+
+  async function buscar() {
+    const area = mapa.getBounds();
+    const bbox = [
+      Math.max(area.getWest(), -180), Math.max(area.getSouth(), -90),
+      Math.min(area.getEast(), 180), Math.min(area.getNorth(), 90),
+    ];
+    const params = new URLSearchParams({ bbox: bbox.map((v) => v.toFixed(5)).join(","), zoom: mapa.getZoom() });
+    if (opcoes.validos) params.set("validos", "1");
+    // Só vale a resposta do último movimento
+    if (pedido) pedido.abort();
+    pedido = new AbortController();
+    try {
+      const resp = await fetch("/api/clusters/pontos?" + params, { signal: pedido.signal });
+      if (resp.ok) desenhar((await resp.json()).celulas);
+    } catch (e) {
+      if (e.name !== "AbortError") console.error(e);
+    }
+  }
+
+  mapa.on("moveend", buscar);
+
+  // Avisos do servidor (SSE): busca de novo só quando os casos ou clusters mudaram
+  const eventos = new EventSource("/eventos");
+  eventos.addEventListener("resultado", (e) => {
+    const evento = JSON.parse(e.data);
+    if (evento.completo || evento.novos_casos || evento.clusters_alterados.length || evento.clusters_removidos) {
+      buscar();
+    }
+  });
+
+  buscar();
+}
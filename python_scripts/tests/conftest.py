@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Antes de importar o projeto: os caminhos são lidos na importação
+PASTA_TESTES = tempfile.mkdtemp(prefix="geoepi_testes_")
+os.environ["GEOEPI_DADOS"] = PASTA_TESTES
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(PASTA_TESTES, ignore_errors=True)
+
+
+# Três focos em Joinville; os casos se espalham ~1 km em volta de cada um
+CENTROS = np.array([[-26.30, -48.85], [-26.25, -48.80], [-26.32, -48.90]])
+
+
+def gerar_casos(n, semente=0, doencas=("Dengue", "COVID", "Zika"), dias=90):
+    """
+    Casos sintéticos com clusters, ruído e bordas. Um em cada dez repete
+    o lugar e a data de outro caso (pontos com peso no DBSCAN).
+    """
+    rng = np.random.default_rng(semente)
+    foco = rng.integers(0, len(CENTROS), n)
+    lats = (CENTROS[foco, 0] + rng.normal(0, 0.01, n)).round(6)
+    lons = (CENTROS[foco, 1] + rng.normal(0, 0.01, n)).round(6)
+    deslocamento = rng.integers(0, dias, n)
+    doenca = rng.choice(list(doencas), n)
+    copias = rng.choice(n, n // 10, replace=False)
+    originais = rng.choice(n, n // 10)
+    lats[copias] = lats[originais]
+    lons[copias] = lons[originais]
+    deslocamento[copias] = deslocamento[originais]
+    doenca[copias] = doenca[originais]
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "nome": [f"Caso {i}" for i in range(n)],
+        "idade": rng.integers(0, 95, n),
+        "genero": rng.choice(["Masculino", "Feminino"], n),
+        "peso": rng.normal(70, 15, n).round(1),
+        "altura": rng.normal(1.70, 0.1, n).round(2),
+        "local_lat": lats,
+        "local_lon": lons,
+        "bairro": "Centro de Joinville",
+        "data": pd.Timestamp("2025-01-01") + pd.to_timedelta(deslocamento, unit="D"),
+        "diagnostico": doenca,
+    })
+
+
+@pytest.fixture
+def casos():
+    return gerar_casos(900)
+
+
+@pytest.fixture
+def gerador_casos():
+    return gerar_casos
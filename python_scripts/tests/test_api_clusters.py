@@ -0,0 +1,123 @@
+import pytest
+
+import app as aplicacao
+import publicacao
+import servico_clusters
+from api_clusters import TAMANHO_CELULA_PX, agregar_pontos, gravar_clusters, resumo_por_doenca
+from dbscan import detectar_clusters
+from publicacao import publicar_resultados
+from servico_clusters import MotorClusterizacao
+
+BBOX_JOINVILLE = (-49.0, -26.45, -48.7, -26.15)
+
+
+@pytest.fixture
+def geral(casos):
+    return detectar_clusters(casos, modo="esparso")
+
+
+class _Motor:
+    """Motor que só devolve o que já foi publicado (None: nada ainda)."""
+
+    def __init__(self):
+        self.atual = None
+
+    def clusters_gerais(self):
+        return self.atual
+
+    def resumo_clusters(self):
+        if self.atual is None:
+            return None
+        return self.atual[0], resumo_por_doenca(self.atual[1])
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    # Sem log, banco, QR Code nem threads: só as rotas
+    monkeypatch.setattr(aplicacao, "_servicos_iniciados", True)
+    motor = _Motor()
+    monkeypatch.setattr(aplicacao, "motor", motor)
+    cliente = aplicacao.app.test_client()
+    cliente.motor = motor
+    return cliente
+
+
+def _chaves(celulas):
+    return {(c["doenca"], c["tipo"], c["lat"], c["lon"], c["casos"]) for c in celulas}
+
+
+def test_grade_nao_muda_ao_arrastar(geral):
+    zoom = 13
+    tamanho = TAMANHO_CELULA_PX * 360.0 / (256 * 2 ** zoom)
+    oeste, sul, leste, norte = BBOX_JOINVILLE
+    antes = agregar_pontos(geral, BBOX_JOINVILLE, zoom)
+    # Menos de uma célula para o lado: as células longe das bordas não mudam
+    deslocado = agregar_pontos(geral, (oeste + tamanho / 3, sul + tamanho / 3,
+                                       leste + tamanho / 3, norte + tamanho / 3), zoom)
+    interno = (oeste + 2 * tamanho, sul + 2 * tamanho, leste - 2 * tamanho, norte - 2 * tamanho)
+
+    def dentro(celulas):
+        return {c for c in _chaves(celulas)
+                if interno[0] <= c[3] <= interno[2] and interno[1] <= c[2] <= interno[3]}
+    assert dentro(antes) and dentro(antes) == dentro(deslocado)
+
+
+def test_zoom_agrega_casos(geral):
+    total = len(geral)
+    perto = agregar_pontos(geral, BBOX_JOINVILLE, 22)
+    longe = agregar_pontos(geral, BBOX_JOINVILLE, 4)
+    assert sum(c["casos"] for c in perto) == sum(c["casos"] for c in longe) == total
+    assert len(longe) < len(perto)
+    # Longe (células de ~5,6°), cada doença vira uma bolha de clusters e uma de ruído
+    assert len(longe) == len(geral.groupby(["diagnostico", geral["cluster"] == -1]))
+    validos = agregar_pontos(geral, BBOX_JOINVILLE, 4, doenca="Dengue", apenas_validos=True)
+    assert {c["tipo"] for c in validos} == {"cluster"}
+    assert sum(c["casos"] for c in validos) == ((geral["diagnostico"] == "Dengue") & (geral["cluster"] != -1)).sum()
+
+
+def test_sem_resultado_responde_503(cliente):
+    for rota in ("/api/clusters", "/api/clusters/pontos?zoom=12"):
+        resposta = cliente.get(rota)
+        assert resposta.status_code == 503 and resposta.headers["Retry-After"]
+
+
+def test_etag_e_304(cliente, geral):
+    cliente.motor.atual = ("0.900.900", geral)
+    rota = "/api/clusters/pontos?bbox=" + ",".join(map(str, BBOX_JOINVILLE)) + "&zoom=12"
+    resposta = cliente.get(rota)
+    assert resposta.status_code == 200
+    assert sum(c["casos"] for c in resposta.get_json()["celulas"]) == len(geral)
+    etag = resposta.headers["ETag"]
+
+    assert cliente.get(rota, headers={"If-None-Match": etag}).status_code == 304
+    # Outra consulta ou outra versão: outro ETag
+    assert cliente.get(rota + "&validos=1", headers={"If-None-Match": etag}).status_code == 200
+    cliente.motor.atual = ("0.901.901", geral)
+    assert cliente.get(rota, headers={"If-None-Match": etag}).status_code == 200
+
+    resumo = cliente.get("/api/clusters").get_json()
+    assert resumo["versao"] == "0.901.901"
+    assert sorted(resumo["doencas"]) == sorted(geral["diagnostico"].unique())
+    assert cliente.get("/api/clusters/pontos?bbox=1,2").status_code == 400
+
+
+def test_outro_worker_le_a_tabela_publicada(tmp_path, monkeypatch, geral):
+    monkeypatch.setattr(publicacao, "base_path", str(tmp_path))
+    monkeypatch.setattr(publicacao, "RESULTADOS_PATH", str(tmp_path / "resultados.json"))
+    monkeypatch.setattr(publicacao, "PUBLICADOS_PATH", str(tmp_path / "publicados"))
+    tabela = str(tmp_path / "clusters_gerais.npz")
+    monkeypatch.setattr(servico_clusters, "CLUSTERS_PATH", tabela)
+
+    # Worker que não rodou o pipeline: nada publicado, nada calculado aqui
+    motor = MotorClusterizacao()
+    assert motor.clusters_gerais() is None and motor.resumo_clusters() is None
+
+    gravar_clusters(geral, tabela)
+    publicar_resultados([tabela], dados="0.900.900")
+    versao, lido = motor.clusters_gerais()
+    assert versao == "0.900.900" and motor._df is None
+    assert lido["id"].tolist() == geral["id"].tolist()
+    assert lido["cluster"].tolist() == geral["cluster"].tolist()
+    assert lido["diagnostico"].tolist() == geral["diagnostico"].tolist()
+    assert (lido["data"] == geral["data"].reset_index(drop=True)).all()
+    assert motor.clusters_gerais()[1] is lido
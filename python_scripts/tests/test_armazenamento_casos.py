@@ -0,0 +1,111 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import armazenamento_casos as armazenamento
+from armazenamento_casos import COLUNAS, carregar_casos, inserir_casos
+
+
+@pytest.fixture
+def banco(tmp_path):
+    return str(tmp_path / "casos.db")
+
+
+def _linhas(casos):
+    df = casos[COLUNAS].copy()
+    df["data"] = df["data"].dt.strftime("%Y-%m-%d")
+    return df.values.tolist()
+
+
+def test_ida_e_volta_mantem_valores_e_tipos(casos, banco):
+    assert inserir_casos(_linhas(casos), caminho=banco) == len(casos)
+    lidos = carregar_casos(caminho=banco)
+    assert lidos["id"].tolist() == list(range(1, len(casos) + 1))
+    assert pd.api.types.is_datetime64_any_dtype(lidos["data"])
+    pd.testing.assert_frame_equal(lidos[COLUNAS], casos[COLUNAS], check_dtype=False)
+
+
+def test_dicts_e_valores_invalidos(banco):
+    inserir_casos([{"nome": "Ana", "idade": "41", "genero": "Feminino", "peso": "x", "altura": 1.6,
+                    "local_lat": -26.3, "local_lon": -48.8, "bairro": "Centro de Joinville",
+                    "data": "2025-03-01", "diagnostico": "Dengue"},
+                   {"nome": "Bia", "data": "não é data", "diagnostico": "Zika"}], caminho=banco)
+    lidos = carregar_casos(caminho=banco)
+    assert lidos["idade"].tolist()[0] == 41
+    assert pd.isna(lidos["peso"][0])
+    assert pd.isna(lidos["data"][1]) and pd.isna(lidos["local_lat"][1])
+
+
+def test_filtros_por_data_e_doenca(casos, banco):
+    inserir_casos(_linhas(casos), caminho=banco)
+    lidos = carregar_casos(inicio="2025-02-01", fim="2025-02-10", doenca="Zika", caminho=banco)
+    esperado = casos[(casos["diagnostico"] == "Zika") & (casos["data"] >= "2025-02-01")
+                     & (casos["data"] <= "2025-02-10")]
+    assert lidos["id"].tolist() == esperado["id"].tolist()
+
+
+def test_retrato_recebe_as_linhas_novas(casos, banco):
+    inserir_casos(_linhas(casos.iloc[:600]), caminho=banco)
+    carregar_casos(caminho=banco)
+    # Linhas que chegam depois do retrato vêm do banco
+    inserir_casos(_linhas(casos.iloc[600:]), caminho=banco)
+    lidos = carregar_casos(caminho=banco)
+    pd.testing.assert_frame_equal(lidos[COLUNAS], casos[COLUNAS], check_dtype=False)
+
+
+def test_retrato_sem_pickle(casos, banco):
+    inserir_casos(_linhas(casos) + [{"nome": None, "diagnostico": "Zika", "data": "2025-03-01"}], caminho=banco)
+    do_banco = carregar_casos(caminho=banco)
+    arquivo = armazenamento.caminho_retrato(banco)
+    with np.load(arquivo, allow_pickle=False) as dados:
+        assert all(dados[chave].dtype != object for chave in dados.files)
+    # Segunda leitura vem do retrato
+    pd.testing.assert_frame_equal(carregar_casos(caminho=banco), do_banco)
+
+    # Retrato estragado: relê do banco e grava de novo
+    with open(arquivo, "wb") as f:
+        f.write(b"estragado")
+    pd.testing.assert_frame_equal(carregar_casos(caminho=banco), do_banco)
+    with np.load(arquivo, allow_pickle=False) as dados:
+        assert len(dados["id"]) == len(casos) + 1
+
+
+def test_exportar_e_importar_csv(casos, banco, tmp_path):
+    inserir_casos(_linhas(casos), caminho=banco)
+    arquivo = str(tmp_path / "casos.csv")
+    assert armazenamento.exportar_csv(arquivo, caminho=banco) == len(casos)
+    outro = str(tmp_path / "outro.db")
+    assert armazenamento.importar_csv(arquivo, caminho=outro) == len(casos)
+    pd.testing.assert_frame_equal(carregar_casos(caminho=outro), carregar_casos(caminho=banco))
+
+
+def test_assinatura_muda_com_insercao_e_importacao(casos, banco, tmp_path):
+    inserir_casos(_linhas(casos.iloc[:10]), caminho=banco)
+    antes = armazenamento.assinatura(banco)
+    assert antes[1:] == (10, 10)
+    inserir_casos(_linhas(casos.iloc[10:15]), caminho=banco)
+    depois = armazenamento.assinatura(banco)
+    assert depois == (antes[0], 15, 15)
+
+    arquivo = str(tmp_path / "casos.csv")
+    armazenamento.exportar_csv(arquivo, caminho=banco)
+    armazenamento.importar_csv(arquivo, caminho=banco)
+    importado = armazenamento.assinatura(banco)
+    assert importado[0] == antes[0] + 1
+    assert importado[2] == 15
+    assert armazenamento.contar_casos(banco) == 15
+
+
+def test_banco_antigo_sem_contagem_em_meta(casos, banco):
+    inserir_casos(_linhas(casos.iloc[:20]), caminho=banco)
+    # Banco de antes da contagem em meta, aberto por um processo novo
+    con = sqlite3.connect(banco)
+    with con:
+        con.execute("DELETE FROM meta WHERE chave = 'casos'")
+    con.close()
+    armazenamento._preparados.discard(banco)
+    assert armazenamento.contar_casos(banco) == 20
+    inserir_casos(_linhas(casos.iloc[20:25]), caminho=banco)
+    assert armazenamento.assinatura(banco)[1:] == (25, 25)
@@ -0,0 +1,85 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import app as aplicacao
+from cache_imagens import CacheImagens, largura_permitida
+
+
+def _png(caminho, largura=800, altura=400, cor=(200, 30, 30)):
+    Image.new("RGB", (largura, altura), cor).save(caminho, format="PNG")
+    return str(caminho)
+
+
+def _largura(conteudo):
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        return imagem.width
+
+
+def test_lru_tira_o_menos_usado(tmp_path):
+    a, b, c = (_png(tmp_path / f"{nome}.png", cor=cor)
+               for nome, cor in (("a", (1, 2, 3)), ("b", (4, 5, 6)), ("c", (7, 8, 9))))
+    tamanho = os.path.getsize(a)
+    cache = CacheImagens(limite_bytes=2 * tamanho + tamanho // 2)
+    cache.obter(a)
+    cache.obter(b)
+    cache.obter(a)  # o b passa a ser o menos usado
+    cache.obter(c)
+    assert len(cache) == 2 and cache.bytes <= cache.limite_bytes
+    assert {chave[0] for chave in cache._entradas} == {a, c}
+
+
+def test_arquivo_trocado_vira_outra_entrada(tmp_path):
+    caminho = _png(tmp_path / "grafico.png")
+    cache = CacheImagens()
+    conteudo, etag, _ = cache.obter(caminho)
+    assert cache.obter(caminho)[1] == etag and len(cache) == 1
+
+    # Outro conteúdo (outro tamanho)
+    _png(caminho, largura=300)
+    novo, etag_novo, _ = cache.obter(caminho)
+    assert novo != conteudo and etag_novo != etag
+
+    # Outro mtime (mesmo que o tamanho não mude): relê do disco
+    _png(caminho, largura=300, cor=(0, 0, 255))
+    estado = os.stat(caminho)
+    os.utime(caminho, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+    assert cache.obter(caminho)[1] not in (etag, etag_novo)
+    assert cache.obter(str(tmp_path / "nao_existe.png")) is None
+
+
+def test_miniatura_na_largura_da_lista(tmp_path):
+    caminho = _png(tmp_path / "grafico.png", largura=800, altura=400)
+    cache = CacheImagens()
+    assert largura_permitida(100) == 160 and largura_permitida(5000) is None
+    conteudo, etag, _ = cache.obter(caminho, 320)
+    with Image.open(io.BytesIO(conteudo)) as imagem:
+        assert imagem.size == (320, 160)
+    assert etag == cache.obter(caminho)[1] + "-320"
+    # Maior que a original: a própria original
+    assert cache.obter(caminho, 960)[0] == cache.obter(caminho)[0]
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch):
+    monkeypatch.setattr(aplicacao, "_servicos_iniciados", True)
+    monkeypatch.setattr(aplicacao, "IMAGENS_PATH", str(tmp_path))
+    monkeypatch.setattr(aplicacao, "cache_imagens", CacheImagens())
+    return aplicacao.app.test_client()
+
+
+def test_rota_do_grafico_responde_304_e_miniatura(cliente, tmp_path):
+    _png(tmp_path / "barras_geral.png")
+    resposta = cliente.get("/grafico/barras_geral")
+    assert resposta.status_code == 200 and _largura(resposta.data) == 800
+    etag = resposta.headers["ETag"]
+    assert cliente.get("/grafico/barras_geral", headers={"If-None-Match": etag}).status_code == 304
+
+    miniatura = cliente.get("/grafico/barras_geral?largura=100")
+    assert miniatura.status_code == 200 and _largura(miniatura.data) == 160
+    assert miniatura.headers["ETag"] != etag
+    assert cliente.get("/grafico/barras_geral?largura=100",
+                       headers={"If-None-Match": miniatura.headers["ETag"]}).status_code == 304
+    assert cliente.get("/grafico/pizza_zika").status_code == 404
@@ -0,0 +1,111 @@
+import csv
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from armazenamento_casos import (CSV_PATH, DB_PATH, caminho_retrato, carregar_casos,
+                                 inserir_casos_sincronizados, ler_estado_sincronizacao)
+from coleta_dados_google import adicionar_no_csv, baixar_e_formatar_csv
+
+CABECALHO = ["Carimbo de data/hora", "Nome", "Idade", "Gênero", "Peso", "Altura", "Bairro", "Diagnóstico"]
+LINHAS = [
+    ["01/03/2025 10:00:00", "Ana", "41", "Feminino", "60.5", "1.62", "Zona Sul", "Dengue"],
+    ["01/03/2025 10:00:00", "Bia", "30", "Feminino", "55", "1.58", "Boa Vista", "Zika"],
+    ["02/03/2025 08:30:00", "Caio", "25", "Masculino", "80", "1.80", "Iririú", "Dengue"],
+]
+
+
+class _Planilha(BaseHTTPRequestHandler):
+    """Planilha publicada do Google: CSV com ETag, 304 se o ETag bate."""
+    linhas = []
+    pedidos = []
+
+    def do_GET(self):
+        corpo = "\r\n".join(",".join(linha) for linha in [CABECALHO] + self.linhas).encode("utf-8")
+        etag = '"' + hashlib.sha1(corpo).hexdigest() + '"'
+        self.pedidos.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def planilha():
+    """Servidor local no lugar do Google; devolve a URL e a classe (linhas, pedidos)."""
+    for arquivo in (DB_PATH, caminho_retrato(DB_PATH), CSV_PATH):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+    _Planilha.linhas = list(LINHAS[:2])
+    _Planilha.pedidos = []
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Planilha)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{servidor.server_port}/planilha.csv", _Planilha
+    servidor.shutdown()
+    servidor.server_close()
+    if os.path.exists(CSV_PATH):
+        os.remove(CSV_PATH)
+
+
+def test_200_e_depois_304(planilha):
+    url, servidor = planilha
+    assert baixar_e_formatar_csv(url) == 2
+    assert baixar_e_formatar_csv(url) == 0
+    assert "If-None-Match" not in servidor.pedidos[0]
+    assert servidor.pedidos[1]["If-None-Match"] == ler_estado_sincronizacao()["etag"]
+    assert carregar_casos()["nome"].tolist() == ["Ana", "Bia"]
+
+
+def test_segunda_sincronizacao_sem_linhas_novas(planilha):
+    url, servidor = planilha
+    assert baixar_e_formatar_csv(url) == 2
+    # Sem ETag guardado o servidor responde 200 de novo: a marca d'água segura
+    inserir_casos_sincronizados([], {"etag": None})
+    assert baixar_e_formatar_csv(url) == 0
+    assert len(servidor.pedidos) == 2 and "If-None-Match" not in servidor.pedidos[1]
+    assert len(carregar_casos()) == 2
+
+
+def test_caso_do_site_nao_mexe_na_marca(planilha):
+    url, servidor = planilha
+    baixar_e_formatar_csv(url)
+    marca = ler_estado_sincronizacao()["marca"]
+    adicionar_no_csv({"nome": "Davi", "idade": "50", "genero": "Masculino", "peso": "90",
+                      "altura": "1.75", "bairro": "Zona Norte", "diagnostico": "COVID",
+                      "data": "2025-03-05"})
+    assert ler_estado_sincronizacao()["marca"] == marca
+
+    servidor.linhas.append(LINHAS[2])
+    assert baixar_e_formatar_csv(url) == 1
+    assert carregar_casos()["nome"].tolist() == ["Ana", "Bia", "Davi", "Caio"]
+
+
+def test_migracao_do_csv_antigo_nao_duplica(planilha):
+    url, servidor = planilha
+    # dados_pacientes.csv da versão antiga: as duas linhas da planilha (data
+    # do download, coordenada sorteada) e um caso do site
+    with open(CSV_PATH, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["nome", "idade", "genero", "peso", "altura",
+                           "local_lat", "local_lon", "bairro", "data", "diagnostico"])
+        f.write("\n")
+        escritor.writerow(["Ana", "41", "Feminino", "60.5", "1.62", -26.353, -48.848, "Zona Sul", "2025-03-04", "Dengue"])
+        escritor.writerow(["Bia", "30", "Feminino", "55", "1.58", -26.292, -48.835, "Boa Vista", "2025-03-04", "Zika"])
+        escritor.writerow(["Davi", "50", "Masculino", "90", "1.75", -26.277, -48.847, "Zona Norte", "2025-03-05", "COVID"])
+
+    servidor.linhas.append(LINHAS[2])
+    assert baixar_e_formatar_csv(url) == 1
+    assert carregar_casos()["nome"].tolist() == ["Ana", "Bia", "Davi", "Caio"]
+    assert not ler_estado_sincronizacao()["legado"]
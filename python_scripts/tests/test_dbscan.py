@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.cluster import DBSCAN
+
+import dbscan
+import metricas
+from dbscan import calcular_matriz_distancia, detectar_clusters
+
+
+def rotulos_referencia(df, eps_km=0.8, min_samples=2, peso_tempo=1/30):
+    """
+    Referência: DBSCAN do sklearn sobre a matriz densa n x n de cada doença
+    (todas as linhas, sem juntar casos repetidos), com o deslocamento de IDs
+    do detectar_clusters. Devolve {id do caso: cluster}.
+    """
+    esperado = {}
+    proximo_cluster_id = 0
+    for _, grupo in df.groupby("diagnostico"):
+        coords = list(zip(grupo["local_lat"], grupo["local_lon"]))
+        matriz = calcular_matriz_distancia(coords, list(grupo["data"]), peso_tempo)
+        labels = DBSCAN(eps=eps_km, min_samples=min_samples, metric="precomputed").fit_predict(matriz)
+        for caso, label in zip(grupo["id"], labels):
+            esperado[caso] = label + proximo_cluster_id if label != -1 else -1
+        proximo_cluster_id += labels.max() + 1
+    return esperado
+
+
+def rotulos_por_caso(df_clusters):
+    return dict(zip(df_clusters["id"], df_clusters["cluster"]))
+
+
+@pytest.fixture(autouse=True)
+def matrizes_temporarias(tmp_path, monkeypatch):
+    """Cada teste com a sua pasta de matrizes (o cache em disco não vaza entre testes)."""
+    monkeypatch.setattr(dbscan, "MATRIZES_PATH", str(tmp_path / "matrizes"))
+
+
+@pytest.mark.parametrize("min_samples", [2, 3, 5])
+def test_esparso_igual_ao_denso_do_sklearn(casos, min_samples):
+    resultado = detectar_clusters(casos, min_samples=min_samples, modo="esparso")
+    assert rotulos_por_caso(resultado) == rotulos_referencia(casos, min_samples=min_samples)
+
+
+def test_denso_em_memoria_igual_ao_sklearn(casos):
+    resultado = detectar_clusters(casos, min_samples=3, modo="denso", usar_cache=False)
+    assert rotulos_por_caso(resultado) == rotulos_referencia(casos, min_samples=3)
+
+
+def test_ordem_e_colunas_do_resultado(casos):
+    resultado = detectar_clusters(casos, modo="esparso")
+    # Doenças em ordem alfabética, casos de cada uma na ordem original
+    esperado = pd.concat([g for _, g in casos.groupby("diagnostico")], ignore_index=True)
+    pd.testing.assert_frame_equal(resultado.drop(columns="cluster"), esperado)
+
+
+def test_grafo_esparso_tem_os_mesmos_pares_da_matriz(casos):
+    grupo = casos[casos["diagnostico"] == "Dengue"]
+    lats, lons, dias = dbscan._arrays_do_grupo(grupo)
+    grafo = dbscan.construir_grafo_vizinhanca(lats, lons, dias, 0.8)
+    matriz = calcular_matriz_distancia(list(zip(lats, lons)), list(grupo["data"]))
+    dentro = (matriz <= 0.8) & ~np.eye(len(lats), dtype=bool)
+    i, j = np.nonzero(dentro)
+    assert grafo.nnz == len(i)
+    np.testing.assert_array_equal(np.asarray(grafo[i, j]).ravel(), matriz[i, j])
+
+
+def test_denso_com_matriz_condensada_em_disco(casos):
+    # Primeira vez grava a matriz; a segunda lê do arquivo mapeado
+    for _ in range(2):
+        resultado = detectar_clusters(casos, min_samples=3, modo="denso", usar_cache=True)
+        assert rotulos_por_caso(resultado) == rotulos_referencia(casos, min_samples=3)
+
+
+def test_matriz_condensada_expande_para_a_densa(casos):
+    grupo = casos[casos["diagnostico"] == "COVID"]
+    coords = list(zip(grupo["local_lat"], grupo["local_lon"]))
+    datas = list(grupo["data"])
+    condensada = dbscan.atualizar_matriz_distancia("teste", [], [], coords, datas)
+    densa = calcular_matriz_distancia(coords, datas)
+    assert len(condensada) == dbscan.tamanho_condensado(len(coords))
+    np.testing.assert_array_equal(dbscan.expandir_matriz(condensada), densa)
+
+    i, j = 7, 3
+    assert condensada[dbscan.indice_condensado(i, j)] == densa[i, j]
+    assert condensada[dbscan.indice_condensado(j, i)] == densa[i, j]
+
+
+def test_grafo_da_matriz_condensada_igual_ao_esparso(casos):
+    grupo = casos[casos["diagnostico"] == "Zika"]
+    lats, lons, dias = dbscan._arrays_do_grupo(grupo)
+    condensada = dbscan.atualizar_matriz_distancia(
+        "teste", [], [], list(zip(lats, lons)), list(grupo["data"]))
+    do_arquivo = dbscan.grafo_da_matriz_condensada(condensada, 0.8)
+    esparso = dbscan.construir_grafo_vizinhanca(lats, lons, dias, 0.8)
+    assert (do_arquivo != esparso).nnz == 0
+    np.testing.assert_array_equal(do_arquivo.indptr, esparso.indptr)
+    np.testing.assert_array_equal(do_arquivo.indices, esparso.indices)
+
+
+def _pontos_do_grupo(grupo):
+    coords = list(zip(grupo["local_lat"], grupo["local_lon"]))
+    return coords, list(grupo["data"]), dbscan.identificar_casos(grupo)
+
+
+def test_matriz_incremental_igual_a_reconstruida(casos, capsys):
+    coords, datas, ids = _pontos_do_grupo(casos[casos["diagnostico"] == "Dengue"])
+    corte = len(coords) * 3 // 4
+    dbscan.obter_matriz_distancia("incremental", coords[:corte], datas[:corte], ids[:corte])
+    capsys.readouterr()
+    incremental = dbscan.obter_matriz_distancia("incremental", coords, datas, ids)
+    assert f"({corte} pontos anteriores)" in capsys.readouterr().out
+
+    completa = dbscan.obter_matriz_distancia("completa", coords, datas, ids)
+    np.testing.assert_array_equal(incremental, completa)
+    np.testing.assert_array_equal(dbscan.expandir_matriz(incremental), calcular_matriz_distancia(coords, datas))
+
+
+def test_matriz_reconstruida_quando_o_prefixo_muda(casos, capsys):
+    coords, datas, ids = _pontos_do_grupo(casos[casos["diagnostico"] == "Dengue"])
+    dbscan.obter_matriz_distancia("editada", coords, datas, ids)
+    # Um caso antigo editado: a matriz salva não serve mais
+    coords[0] = (coords[0][0] + 0.01, coords[0][1])
+    ids = ids.copy()
+    ids[0] += 1
+    capsys.readouterr()
+    matriz = dbscan.obter_matriz_distancia("editada", coords, datas, ids)
+    assert "Reconstruindo matriz" in capsys.readouterr().out
+    np.testing.assert_array_equal(dbscan.expandir_matriz(matriz), calcular_matriz_distancia(coords, datas))
+
+
+def _uso_do_cache(arquivo, coords, datas, ids, peso_tempo=1/30):
+    """Matriz de obter_matriz_distancia e o que foi feito com o cache em disco."""
+    metricas.zerar()
+    matriz = dbscan.obter_matriz_distancia(arquivo, coords, datas, ids, peso_tempo)
+    (chave,) = [c for c in metricas.retirar()[1] if c[0] == "matriz_cache"]
+    return dict(chave[1])["resultado"], matriz
+
+
+def test_cache_da_matriz_reaproveitado_so_com_linhas_novas(casos):
+    coords, datas, ids = _pontos_do_grupo(casos[casos["diagnostico"] == "Zika"])
+    corte = len(coords) // 2
+    assert _uso_do_cache("cache", coords[:corte], datas[:corte], ids[:corte])[0] == "reconstruida"
+    assert _uso_do_cache("cache", coords[:corte], datas[:corte], ids[:corte])[0] == "pronta"
+    resultado, matriz = _uso_do_cache("cache", coords, datas, ids)
+    assert resultado == "incremental"
+    np.testing.assert_array_equal(dbscan.expandir_matriz(matriz), calcular_matriz_distancia(coords, datas))
+    assert _uso_do_cache("cache", coords, datas, ids)[0] == "pronta"
+
+
+@pytest.mark.parametrize("mudanca", ["ids", "coordenadas", "datas", "peso_tempo"])
+def test_cache_da_matriz_reconstruido_quando_algo_muda(casos, mudanca):
+    coords, datas, ids = _pontos_do_grupo(casos[casos["diagnostico"] == "Zika"])
+    corte = len(coords) // 2
+    _uso_do_cache("cache", coords[:corte], datas[:corte], ids[:corte])
+
+    # Um caso já na matriz muda (ou o peso do tempo), e chegam linhas novas
+    ids, peso_tempo = ids.copy(), 1/30
+    if mudanca == "ids":
+        ids[1] += 1
+    elif mudanca == "coordenadas":
+        coords[1] = (coords[1][0], coords[1][1] + 0.001)
+    elif mudanca == "datas":
+        datas[1] = datas[1] + pd.Timedelta(days=1)
+    else:
+        peso_tempo = 1/10
+    resultado, matriz = _uso_do_cache("cache", coords, datas, ids, peso_tempo)
+    assert resultado == "reconstruida"
+    np.testing.assert_array_equal(dbscan.expandir_matriz(matriz),
+                                  calcular_matriz_distancia(coords, datas, peso_tempo))
+
+
+@pytest.fixture(scope="module")
+def pool_do_modulo():
+    # Os processos levam segundos para subir: um pool para todos os testes
+    yield
+    if dbscan._pool is not None:
+        dbscan._pool[1].shutdown()
+        dbscan._pool = None
+
+
+@pytest.fixture
+def pool_paralelo(pool_do_modulo, monkeypatch):
+    # Paralelo mesmo com poucos casos
+    monkeypatch.setattr(dbscan, "MIN_CASOS_PARALELO", 0)
+
+
+@pytest.mark.parametrize("modo", ["esparso", "denso"])
+def test_paralelo_igual_ao_serial(casos, pool_paralelo, modo):
+    serial = detectar_clusters(casos, min_samples=3, modo=modo)
+    paralelo = detectar_clusters(casos, min_samples=3, modo=modo, processos=2)
+    pd.testing.assert_frame_equal(paralelo, serial)
+
+
+def test_metricas_dos_processos_voltam_ao_pai(casos, pool_paralelo):
+    metricas.zerar()
+    detectar_clusters(casos, modo="esparso", processos=2)
+    texto = metricas.texto_prometheus()
+    # Medidas feitas dentro dos processos do pool, uma por doença
+    assert 'geoepi_etapa_segundos_count{etapa="grafo_vizinhanca"} 3' in texto
+    assert f'geoepi_casos_clusterizados_total{{modo="esparso"}} {len(casos)}' in texto
+
+
+@pytest.mark.parametrize("min_samples", [2, 3])
+def test_varrer_surtos_igual_a_cada_dia_separado(casos, min_samples):
+    tabela = dbscan.varrer_surtos(casos, "2025-01-20", "2025-02-20", janela_dias=10, min_samples=min_samples)
+    ids = casos["id"].to_numpy()
+    for dia in pd.date_range("2025-01-20", "2025-02-20", freq="D"):
+        # Mesma janela do detectar_surtos_por_data, com o min_samples do teste
+        janela = casos[(casos["data"] >= dia - pd.Timedelta(days=10)) & (casos["data"] <= dia + pd.Timedelta(days=10))]
+        do_dia = detectar_clusters(janela, min_samples=min_samples, usar_cache=False, modo="esparso")
+        linhas = tabela[tabela["data"] == dia]
+        assert sorted(linhas["diagnostico"]) == sorted(do_dia["diagnostico"].unique())
+        for linha in linhas.itertuples():
+            grupo = do_dia[do_dia["diagnostico"] == linha.diagnostico]
+            assert linha.casos == len(grupo)
+            assert linha.ruido == (grupo["cluster"] == -1).sum()
+            esperado = {cluster_id: set(membros["id"])
+                        for cluster_id, membros in grupo[grupo["cluster"] != -1].groupby("cluster")}
+            obtido = {linha.primeiro_cluster + k: set(ids[membros]) for k, membros in enumerate(linha.membros)}
+            assert obtido == esperado
+
+
+def test_componentes_da_janela_se_dividem_quando_o_meio_sai():
+    # Cadeia 0-1-2-3-4 a 0,5 km: sem o 2, sobram duas componentes
+    lats = -26.3 + np.arange(5) * 0.0045
+    grafo = dbscan.construir_grafo_vizinhanca(lats, np.full(5, -48.85), np.zeros(5, dtype=np.int64), 0.8)
+    componentes = dbscan._ComponentesNucleos(grafo)
+    componentes.adicionar(np.array([0, 4, 2, 1, 3]))
+    posicoes = np.arange(5)
+    assert componentes.rotulos(posicoes).tolist() == [0, 0, 0, 0, 0]
+    componentes.remover(np.array([2]))
+    assert len(componentes.membros) == 2
+    # O 2 continua na janela como borda: fica com o menor cluster vizinho
+    assert componentes.rotulos(posicoes).tolist() == [0, 0, 0, 1, 1]
+    assert componentes.rotulos(posicoes).tolist() == dbscan.rotular_por_grafo(grafo, np.arange(5) != 2).tolist()
+
+
+def test_varrer_parametros_igual_a_cada_execucao(casos):
+    eps_lista, min_samples_lista, pesos = [0.3, 0.8, 1.5], [2, 3, 5], [1/30, 1/10]
+    tabela = dbscan.varrer_parametros(casos, eps_lista, min_samples_lista, pesos)
+    assert len(tabela) == len(eps_lista) * len(min_samples_lista) * len(pesos) * casos["diagnostico"].nunique()
+    for peso_tempo in pesos:
+        for eps_km in eps_lista:
+            for min_samples in min_samples_lista:
+                resultado = detectar_clusters(casos, eps_km=eps_km, min_samples=min_samples,
+                                              peso_tempo=peso_tempo, modo="esparso")
+                linhas = tabela[(tabela["peso_tempo"] == peso_tempo) & (tabela["eps_km"] == eps_km)
+                                & (tabela["min_samples"] == min_samples)]
+                deslocamento = 0
+                for linha in linhas.sort_values("diagnostico").itertuples():
+                    clusters = resultado.loc[resultado["diagnostico"] == linha.diagnostico, "cluster"].to_numpy()
+                    locais = np.where(clusters != -1, clusters - deslocamento, -1)
+                    assert linha.casos == len(clusters)
+                    assert linha.ruido == (clusters == -1).sum()
+                    assert linha.clusters == locais.max() + 1
+                    assert linha.tamanhos == np.bincount(locais[locais != -1], minlength=linha.clusters).tolist()
+                    deslocamento += linha.clusters
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from dbscan import detectar_clusters
+from dbscan_online import ClusterizacaoOnline
+
+
+def _conferir(online, casos, min_samples):
+    lote = detectar_clusters(casos, min_samples=min_samples, modo="esparso")
+    relatorio = online.comparar_com_lote(lote)
+    assert relatorio["nucleos_iguais"]
+    assert relatorio["particao_igual"]
+    return relatorio
+
+
+@pytest.mark.parametrize("min_samples", [2, 3])
+def test_caso_a_caso_igual_ao_lote(casos, min_samples):
+    online = ClusterizacaoOnline(min_samples=min_samples)
+    for linha in casos.to_dict("records"):
+        online.adicionar_caso(linha)
+    _conferir(online, casos, min_samples)
+    if min_samples == 2:
+        # Sem bordas: os rótulos são uma renumeração dos do lote
+        assert _conferir(online, casos, min_samples)["bordas_divergentes"] == 0
+
+
+@pytest.mark.parametrize("min_samples", [2, 3])
+def test_a_partir_do_lote(casos, min_samples):
+    corte = 700
+    online = ClusterizacaoOnline(min_samples=min_samples)
+    inicial = detectar_clusters(casos.iloc[:corte], min_samples=min_samples, modo="esparso")
+    online.iniciar_de_lote(inicial)
+    resultado_inicial = online.resultado()
+    np.testing.assert_array_equal(resultado_inicial["cluster"], inicial["cluster"])
+
+    for linha in casos.iloc[corte:].to_dict("records"):
+        online.adicionar_caso(linha)
+    _conferir(online, casos, min_samples)
+
+
+def test_ids_estaveis(casos):
+    online = ClusterizacaoOnline()
+    online.iniciar_de_lote(detectar_clusters(casos.iloc[:700], modo="esparso"))
+    antes = online.resultado().set_index("id")["cluster"]
+    for linha in casos.iloc[700:].to_dict("records"):
+        online.adicionar_caso(linha)
+    depois = online.resultado().set_index("id")["cluster"].loc[antes.index]
+    # Um cluster antigo só muda de ID ao se unir a outro (fica o menor)
+    for cluster_id, novos in depois[antes != -1].groupby(antes[antes != -1]):
+        assert novos.nunique() == 1
+        assert novos.iloc[0] <= cluster_id
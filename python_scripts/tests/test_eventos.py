@@ -0,0 +1,59 @@
+import pytest
+
+import publicacao
+from eventos import SeguidorResultados
+from publicacao import publicar_resultados
+
+
+class _Canal:
+    def __init__(self):
+        self.eventos = []
+
+    def publicar(self, tipo, dados):
+        self.eventos.append((tipo, dados))
+
+
+@pytest.fixture(autouse=True)
+def ponteiro_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(publicacao, "RESULTADOS_PATH", str(tmp_path / "resultados.json"))
+    monkeypatch.setattr(publicacao, "PUBLICADOS_PATH", str(tmp_path / "publicados"))
+
+
+def _evento(novos_casos):
+    return {"completo": False, "novos_casos": novos_casos, "casos": [],
+            "clusters_alterados": [], "clusters_removidos": 0, "graficos": ["grafico_geral"]}
+
+
+def test_cada_versao_nova_vira_um_evento():
+    seguidor = SeguidorResultados(_Canal())
+    publicar_resultados([], dados="0.10.10")
+    # Primeira leitura: só guarda a versão atual
+    assert seguidor._ler_versao_nova() is None
+
+    publicar_resultados([], evento=_evento(2), dados="0.12.12")
+    assert seguidor._ler_versao_nova() == {**_evento(2), "publicado": 2}
+    assert seguidor._ler_versao_nova() is None
+
+
+def test_mesmos_dados_e_arquivos_nao_mudam_a_versao():
+    seguidor = SeguidorResultados(_Canal())
+    publicar_resultados([], evento=_evento(1), dados="0.10.10")
+    seguidor._ler_versao_nova()
+    assert publicar_resultados([], evento=_evento(1), dados="0.10.10")["versao"] == 1
+    assert seguidor._ler_versao_nova() is None
+
+
+def test_versoes_puladas_viram_evento_completo(tmp_path, monkeypatch):
+    monkeypatch.setattr(publicacao, "base_path", str(tmp_path))
+    grafico = tmp_path / "imagens" / "grafico_geral.png"
+    grafico.parent.mkdir()
+    grafico.write_bytes(b"png")
+
+    seguidor = SeguidorResultados(_Canal())
+    publicar_resultados([str(grafico)], dados="0.10.10")
+    seguidor._ler_versao_nova()
+    publicar_resultados([], evento=_evento(1), dados="0.11.11")
+    publicar_resultados([], evento=_evento(1), dados="0.12.12")
+    evento = seguidor._ler_versao_nova()
+    assert evento["completo"] and evento["publicado"] == 3
+    assert evento["graficos"] == ["grafico_geral"]
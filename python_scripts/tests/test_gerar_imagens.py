@@ -0,0 +1,72 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import gerar_imagens
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(gerar_imagens, "base_path", str(tmp_path))
+    return tmp_path
+
+
+def _clusters():
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4, 5],
+        "diagnostico": ["Dengue", "Dengue", "Dengue", "Zika {{x}} <i>", "Zika {{x}} <i>"],
+        "local_lat": [-26.301, -26.302, -26.250, -26.321, -26.322],
+        "local_lon": [-48.851, -48.852, -48.800, -48.901, -48.902],
+        "data": pd.to_datetime(["2025-03-01"] * 5),
+        "cluster": [0, 0, -1, 1, 1],
+    })
+
+
+def test_mapas_trazem_os_casos_e_ruido_so_se_houver(pasta):
+    completo, validos = gerar_imagens.gerar_mapas(_clusters())
+    texto = open(completo, encoding="utf-8").read()
+    # Aberto sem o site: os casos estão no próprio HTML
+    for lat, lon in zip(_clusters()["local_lat"], _clusters()["local_lon"]):
+        assert f"[{lon}, {lat}]" in texto
+    # Nomes das camadas no LayerControl (JSON do folium)
+    assert texto.count("Dengue - Ru\\u00eddo") == 1
+    assert texto.count(" - Ru\\u00eddo") == 1
+    # Nome da doença não vira HTML nem some no Jinja do folium
+    assert "<i>" not in texto and "\\u007b\\u007bx\\u007d\\u007d" in texto
+    assert "/static/js/mapa_clusters.js" in texto
+
+    texto_validos = open(validos, encoding="utf-8").read()
+    assert " - Ru\\u00eddo" not in texto_validos
+    assert "[-48.8, -26.25]" not in texto_validos
+
+
+@pytest.fixture
+def imagens(tmp_path, monkeypatch):
+    monkeypatch.setattr(gerar_imagens, "imagens_path", str(tmp_path))
+    monkeypatch.setattr(gerar_imagens, "IMPRESSOES_PATH", str(tmp_path / "impressoes.json"))
+    # No próprio processo: os do pool não veem a pasta trocada
+    monkeypatch.setattr(gerar_imagens, "MAX_PROCESSOS", 1)
+    return tmp_path
+
+
+def test_impressao_igual_nao_redesenha(imagens, monkeypatch):
+    df = _clusters()
+    renderizar = gerar_imagens.renderizar_graficos
+    assert sorted(renderizar(gerar_imagens.tarefas_grafico_geral(df))) == ["barras_geral.png", "cluster_geral.png"]
+    with open(imagens / "impressoes.json", encoding="utf-8") as f:
+        assert sorted(json.load(f)) == ["barras_geral.png", "cluster_geral.png"]
+    modificado = os.stat(imagens / "cluster_geral.png").st_mtime_ns
+    assert renderizar(gerar_imagens.tarefas_grafico_geral(df)) == []
+    assert os.stat(imagens / "cluster_geral.png").st_mtime_ns == modificado
+
+    # Um caso mudou de lugar: só o gráfico de pontos muda (as contagens não)
+    df.loc[0, "local_lat"] += 0.01
+    assert renderizar(gerar_imagens.tarefas_grafico_geral(df)) == ["cluster_geral.png"]
+    # PNG apagado volta mesmo com a impressão igual
+    os.remove(imagens / "barras_geral.png")
+    assert renderizar(gerar_imagens.tarefas_grafico_geral(df)) == ["barras_geral.png"]
+    # Mudou o jeito de desenhar: todos de novo
+    monkeypatch.setattr(gerar_imagens, "VERSAO_GRAFICOS", gerar_imagens.VERSAO_GRAFICOS + 1)
+    assert len(renderizar(gerar_imagens.tarefas_grafico_geral(df))) == 2
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+import ingestao
+from ingestao import FilaIngestao
+
+
+class _Gravadas(list):
+    """Linhas gravadas; o gravador só grava com liberar ligado."""
+
+    def __init__(self):
+        super().__init__()
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+
+@pytest.fixture
+def gravadas(monkeypatch):
+    """Troca o banco por uma lista; lotes com a linha "ruim" falham inteiros."""
+    linhas = _Gravadas()
+
+    def inserir(lote):
+        linhas.liberar.wait()
+        if "ruim" in lote:
+            raise ValueError("linha inválida")
+        linhas.extend(lote)
+        return len(lote)
+
+    monkeypatch.setattr(ingestao, "inserir_casos", inserir)
+    return linhas
+
+
+def _enviar_em_paralelo(fila, linhas):
+    erros = {}
+
+    def enviar(linha):
+        try:
+            fila.enviar(linha, timeout=5)
+        except Exception as e:
+            erros[linha] = e
+
+    threads = [threading.Thread(target=enviar, args=(linha,)) for linha in linhas]
+    for t in threads:
+        t.start()
+    # Todos na fila antes do gravador começar: viram um lote só
+    while fila._fila.qsize() < len(linhas):
+        time.sleep(0.001)
+    fila.iniciar()
+    for t in threads:
+        t.join()
+    return erros
+
+
+def test_linha_ruim_nao_derruba_o_lote(gravadas):
+    fila = FilaIngestao()
+    erros = _enviar_em_paralelo(fila, ["a", "ruim", "b", "c"])
+    assert sorted(gravadas) == ["a", "b", "c"]
+    assert list(erros) == ["ruim"] and isinstance(erros["ruim"], ValueError)
+    estatisticas = fila.estatisticas()
+    assert estatisticas["lotes"] == 1 and estatisticas["gravados"] == 3 and estatisticas["falhas"] == 1
+
+
+def test_timeout_na_fila_cancela_o_caso(gravadas):
+    fila = FilaIngestao()
+    with pytest.raises(TimeoutError):
+        fila.enviar("cancelado", timeout=0.05)
+    fila.iniciar()
+    # Reenvio depois do timeout: o caso entra uma vez só
+    fila.enviar("cancelado", timeout=5)
+    assert gravadas == ["cancelado"]
+    assert fila.estatisticas()["cancelados"] == 1
+
+
+def test_timeout_durante_a_gravacao_espera_o_resultado(gravadas):
+    gravadas.liberar.clear()
+    fila = FilaIngestao().iniciar()
+    threading.Timer(0.2, gravadas.liberar.set).start()
+    fila.enviar("lento", timeout=0.05)
+    assert gravadas == ["lento"]
+    assert fila.estatisticas()["cancelados"] == 0
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metricas
+
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def zeradas():
+    metricas.zerar()
+    yield
+    metricas.zerar()
+
+
+def test_metricas_desligadas_nao_guardam_nada(tmp_path):
+    # As variáveis são lidas na importação: outro processo com o ambiente certo
+    codigo = (
+        "import os, metricas\n"
+        "with metricas.execucao('pipeline', casos=3):\n"
+        "    with metricas.etapa('dbscan', modo='esparso'):\n"
+        "        metricas.contar('graficos', 2)\n"
+        "        metricas.definir('matriz_pontos', 10)\n"
+        "        metricas.observar('pedido_segundos', 0.2)\n"
+        "dobro = metricas.cronometrar('dobro')(lambda x: 2 * x)\n"
+        "assert dobro(4) == 8\n"
+        "metricas.incorporar(({}, {('x', ()): 1}, {}))\n"
+        "assert metricas.etapa('a') is metricas._ETAPA_VAZIA\n"
+        "print(repr(metricas.texto_prometheus()), metricas.retirar(), os.listdir(metricas.PASTA_TRACE))\n"
+    )
+    ambiente = {**os.environ, "GEOEPI_METRICAS": "0", "GEOEPI_TRACE": str(tmp_path)}
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=PASTA_PROJETO, env=ambiente,
+                           capture_output=True, text=True, check=True).stdout
+    assert saida.strip() == "'\\n' ({}, {}, {}) []"
+
+
+def test_trace_json_bem_formado(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, "PASTA_TRACE", str(tmp_path))
+    with metricas.execucao("pipeline", casos=900, inicio=pytest):
+        with metricas.etapa("dbscan", doenca='Zika "x"\n'):
+            pass
+        with pytest.raises(ValueError):
+            with metricas.etapa("graficos"):
+                raise ValueError("falhou")
+        # Execução dentro de execução: vira só uma etapa do mesmo trace
+        with metricas.execucao("interna"):
+            pass
+
+    (arquivo,) = os.listdir(tmp_path)
+    assert arquivo.startswith("trace_") and arquivo.endswith("_pipeline.json")
+    with open(tmp_path / arquivo, encoding="utf-8") as f:
+        trace = json.load(f)
+    assert trace["execucao"] == "pipeline" and trace["casos"] == 900
+    assert isinstance(trace["inicio"], str) and "_inicio" not in trace
+    etapas = trace["etapas"]
+    assert [e["etapa"] for e in etapas] == ["dbscan", "graficos", "interna", "pipeline"]
+    assert etapas[0]["doenca"] == 'Zika "x"\n'
+    assert etapas[1]["erro"] == "ValueError('falhou')" and etapas[0]["erro"] is None
+    for e in etapas:
+        assert 0 <= e["inicio_s"] and 0 <= e["duracao_s"] <= trace["duracao_s"]
+
+    # Fora de uma execução nada mais entra no trace
+    with metricas.etapa("solta"):
+        pass
+    assert len(os.listdir(tmp_path)) == 1
+    assert 'geoepi_etapa_erros_total{etapa="graficos"} 1' in metricas.texto_prometheus()
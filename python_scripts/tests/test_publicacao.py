@@ -0,0 +1,186 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import publicacao
+from agendador import AgendadorPipeline
+from publicacao import assumir_trava, gravar_atomico, ler_resultados, publicar_resultados, trava
+
+PASTA_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _processo(codigo):
+    """Outro processo Python com o projeto no path (mesma pasta de dados)."""
+    return subprocess.Popen([sys.executable, "-c", f"import sys; sys.path.insert(0, {PASTA_PROJETO!r})\n" + codigo],
+                            stdout=subprocess.PIPE, text=True)
+
+
+@pytest.fixture
+def ponteiro_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(publicacao, "base_path", str(tmp_path))
+    monkeypatch.setattr(publicacao, "RESULTADOS_PATH", str(tmp_path / "resultados.json"))
+    monkeypatch.setattr(publicacao, "PUBLICADOS_PATH", str(tmp_path / "publicados"))
+    return tmp_path
+
+
+def test_trava_entre_threads():
+    total = [0]
+
+    def somar():
+        for _ in range(200):
+            with trava("teste_threads"):
+                atual = total[0]
+                time.sleep(0)
+                total[0] = atual + 1
+
+    threads = [threading.Thread(target=somar) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert total[0] == 800
+
+
+def test_trava_entre_processos(tmp_path):
+    marca = tmp_path / "marca"
+    filho = _processo(
+        "import time\nfrom publicacao import trava\n"
+        "with trava('teste_processos'):\n"
+        "    print('dentro', flush=True)\n"
+        "    time.sleep(0.5)\n"
+        f"    open({str(marca)!r}, 'w').close()\n"
+    )
+    assert filho.stdout.readline().strip() == "dentro"
+    # Só entra depois que o outro processo saiu (e gravou a marca)
+    with trava("teste_processos"):
+        assert marca.exists()
+    filho.wait()
+
+
+def test_assumir_trava_elege_um_processo():
+    assert assumir_trava("teste_executor")
+    assert assumir_trava("teste_executor")
+    filho = _processo("from publicacao import assumir_trava\nprint(assumir_trava('teste_executor'))")
+    assert filho.communicate()[0].strip() == "False"
+
+
+def test_agendador_so_roda_no_executor(monkeypatch):
+    iniciados = []
+    monkeypatch.setattr(AgendadorPipeline, "iniciar", lambda self: iniciados.append(self))
+    # Outro processo tem a trava: este fica esperando
+    monkeypatch.setattr("agendador.assumir_trava", lambda nome: False)
+    seguidor = AgendadorPipeline(motor=None)
+    seguidor.iniciar_se_executor(intervalo_s=0.01)
+    time.sleep(0.05)
+    assert not iniciados and not seguidor.executor
+    # O executor morreu: o próximo a tentar assume
+    monkeypatch.setattr("agendador.assumir_trava", lambda nome: True)
+    for _ in range(100):
+        if iniciados:
+            break
+        time.sleep(0.01)
+    assert iniciados == [seguidor] and seguidor.executor
+    seguidor.parar()
+
+
+def test_gravar_atomico_nunca_deixa_arquivo_pela_metade(tmp_path):
+    caminho = str(tmp_path / "dados.bin")
+    conteudos = [bytes([i]) * 200_000 for i in range(4)]
+    parar = threading.Event()
+    lidos = []
+
+    def gravar(conteudo):
+        def escrita(temporario):
+            with open(temporario, "wb") as f:
+                f.write(conteudo[:1000])
+                f.flush()
+                f.write(conteudo[1000:])
+        gravar_atomico(caminho, escrita)
+
+    def escrever(conteudo):
+        while not parar.is_set():
+            gravar(conteudo)
+
+    def ler():
+        while not parar.is_set():
+            with open(caminho, "rb") as f:
+                lidos.append(f.read())
+
+    gravar(conteudos[0])
+    threads = [threading.Thread(target=escrever, args=(c,)) for c in conteudos] + [threading.Thread(target=ler)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    parar.set()
+    for t in threads:
+        t.join()
+    assert lidos and all(lido in conteudos for lido in lidos)
+    assert os.listdir(tmp_path) == ["dados.bin"]
+
+
+def test_gravar_atomico_com_erro_mantem_o_antigo(tmp_path):
+    caminho = str(tmp_path / "dados.json")
+    publicacao.gravar_json(caminho, {"a": 1})
+
+    def falhar(temporario):
+        with open(temporario, "w") as f:
+            f.write("{meio")
+        raise RuntimeError("falhou")
+
+    with pytest.raises(RuntimeError):
+        gravar_atomico(caminho, falhar)
+    with open(caminho) as f:
+        assert json.load(f) == {"a": 1}
+    assert os.listdir(tmp_path) == ["dados.json"]
+
+
+def test_publicar_resultados_avanca_o_ponteiro(ponteiro_temporario):
+    grafico = ponteiro_temporario / "imagens" / "grafico.png"
+    grafico.parent.mkdir()
+    versoes = []
+    for i in range(publicacao.MANTER_VERSOES + 3):
+        grafico.write_bytes(b"png %d" % i)
+        resultados = publicar_resultados([str(grafico)], dados=f"0.{i}.{i}")
+        versoes.append(resultados["versao"])
+        publicado = os.path.join(publicacao.PUBLICADOS_PATH, resultados["arquivos"]["imagens/grafico.png"])
+        with open(publicado, "rb") as f:
+            assert f.read() == b"png %d" % i
+        assert ler_resultados()["versao"] == resultados["versao"]
+    assert versoes == list(range(1, len(versoes) + 1))
+
+    # Mesmo conteúdo e mesmos dados: a versão não muda
+    assert publicar_resultados([str(grafico)], dados=f"0.{i}.{i}")["versao"] == versoes[-1]
+    # Só ficam em disco a versão atual e as MANTER_VERSOES anteriores
+    assert len(os.listdir(publicacao.PUBLICADOS_PATH)) == publicacao.MANTER_VERSOES + 1
+
+
+def test_publicacoes_concorrentes_nao_perdem_versao(ponteiro_temporario):
+    # Três processos e duas threads neste: cada publicação lê e troca o ponteiro sob a trava
+    codigo = (
+        "import publicacao\n"
+        f"publicacao.base_path = {str(ponteiro_temporario)!r}\n"
+        f"publicacao.RESULTADOS_PATH = {publicacao.RESULTADOS_PATH!r}\n"
+        f"publicacao.PUBLICADOS_PATH = {publicacao.PUBLICADOS_PATH!r}\n"
+        "import os\n"
+        "for i in range(10):\n"
+        "    publicacao.publicar_resultados([], dados=f'{os.getpid()}.{i}')\n"
+    )
+    filhos = [_processo(codigo) for _ in range(3)]
+
+    def publicar(n):
+        for i in range(10):
+            publicar_resultados([], dados=f"{n}.{i}")
+
+    threads = [threading.Thread(target=publicar, args=(n,)) for n in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for filho in filhos:
+        assert filho.wait() == 0
+    assert ler_resultados()["versao"] == 50
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import registro
+from registro import SaidaRegistro, ler_desde
+
+
+@pytest.fixture
+def log(tmp_path):
+    return str(tmp_path / "saida_python.log")
+
+
+def _texto(linhas):
+    # Sem o prefixo de data/hora e pid
+    return [linha.split("] ", 1)[1] for linha in linhas]
+
+
+@pytest.mark.parametrize("linhas_por_leitura", [1, 7, 40])
+def test_ler_desde_atravessa_o_giro_sem_repetir_nem_perder(log, linhas_por_leitura):
+    saida = SaidaRegistro(log, tamanho_maximo=2000, copias=3)
+    lidas, posicao = [], 0
+    for i in range(200):
+        saida.write(f"linha {i}\n")
+        if i % linhas_por_leitura == linhas_por_leitura - 1:
+            novas, posicao, truncado = ler_desde(posicao, caminho=log)
+            assert not truncado
+            lidas += _texto(novas)
+    novas, posicao, _ = ler_desde(posicao, caminho=log)
+    lidas += _texto(novas)
+
+    assert os.path.exists(log + ".1")
+    assert lidas == [f"linha {i}" for i in range(200)]
+    assert posicao == saida.posicao
+
+
+def test_ler_desde_com_limite_e_posicao_que_ja_saiu(log):
+    saida = SaidaRegistro(log, tamanho_maximo=500, copias=2)
+    for i in range(200):
+        saida.write(f"linha {i}\n")
+    # Leituras pequenas: cada uma para no fim de uma linha
+    novas, posicao, truncado = ler_desde(saida.recentes[-30][0], limite=64, caminho=log)
+    assert not truncado and 0 < len(novas) < 30
+    lidas = _texto(novas)
+    while novas:
+        novas, posicao, _ = ler_desde(posicao, limite=64, caminho=log)
+        lidas += _texto(novas)
+    assert lidas == [f"linha {i}" for i in range(170, 200)]
+
+    # Só ficam o atual e duas cópias: do começo, a partir da mais antiga, sem buracos
+    novas, posicao, truncado = ler_desde(0, caminho=log)
+    assert truncado and novas
+    lidas = _texto(novas)
+    while novas:
+        novas, posicao, truncado = ler_desde(posicao, caminho=log)
+        assert not truncado
+        lidas += _texto(novas)
+    primeira = int(lidas[0].split()[1])
+    assert primeira > 0 and lidas == [f"linha {i}" for i in range(primeira, 200)]
+
+
+def test_cauda_do_log_comeca_na_copia_girada(log, monkeypatch):
+    monkeypatch.setattr(registro, "TAMANHO_CAUDA", 1500)
+    saida = SaidaRegistro(log, tamanho_maximo=2000, copias=3)
+    for i in range(60):
+        saida.write(f"linha {i}\n")
+    # Outro worker (sem execução em memória): só o arquivo
+    texto, posicao = registro.ultima_execucao(caminho=log)
+    lidas = _texto(texto.splitlines())
+    assert posicao == saida.posicao and lidas[-1] == "linha 59"
+    primeira = int(lidas[0].split()[1])
+    assert lidas == [f"linha {i}" for i in range(primeira, 60)]
+    assert sum(len(linha) for linha in texto.splitlines()) > 1000
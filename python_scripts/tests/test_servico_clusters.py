@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import main
+import servico_clusters
+from armazenamento_casos import COLUNAS, DB_PATH, caminho_retrato, inserir_casos
+from dbscan import detectar_clusters
+from servico_clusters import MotorClusterizacao
+
+
+@pytest.fixture
+def motor(monkeypatch):
+    """Motor sobre o banco padrão (vazio), sem desenhar nem publicar arquivos."""
+    for arquivo in (DB_PATH, caminho_retrato(DB_PATH)):
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+    desenhados = []
+    monkeypatch.setattr(main, "desenhar_geral", desenhados.append)
+    monkeypatch.setattr(servico_clusters, "desenhar_geral", desenhados.append)
+    monkeypatch.setattr(servico_clusters, "etapa_data",
+                        lambda df, *args, **kwargs: df.iloc[:0].assign(cluster=-1))
+    monkeypatch.setattr(servico_clusters, "arquivos_resultados", lambda: [])
+    monkeypatch.setattr(servico_clusters, "publicar_resultados", lambda *args, **kwargs: None)
+    motor = MotorClusterizacao()
+    motor.desenhados = desenhados
+    return motor
+
+
+def _linhas(casos):
+    df = casos[COLUNAS].copy()
+    df["data"] = df["data"].dt.strftime("%Y-%m-%d")
+    return df.values.tolist()
+
+
+def test_casos_acrescentados_entram_online(casos, motor):
+    inserir_casos(_linhas(casos.iloc[:800]))
+    motor.executar("2025-02-01")
+    _, antes = motor.clusters_gerais()
+    assert motor._online is None
+
+    inserir_casos(_linhas(casos.iloc[800:]))
+    resposta = motor.executar("2025-02-01")
+    assert not resposta["resultado"]["reaproveitado"]
+    assert motor._online is not None
+    _, depois = motor.clusters_gerais()
+    assert len(motor.desenhados) == 2 and motor.desenhados[-1] is depois
+
+    lote = detectar_clusters(casos, modo="esparso")
+    assert depois["id"].tolist() == lote["id"].tolist()
+    relatorio = motor._online.comparar_com_lote(lote)
+    assert relatorio["nucleos_iguais"] and relatorio["particao_igual"]
+    # Casos antigos mantêm o cluster, a não ser por uniões (fica o menor ID)
+    agrupados = antes[antes["cluster"] != -1]
+    antigos = depois.set_index("id")["cluster"].loc[agrupados["id"]].to_numpy()
+    assert (antigos != -1).all() and (antigos <= agrupados["cluster"].to_numpy()).all()